@@ -0,0 +1,35 @@
+"""Image store: content hash, size and access time on card_assets
+
+Revision ID: 0002_image_store
+Revises: 0001_initial
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_image_store"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("card_assets", sa.Column("content_hash", sa.Text, nullable=True))
+    op.add_column("card_assets", sa.Column("size_bytes", sa.BigInteger, nullable=True))
+    op.add_column(
+        "card_assets", sa.Column("last_access", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.create_index("ix_card_assets_content_hash", "card_assets", ["content_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_card_assets_content_hash", table_name="card_assets")
+    op.drop_column("card_assets", "last_access")
+    op.drop_column("card_assets", "size_bytes")
+    op.drop_column("card_assets", "content_hash")
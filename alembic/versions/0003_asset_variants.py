@@ -0,0 +1,28 @@
+"""Resized image variants on card_assets
+
+Revision ID: 0003_asset_variants
+Revises: 0002_image_store
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "0003_asset_variants"
+down_revision = "0002_image_store"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("card_assets", sa.Column("variants", postgresql.JSONB, nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("card_assets", "variants")
@@ -0,0 +1,34 @@
+"""Deck fingerprints: resolved card metadata per precached decklist
+
+Revision ID: 0004_deck_fingerprints
+Revises: 0003_asset_variants
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "0004_deck_fingerprints"
+down_revision = "0003_asset_variants"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "deck_fingerprints",
+        sa.Column("fingerprint", sa.Text, primary_key=True),
+        sa.Column("cards", postgresql.JSONB, nullable=False),
+        sa.Column("atlas", sa.Text, nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("deck_fingerprints")
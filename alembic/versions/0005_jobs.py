@@ -0,0 +1,69 @@
+"""Durable job queue (claimed with FOR UPDATE SKIP LOCKED)
+
+Revision ID: 0005_jobs
+Revises: 0004_deck_fingerprints
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "0005_jobs"
+down_revision = "0004_deck_fingerprints"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.BigInteger, sa.Identity(), primary_key=True),
+        sa.Column("kind", sa.Text, nullable=False),
+        sa.Column("key", sa.Text, nullable=True),
+        sa.Column("payload", postgresql.JSONB, nullable=False, server_default=sa.text("'{}'")),
+        sa.Column("priority", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("state", sa.Text, nullable=False, server_default=sa.text("'queued'")),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("max_attempts", sa.Integer, nullable=False, server_default=sa.text("5")),
+        sa.Column(
+            "run_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")
+        ),
+        sa.Column("locked_by", sa.Text, nullable=True),
+        sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text, nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()")),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()")),
+    )
+    # At most one live job per (kind, key); finished jobs are deleted, failed ones kept
+    op.create_index(
+        "ux_jobs_live_key",
+        "jobs",
+        ["kind", "key"],
+        unique=True,
+        postgresql_where=sa.text("state IN ('queued', 'running')"),
+    )
+    op.create_index(
+        "ix_jobs_claim",
+        "jobs",
+        [sa.text("priority DESC"), "run_at", "id"],
+        postgresql_where=sa.text("state = 'queued'"),
+    )
+    op.create_index(
+        "ix_jobs_lease",
+        "jobs",
+        ["lease_until"],
+        postgresql_where=sa.text("state = 'running'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_lease", table_name="jobs")
+    op.drop_index("ix_jobs_claim", table_name="jobs")
+    op.drop_index("ux_jobs_live_key", table_name="jobs")
+    op.drop_table("jobs")
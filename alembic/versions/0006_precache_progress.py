@@ -0,0 +1,39 @@
+"""Precache progress kept outside the session document
+
+Revision ID: 0006_precache_progress
+Revises: 0005_jobs
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006_precache_progress"
+down_revision = "0005_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "precache_progress",
+        sa.Column(
+            "sid",
+            sa.Text,
+            sa.ForeignKey("sessions.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("total", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("done", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("is_ready", sa.Boolean, nullable=False, server_default=sa.text("false")),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("precache_progress")
@@ -0,0 +1,31 @@
+"""Session version column for cheap ETag checks
+
+Revision ID: 0007_session_version
+Revises: 0006_precache_progress
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007_session_version"
+down_revision = "0006_precache_progress"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "sessions",
+        sa.Column("version", sa.BigInteger, nullable=False, server_default=sa.text("0")),
+    )
+    op.execute("UPDATE sessions SET version = COALESCE((data->>'version')::bigint, 0)")
+
+
+def downgrade() -> None:
+    op.drop_column("sessions", "version")
@@ -0,0 +1,31 @@
+"""Remote source of each resized variant, kept after eviction
+
+Revision ID: 0008_variant_sources
+Revises: 0007_session_version
+Create Date: 2026-10-19
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008_variant_sources"
+down_revision = "0007_session_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "variant_sources",
+        sa.Column("url", sa.Text, primary_key=True),
+        sa.Column("source_url", sa.Text, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("variant_sources")
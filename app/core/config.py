@@ -27,6 +27,58 @@ class Settings(BaseSettings):
     TEMPLATE_DIR: str = Field(default="app/templates", description="Jinja templates directory")
     STATIC_DIR: str = Field(default="app/static", description="Static files directory")
 
+    # ---- Logging ----
+    LOG_QUEUE_SIZE: int = Field(
+        default=10_000, ge=1, description="Log records buffered for the writer thread"
+    )
+    ACCESS_LOG_SAMPLE_RATE: float = Field(
+        default=1.0, ge=0.0, le=1.0, description="Share of access-log lines kept by default"
+    )
+    ACCESS_LOG_SAMPLE_RULES: dict[str, float] = Field(
+        default_factory=dict,
+        description='Keep rates by path glob, status or both, e.g. {"/healthz": 0, "304": 0.05}',
+    )
+    ACCESS_LOG_SLOW_MS: float = Field(
+        default=500.0, ge=0.0, description="Requests at least this slow are always logged"
+    )
+
+    # ---- Metrics ----
+    METRICS_ENABLED: bool = Field(
+        default=True, description="Serve Prometheus metrics at /metrics (and counters at /statz)"
+    )
+    METRICS_WORKER_PORT: int = Field(
+        default=0, ge=0, description="Metrics port for `python -m app.worker` (0 = off)"
+    )
+
+    # ---- Profiling ----
+    PROFILE_SPANS: bool = Field(
+        default=False, description="Attach span timings (db_load, model_dump, ...) to access logs"
+    )
+    PROFILE_TOKEN: str = Field(
+        default="",
+        description="Secret that enables per-request sampling via X-Profile / ?__profile= (empty = off)",
+    )
+    PROFILE_DIR: str = Field(default="profiles", description="Where sampled profiles are written")
+    PROFILE_MAX_FILES: int = Field(default=50, ge=1, description="Profiles kept (oldest deleted)")
+    PROFILE_INTERVAL_MS: float = Field(
+        default=1.0, gt=0.0, description="Stack sampling interval for profiled requests"
+    )
+
+    # ---- Readiness ----
+    READY_CHECK_SECONDS: float = Field(
+        default=5.0, gt=0, description="Interval of the background /readyz checks"
+    )
+    READY_MIN_FREE_BYTES: int = Field(
+        default=256 * 1024 * 1024,
+        ge=0,
+        description="Free space IMAGE_CACHE_DIR's filesystem needs to count as ready",
+    )
+    READY_POOL_MAX_WAITING: int = Field(
+        default=5,
+        ge=1,
+        description="Callers queued on a fully used DB pool before /readyz reports it saturated",
+    )
+
     # ---- Web server ----
     HOST: str = Field(default="127.0.0.1", description="Uvicorn bind address")
     PORT: int = Field(default=8000, description="Uvicorn bind port")
@@ -36,9 +88,133 @@ class Settings(BaseSettings):
     DB_MIN_SIZE: int = Field(default=1, ge=1, description="Pool minimum size")
     DB_MAX_SIZE: int = Field(default=5, ge=1, description="Pool maximum size")
     DB_CONNECT_TIMEOUT: float = Field(default=5.0, ge=0.1, description="Connect timeout seconds")
+    DB_WARM_POOL: bool = Field(
+        default=True, description="Connect DB_MIN_SIZE connections before the app starts serving"
+    )
+    DB_PIPELINE: bool = Field(
+        default=True, description="Batch each transaction's statements with libpq pipeline mode"
+    )
+    DB_PREPARED_STATEMENTS: bool = Field(
+        default=True,
+        description="Server-side prepared statements (turn off behind pgbouncer transaction pooling)",
+    )
+    DB_REPLICA_URL: str = Field(
+        default="", description="Read-replica DSN for read-only session routes (empty = primary)"
+    )
+    DB_REPLICA_FENCE_SECONDS: float = Field(
+        default=5.0,
+        ge=0.0,
+        description="After this process writes a session, read it from the primary for this long",
+    )
 
     # ---- Caching / files ----
     IMAGE_CACHE_DIR: str = Field(default="img-cache", description="Local cache folder")
+    IMAGE_CACHE_MAX_BYTES: int = Field(
+        default=1024 * 1024 * 1024, ge=0, description="Image cache byte budget (0 = unbounded)"
+    )
+    IMAGE_WORKERS: int = Field(default=2, ge=1, description="Processes for image composition")
+    IMAGE_QUEUE_SIZE: int = Field(
+        default=64, ge=1, description="Pending thumbnail jobs before producers wait"
+    )
+    IMAGE_VARIANT_WIDTHS: list[int] = Field(
+        default=[146, 244, 488], description="Thumbnail widths to render (empty disables variants)"
+    )
+    IMAGE_CACHE_ACCEL_PREFIX: str = Field(
+        default="",
+        description="If set, hand /img-cache bodies to the proxy via X-Accel-Redirect under this prefix",
+    )
+
+    # ---- Treasure precache ----
+    PRECACHE_READY_TOP_K: int = Field(
+        default=10, ge=1, description="Pile positions that must be cached before a session opens"
+    )
+    PRECACHE_MISS_RETRY_SECONDS: float = Field(
+        default=3600.0,
+        ge=0.0,
+        description="How long a card name Scryfall could not resolve is not looked up again",
+    )
+    PRELOAD_CARD_ASSETS: int = Field(
+        default=0,
+        ge=0,
+        description="Recently used card_assets rows read into the DB cache at startup (0 = off)",
+    )
+
+    # ---- Session state ----
+    SESSION_STORE: Literal["postgres", "sqlite", "memory"] = Field(
+        default="postgres", description="Where session documents live"
+    )
+    SESSION_SQLITE_PATH: str = Field(
+        default="data/sessions.sqlite3", description="Database file for SESSION_STORE=sqlite"
+    )
+    STATE_CACHE_MAX_BYTES: int = Field(
+        default=32 * 1024 * 1024,
+        ge=0,
+        description="Rendered /state bodies kept in memory per process",
+    )
+    HOT_SESSIONS: bool = Field(
+        default=False,
+        description="Own active sessions in memory and persist them write-behind",
+    )
+    HOT_SESSION_FLUSH_SECONDS: float = Field(
+        default=0.25, gt=0, description="Write-behind interval for hot sessions"
+    )
+    HOT_SESSION_IDLE_SECONDS: float = Field(
+        default=300.0, gt=0, description="Hot sessions untouched this long go back to storage"
+    )
+    HOT_SESSION_HANDOFF_SECONDS: float = Field(
+        default=2.0,
+        gt=0,
+        description="How long to wait for another process to hand over a hot session",
+    )
+
+    # ---- Realtime (SSE) ----
+    SSE_HEARTBEAT_SECONDS: float = Field(
+        default=15.0, ge=1.0, description="Keepalive comment interval on idle event streams"
+    )
+    SSE_QUEUE_SIZE: int = Field(
+        default=64, ge=1, description="Events buffered per stream before it is told to resync"
+    )
+
+    # ---- Job queue ----
+    JOB_LEASE_SECONDS: float = Field(
+        default=30.0, ge=1.0, description="Lease a worker holds on a claimed job between heartbeats"
+    )
+    JOB_POLL_SECONDS: float = Field(
+        default=5.0, ge=0.1, description="Idle poll interval (NOTIFY wakes workers sooner)"
+    )
+    JOB_MAX_ATTEMPTS: int = Field(default=5, ge=1, description="Attempts before a job is failed")
+    JOB_BACKOFF_BASE_SECONDS: float = Field(default=2.0, ge=0.0, description="First retry delay")
+    JOB_BACKOFF_MAX_SECONDS: float = Field(default=300.0, ge=0.0, description="Retry delay cap")
+    JOB_WORKER_CONCURRENCY: int = Field(
+        default=4, ge=1, description="Jobs run concurrently by `python -m app.worker`"
+    )
+    JOB_EMBEDDED_CONCURRENCY: int = Field(
+        default=1, ge=0, description="Jobs run inside each web process (0 = dedicated workers only)"
+    )
+    JOB_FAILED_RETENTION_HOURS: float = Field(
+        default=168.0, gt=0, description="Failed jobs are kept this long for inspection"
+    )
+    JOB_CLEANUP_SECONDS: float = Field(
+        default=3600.0, gt=0, description="Interval between sweeps of expired failed jobs"
+    )
+
+    # ---- Periodic tasks ----
+    SESSION_TTL_HOURS: int = Field(
+        default=72, ge=1, description="Sessions untouched this long are deleted"
+    )
+    SESSION_CLEANUP_SECONDS: float = Field(
+        default=900.0, gt=0, description="Interval between expired-session sweeps"
+    )
+    IMAGE_CACHE_VERIFY_SECONDS: float = Field(
+        default=86400.0,
+        gt=0,
+        description="Interval between image cache integrity scans (re-hashes every file)",
+    )
+    SCHEDULER_ELECTION_SECONDS: float = Field(
+        default=5.0,
+        gt=0,
+        description="How often processes try to take over periodic tasks (failover delay)",
+    )
 
     # ---- Pydantic settings meta ----
     model_config = SettingsConfigDict(
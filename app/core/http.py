@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET/HEAD)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return etag.removeprefix("W/") in tags
@@ -0,0 +1,203 @@
+# app/core/logs.py
+"""
+Structured logging off the event loop.
+
+setup_json_logging() installs a QueueHandler on the root logger: a log call on
+the request path only builds the record and puts it on a bounded queue. A
+QueueListener thread encodes JSON (orjson when installed) and writes to
+stderr. When the queue is full, records are dropped and counted instead of
+blocking the loop.
+
+AccessLogSampler decides which access-log lines are written at all.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+from typing import Any
+
+from app.core.config import settings
+from app.core.metrics import REGISTRY, Sample
+
+try:  # optional, faster encoder
+    import orjson
+except Exception:  # pragma: no cover - optional dep
+    orjson = None  # type: ignore[assignment]
+
+_FIELDS = (
+    "request_id",
+    "path",
+    "method",
+    "status_code",
+    "latency_ms",
+    "sample_rate",
+    "spans",
+    "profile",
+)
+
+
+def _dumps(payload: dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode("utf-8")
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
+        payload: dict[str, Any] = {
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for k in _FIELDS:
+            if hasattr(record, k):
+                payload[k] = getattr(record, k)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return _dumps(payload)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: past `maxsize` queued records, drop and count."""
+
+    dropped = 0
+
+    def __init__(self, q: queue.SimpleQueue, maxsize: int) -> None:
+        super().__init__(q)
+        self.records = q
+        self.maxsize = maxsize
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like the stdlib version (resolve args, freeze the traceback into text)
+        # but keeps msg and exc_text apart so the JSON stays structured.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.records.qsize() >= self.maxsize:
+            type(self).dropped += 1
+        else:
+            self.records.put_nowait(record)
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_json_logging() -> None:
+    """Route the root logger through the queue (idempotent; restarts the listener)."""
+    global _listener
+    stop_logging()
+
+    q: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    out = logging.StreamHandler()
+    out.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(q, out, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers.clear()
+    root.addHandler(_DroppingQueueHandler(q, settings.LOG_QUEUE_SIZE))
+
+
+def stop_logging() -> None:
+    """
+    Flush what is queued and stop the writer thread. Anything logged afterwards
+    (late shutdown messages) is written directly.
+    """
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        if isinstance(h, _DroppingQueueHandler):
+            root.removeHandler(h)
+            direct = logging.StreamHandler()
+            direct.setFormatter(JsonFormatter())
+            root.addHandler(direct)
+    _listener.stop()
+    _listener = None
+
+
+def dropped_records() -> int:
+    return _DroppingQueueHandler.dropped
+
+
+async def _collect_metrics() -> list[Sample]:
+    return [
+        ("r4t_log_records_dropped_total", "counter", "Log records dropped", {}, dropped_records())
+    ]
+
+
+REGISTRY.add_collector(_collect_metrics)
+
+
+# ---------- access-log sampling ----------
+
+
+class AccessLogSampler:
+    """
+    Keep-or-drop decision per access-log line.
+
+    Rules map a key to a keep rate in [0, 1]. A key is a path glob
+    ("/treasure/*/state"), a status ("304" or "3xx"), or both
+    ("/treasure/*/state 304"). The most specific match wins: path+status,
+    then path, then status, then `default_rate`. 5xx responses and requests
+    slower than `slow_ms` are always kept.
+    """
+
+    def __init__(self, default_rate: float, rules: dict[str, float], slow_ms: float) -> None:
+        self.default_rate = default_rate
+        self.slow_ms = slow_ms
+        self._both: list[tuple[re.Pattern[str], str, float]] = []
+        self._paths: list[tuple[re.Pattern[str], float]] = []
+        self._statuses: dict[str, float] = {}
+        for key, rate in rules.items():
+            path, _, status = key.strip().partition(" ")
+            if not path.startswith("/"):
+                self._statuses[path.lower()] = rate
+            elif status:
+                self._both.append((re.compile(fnmatch.translate(path)), status.lower(), rate))
+            else:
+                self._paths.append((re.compile(fnmatch.translate(path)), rate))
+
+    def rate(self, path: str, status: int) -> float:
+        code, klass = str(status), f"{status // 100}xx"
+        for pat, st, rate in self._both:
+            if st in (code, klass) and pat.match(path):
+                return rate
+        for pat, rate in self._paths:
+            if pat.match(path):
+                return rate
+        if code in self._statuses:
+            return self._statuses[code]
+        return self._statuses.get(klass, self.default_rate)
+
+    def keep(self, path: str, status: int, latency_ms: float) -> float | None:
+        """The rate the line was sampled at if it should be written, else None."""
+        if status >= 500 or latency_ms >= self.slow_ms:
+            return 1.0
+        rate = self.rate(path, status)
+        if rate >= 1.0 or (rate > 0.0 and random.random() < rate):
+            return rate
+        return None
+
+
+def access_sampler() -> AccessLogSampler:
+    return AccessLogSampler(
+        settings.ACCESS_LOG_SAMPLE_RATE,
+        settings.ACCESS_LOG_SAMPLE_RULES,
+        settings.ACCESS_LOG_SLOW_MS,
+    )
@@ -0,0 +1,343 @@
+# app/core/metrics.py
+"""
+In-process metrics, exposed in the Prometheus text format at /metrics.
+
+Recording is plain attribute arithmetic on per-label-set children, with no
+locks. Everything that records runs on the event loop thread, and a racing
+increment from a worker thread costs at most a lost sample. Values are per
+process; Prometheus sums them across workers.
+
+    REQUESTS = Counter("r4t_things_total", "Things done", ("kind",))
+    REQUESTS.labels("a").inc()
+    with LATENCY.labels("load_session").time():
+        ...
+
+Values that already live somewhere else (pool stats, queue depth) are read at
+scrape time by collectors registered with `REGISTRY.add_collector`, next to
+the state they read. The metrics the app records are defined at the bottom of
+this module so their names stay in one place.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import math
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any
+
+# Latency buckets in seconds: 0.5ms .. 10s
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# (name, type, help, labels, value) produced at scrape time
+Sample = tuple[str, str, str, dict[str, str], float]
+Collector = Callable[[], Awaitable[Iterable[Sample]]]
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values, strict=False)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child: _HistogramChild) -> None:
+        self.child = child
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        self.value += n
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+    def dec(self, n: float = 1.0) -> None:
+        self.value -= n
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        registry: Registry | None = None,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], Any] = {}
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: tuple[str, ...], child: Any) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, values)} {_num(child.value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def labels(self, *values: str) -> _CounterChild:
+        return super().labels(*values)
+
+    def inc(self, n: float = 1.0) -> None:
+        self.labels().inc(n)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def labels(self, *values: str) -> _GaugeChild:
+        return super().labels(*values)
+
+    def set(self, v: float) -> None:
+        self.labels().set(v)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        registry: Registry | None = None,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def labels(self, *values: str) -> _HistogramChild:
+        return super().labels(*values)
+
+    def observe(self, v: float) -> None:
+        self.labels().observe(v)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _render_child(self, values: tuple[str, ...], child: Any) -> list[str]:
+        lines = []
+        running = 0
+        for bound, n in zip((*self.buckets, math.inf), list(child.counts), strict=True):
+            running += n
+            le = _labels(self.labelnames, values, f'le="{_num(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {running}")
+        lbl = _labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{lbl} {_num(child.sum)}")
+        lines.append(f"{self.name}_count{lbl} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Collector] = []
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def add_collector(self, fn: Collector) -> None:
+        self._collectors.append(fn)
+
+    async def render(self) -> str:
+        lines: list[str] = []
+        for m in self._metrics.values():
+            lines.extend(m.render())
+        seen: set[str] = set()
+        for collect in self._collectors:
+            for name, typ, help, labels, value in await collect():
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {typ}")
+                lines.append(f"{name}{_labels(labels, labels.values())} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def serve_metrics(host: str, port: int) -> None:
+    """
+    Bare HTTP listener for processes without a web app (the job worker):
+    answers every request with the current exposition. Runs until cancelled.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = (await REGISTRY.render()).encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                + f"Content-Type: {CONTENT_TYPE}\r\n".encode()
+                + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+# ---------- what the app records ----------
+
+# Jobs and image downloads run for seconds, not milliseconds
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+HTTP_LATENCY = Histogram(
+    "r4t_http_request_duration_seconds",
+    "Time to the last response byte, by route template",
+    ("route", "method"),
+)
+HTTP_REQUESTS = Counter(
+    "r4t_http_requests_total",
+    "Responses by route template and status",
+    ("route", "method", "status"),
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "r4t_db_pool_wait_seconds", "Time to check a connection out of the pool"
+)
+SESSION_OP_SECONDS = Histogram(
+    "r4t_session_op_seconds", "Session store operations (load_session, mutate_session)", ("op",)
+)
+SESSION_LOCK_WAIT_SECONDS = Histogram(
+    "r4t_session_lock_wait_seconds",
+    "Time a mutation waited for its per-session lock",
+    ("store",),
+)
+PRECACHE_CARDS = Counter(
+    "r4t_precache_cards_total",
+    "Card images ensured by precache (cached, downloaded, failed)",
+    ("result",),
+)
+JOBS_FINISHED = Counter(
+    "r4t_jobs_finished_total", "Job attempts finished in this process", ("kind", "outcome")
+)
+JOB_SECONDS = Histogram(
+    "r4t_job_duration_seconds", "Job handler run time", ("kind",), buckets=SLOW_BUCKETS
+)
+IMAGE_REQUESTS = Counter(
+    "r4t_image_requests_total",
+    "Cached image requests (hit, not_modified, miss)",
+    ("result",),
+)
+PERIODIC_RUNS = Counter(
+    "r4t_periodic_runs_total", "Periodic task runs in this process", ("task", "outcome")
+)
+PERIODIC_SECONDS = Histogram(
+    "r4t_periodic_run_seconds", "Periodic task run time", ("task",), buckets=SLOW_BUCKETS
+)
+PERIODIC_LAST_SUCCESS = Gauge(
+    "r4t_periodic_last_success_timestamp_seconds",
+    "Unix time of the task's last successful run in this process",
+    ("task",),
+)
+PERIODIC_LEADER = Gauge(
+    "r4t_periodic_leader", "1 while this process is the one running the task", ("task",)
+)
+HOUSE_SIM_ITERATIONS = Counter(
+    "r4t_house_sim_iterations_total", "Simulation iterations run by the House"
+)
+HOUSE_SIM_SECONDS = Histogram("r4t_house_sim_seconds", "Wall time of one House simulation")
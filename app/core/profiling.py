@@ -0,0 +1,164 @@
+# app/core/profiling.py
+"""
+Opt-in, per-request profiling.
+
+Spans: `with span("db_load"): ...` adds the block's wall time to the current
+request's span totals, which RequestIdMiddleware attaches to the access-log
+line. Outside a collecting request (PROFILE_SPANS off and no profile asked
+for) a span is one ContextVar lookup returning a shared no-op.
+
+Sampling: a request carrying `X-Profile: <PROFILE_TOKEN>` (or
+`?__profile=<PROFILE_TOKEN>`) gets a sampler thread that reads the event loop
+thread's stack every PROFILE_INTERVAL_MS until the response is sent. The
+stacks are written in the folded format (`root;caller;callee count`) that
+flamegraph.pl, speedscope and inferno read, as PROFILE_DIR/<time>-<id>.folded.
+Only the newest PROFILE_MAX_FILES profiles are kept, and only one request is
+sampled at a time. The loop thread runs every in-flight request, so a
+profile taken under load also shows the neighbours' work; time spent waiting
+on I/O shows up under the selector.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import hmac
+import logging
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextvars import ContextVar
+from pathlib import Path
+from types import FrameType
+from urllib.parse import parse_qs
+
+from app.core.config import settings
+
+log = logging.getLogger("r4t.profiling")
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_PARAM = "__profile"
+
+_spans: ContextVar[dict[str, float] | None] = ContextVar("r4t_spans", default=None)
+_NOOP = contextlib.nullcontext()
+
+
+# ---------- spans ----------
+
+
+@contextlib.contextmanager
+def _timed(spans: dict[str, float], name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + (time.perf_counter() - start) * 1000.0
+
+
+def span(name: str) -> contextlib.AbstractContextManager[None]:
+    """Time a block into the current request's spans (a no-op when not collecting)."""
+    spans = _spans.get()
+    if spans is None:
+        return _NOOP
+    return _timed(spans, name)
+
+
+@contextlib.contextmanager
+def collect_spans() -> Iterator[dict[str, float]]:
+    """Collect spans (name -> total ms) recorded in this context until exit."""
+    spans: dict[str, float] = {}
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+
+
+# ---------- sampling ----------
+
+
+def profile_requested(scope: dict) -> bool:
+    """True if the request carries the configured profiling token."""
+    token = settings.PROFILE_TOKEN
+    if not token:
+        return False
+    offered = ""
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            offered = value.decode("latin-1")
+            break
+    if not offered and PROFILE_PARAM.encode() in scope.get("query_string", b""):
+        qs = parse_qs(scope["query_string"].decode("latin-1"))
+        offered = (qs.get(PROFILE_PARAM) or [""])[0]
+    return bool(offered) and hmac.compare_digest(offered.encode(), token.encode())
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+
+
+def _fold(frame: FrameType | None) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Samples one thread's stack until stop(), then writes the folded profile."""
+
+    _busy = threading.Lock()  # one profile at a time
+
+    def __init__(self, target: int, path: Path, interval: float) -> None:
+        super().__init__(name="r4t-profiler", daemon=True)
+        self.target = target
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def start_for(cls, request_id: str) -> Sampler | None:
+        """Start sampling the calling thread, or None if a profile is already running."""
+        if not cls._busy.acquire(blocking=False):
+            return None
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        safe_id = "".join(c for c in request_id if c.isalnum() or c in "-_")[:64]
+        path = Path(settings.PROFILE_DIR) / f"{stamp}-{safe_id or 'request'}.folded"
+        sampler = cls(threading.get_ident(), path, settings.PROFILE_INTERVAL_MS / 1000.0)
+        sampler.start()
+        return sampler
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        try:
+            stacks: collections.Counter[str] = collections.Counter()
+            while not self._stop_event.wait(self.interval):
+                frame = sys._current_frames().get(self.target)
+                if frame is not None:
+                    stacks[_fold(frame)] += 1
+                    del frame
+            self._write(stacks)
+        except Exception:
+            log.exception("writing profile %s failed", self.path)
+        finally:
+            type(self)._busy.release()
+
+    def _write(self, stacks: collections.Counter[str]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, n in stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        prune_profiles(self.path.parent, settings.PROFILE_MAX_FILES)
+
+
+def prune_profiles(directory: Path, keep: int) -> None:
+    """Delete all but the newest `keep` profiles."""
+    files = sorted(directory.glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[keep:]:
+        with contextlib.suppress(FileNotFoundError):
+            old.unlink()
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+from app.core.metrics import REGISTRY, Sample
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class SingleFlight(Generic[K, V]):
+    """
+    Collapse concurrent calls for the same key into one in-flight task.
+
+    The first caller for a key starts `fn()` as a task; callers arriving while it
+    runs await the same task. A caller being cancelled does not cancel the shared
+    work for the others. Nothing is cached once the task finishes.
+
+    `forget(key)` detaches the current flight so later callers start a fresh one;
+    use it after a write that the in-flight read may predate.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[K, asyncio.Task[V]] = {}
+        self.calls = 0  # total do() calls
+        self.shared = 0  # calls that joined an existing flight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    @property
+    def ratio(self) -> float:
+        """Share of calls served by another caller's flight."""
+        return self.shared / self.calls if self.calls else 0.0
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "inflight": len(self._inflight),
+            "ratio": round(self.ratio, 4),
+        }
+
+    def forget(self, key: K) -> None:
+        self._inflight.pop(key, None)
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+
+            def _forget(t: asyncio.Task[V], k: K = key) -> None:
+                if self._inflight.get(k) is t:
+                    del self._inflight[k]
+
+            task.add_done_callback(_forget)
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+
+# name -> flight; features register theirs for /statz and the r4t_singleflight_* metrics
+FLIGHTS: dict[str, SingleFlight[Any, Any]] = {}
+
+F = TypeVar("F", bound=SingleFlight)
+
+
+def register_flight(name: str, flight: F) -> F:
+    FLIGHTS[name] = flight
+    return flight
+
+
+async def _collect_metrics() -> list[Sample]:
+    out: list[Sample] = []
+    for name, flight in FLIGHTS.items():
+        labels = {"flight": name}
+        out.append(
+            ("r4t_singleflight_calls_total", "counter", "Coalesced calls", labels, flight.calls)
+        )
+        out.append(
+            (
+                "r4t_singleflight_shared_total",
+                "counter",
+                "Calls that joined a flight already running",
+                labels,
+                flight.shared,
+            )
+        )
+    return out
+
+
+REGISTRY.add_collector(_collect_metrics)
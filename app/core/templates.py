@@ -1,6 +1,16 @@
 # roll4treasure-main/app/core/templates.py
+import jinja2
 from fastapi.templating import Jinja2Templates
 
 from .config import settings
+from .profiling import span
+
+
+class _TimedTemplate(jinja2.Template):
+    def render(self, *args, **kwargs) -> str:
+        with span("render_template"):
+            return super().render(*args, **kwargs)
+
 
 templates = Jinja2Templates(directory=settings.TEMPLATE_DIR)
+templates.env.template_class = _TimedTemplate
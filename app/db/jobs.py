@@ -0,0 +1,440 @@
+"""
+Durable job queue on Postgres.
+
+Jobs live in the `jobs` table. Workers claim the highest-priority due job with
+`FOR UPDATE SKIP LOCKED`, so any number of processes can pull from one queue
+without blocking each other. A claim is a lease: the worker extends it with
+heartbeats while the handler runs, and a job whose lease runs out (worker
+crashed or was killed mid-deploy) goes back to the queue. Failed attempts are
+retried with exponential backoff until max_attempts, after which the row is
+kept as `failed` for inspection (for JOB_FAILED_RETENTION_HOURS; see
+prune_failed). Finished jobs are deleted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import psycopg
+from psycopg.types.json import Json
+
+from app.core.config import settings
+from app.core.metrics import JOB_SECONDS, JOBS_FINISHED, REGISTRY, Sample
+from app.db.pool import get_pool, transaction
+
+log = logging.getLogger("app.db.jobs")
+
+NOTIFY_CHANNEL = "jobs"
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    key: str | None
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+    @property
+    def last_attempt(self) -> bool:
+        return self.attempts >= self.max_attempts
+
+
+Handler = Callable[[Job], Awaitable[None]]
+
+
+def backoff_seconds(attempts: int, base: float | None = None, cap: float | None = None) -> float:
+    """Delay before retrying after `attempts` tries (exponential, full jitter)."""
+    base = settings.JOB_BACKOFF_BASE_SECONDS if base is None else base
+    cap = settings.JOB_BACKOFF_MAX_SECONDS if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** max(0, attempts - 1)))
+
+
+# ---------- metrics ----------
+
+
+def _record_attempt(kind: str, start: float) -> Callable[[asyncio.Task], None]:
+    def done(task: asyncio.Task) -> None:
+        if task.cancelled():
+            outcome = "cancelled"  # shutdown or lost lease; the job runs again elsewhere
+        else:
+            outcome = "failed" if task.exception() is not None else "done"
+        JOB_SECONDS.labels(kind).observe(time.perf_counter() - start)
+        JOBS_FINISHED.labels(kind, outcome).inc()
+
+    return done
+
+
+async def _collect_metrics() -> list[Sample]:
+    """Queue depth by kind and state, read from the table (the same for every process)."""
+    pool = get_pool()
+    if pool is None:
+        return []
+    try:
+        async with pool.connection() as ac:
+            cur = await ac.execute("SELECT kind, state, count(*) FROM jobs GROUP BY kind, state")
+            rows = await cur.fetchall()
+    except Exception as e:
+        log.warning("reading job queue depth failed: %r", e)
+        return []
+    return [
+        ("r4t_jobs", "gauge", "Jobs in the queue table", {"kind": kind, "state": state}, n)
+        for kind, state, n in rows
+    ]
+
+
+REGISTRY.add_collector(_collect_metrics)
+
+
+# ---------- queue operations ----------
+
+
+async def enqueue(
+    kind: str,
+    payload: dict | None = None,
+    *,
+    key: str | None = None,
+    priority: int = 0,
+    delay: float = 0.0,
+    max_attempts: int | None = None,
+) -> int:
+    """
+    Add a job and wake idle workers. With a `key`, enqueueing while a job of the
+    same kind+key is still queued or running returns that job instead (raising
+    its priority / pulling its run_at forward if the new request is more urgent).
+    Inside a unit of work the job commits (and becomes claimable) with it.
+    """
+    async with transaction() as ac:
+        cur = await ac.execute(
+            """
+            INSERT INTO jobs (kind, key, payload, priority, max_attempts, run_at)
+            VALUES (%s, %s, %s, %s, %s, now() + make_interval(secs => %s))
+            ON CONFLICT (kind, key) WHERE state IN ('queued', 'running')
+            DO UPDATE SET priority = GREATEST(jobs.priority, EXCLUDED.priority),
+                          run_at = LEAST(jobs.run_at, EXCLUDED.run_at),
+                          updated_at = now()
+            RETURNING id
+            """,
+            (
+                kind,
+                key,
+                Json(payload or {}),
+                priority,
+                max_attempts or settings.JOB_MAX_ATTEMPTS,
+                delay,
+            ),
+        )
+        row = await cur.fetchone()
+        assert row is not None
+        # Delivered on commit
+        await ac.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, kind))
+    return int(row[0])
+
+
+async def claim(worker_id: str, kinds: list[str], lease_seconds: float) -> Job | None:
+    """Take the most urgent due job of the given kinds, or None if there is none."""
+    pool = get_pool()
+    assert pool is not None, "DB pool not initialized"
+    async with pool.connection() as ac, ac.transaction():
+        cur = await ac.execute(
+            """
+            UPDATE jobs
+               SET state = 'running',
+                   attempts = attempts + 1,
+                   locked_by = %s,
+                   lease_until = now() + make_interval(secs => %s),
+                   updated_at = now()
+             WHERE id = (
+                SELECT id FROM jobs
+                 WHERE state = 'queued' AND run_at <= now() AND kind = ANY(%s)
+                 ORDER BY priority DESC, run_at, id
+                 LIMIT 1
+                 FOR UPDATE SKIP LOCKED
+             )
+            RETURNING id, kind, key, payload, attempts, max_attempts
+            """,
+            (worker_id, lease_seconds, kinds),
+        )
+        row = await cur.fetchone()
+    if not row:
+        return None
+    return Job(
+        id=row[0],
+        kind=row[1],
+        key=row[2],
+        payload=row[3] or {},
+        attempts=row[4],
+        max_attempts=row[5],
+    )
+
+
+async def seconds_until_due(kinds: list[str]) -> float | None:
+    """Time until the next queued job of these kinds becomes due (None if the queue is empty)."""
+    pool = get_pool()
+    assert pool is not None, "DB pool not initialized"
+    async with pool.connection() as ac:
+        cur = await ac.execute(
+            """
+            SELECT GREATEST(EXTRACT(EPOCH FROM min(run_at) - now()), 0)
+              FROM jobs WHERE state = 'queued' AND kind = ANY(%s)
+            """,
+            (kinds,),
+        )
+        row = await cur.fetchone()
+    return None if not row or row[0] is None else float(row[0])
+
+
+async def heartbeat(job: Job, worker_id: str, lease_seconds: float) -> bool:
+    """Extend the lease. False means the job is no longer ours (lease expired and requeued)."""
+    pool = get_pool()
+    assert pool is not None, "DB pool not initialized"
+    async with pool.connection() as ac, ac.transaction():
+        cur = await ac.execute(
+            """
+            UPDATE jobs
+               SET lease_until = now() + make_interval(secs => %s), updated_at = now()
+             WHERE id = %s AND locked_by = %s AND state = 'running'
+            RETURNING id
+            """,
+            (lease_seconds, job.id, worker_id),
+        )
+        return await cur.fetchone() is not None
+
+
+async def complete(job: Job, worker_id: str) -> None:
+    pool = get_pool()
+    assert pool is not None, "DB pool not initialized"
+    async with pool.connection() as ac, ac.transaction():
+        await ac.execute("DELETE FROM jobs WHERE id = %s AND locked_by = %s", (job.id, worker_id))
+
+
+async def fail(job: Job, worker_id: str, error: str, retry_in: float) -> None:
+    """Record a failed attempt: requeue after `retry_in` seconds, or fail it for good."""
+    pool = get_pool()
+    assert pool is not None, "DB pool not initialized"
+    async with pool.connection() as ac, ac.transaction():
+        await ac.execute(
+            """
+            UPDATE jobs
+               SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                   run_at = now() + make_interval(secs => %s),
+                   locked_by = NULL,
+                   lease_until = NULL,
+                   last_error = %s,
+                   updated_at = now()
+             WHERE id = %s AND locked_by = %s
+            """,
+            (retry_in, error[:2000], job.id, worker_id),
+        )
+
+
+async def release(job: Job, worker_id: str) -> None:
+    """Hand a job back untouched (worker shutting down); the attempt is not counted."""
+    pool = get_pool()
+    assert pool is not None, "DB pool not initialized"
+    async with pool.connection() as ac, ac.transaction():
+        await ac.execute(
+            """
+            UPDATE jobs
+               SET state = 'queued',
+                   attempts = GREATEST(attempts - 1, 0),
+                   run_at = now(),
+                   locked_by = NULL,
+                   lease_until = NULL,
+                   updated_at = now()
+             WHERE id = %s AND locked_by = %s AND state = 'running'
+            """,
+            (job.id, worker_id),
+        )
+        await ac.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, job.kind))
+
+
+async def requeue_expired() -> int:
+    """
+    Return jobs whose lease ran out to the queue (or fail them if that was their
+    last attempt). Returns how many were requeued.
+    """
+    pool = get_pool()
+    assert pool is not None, "DB pool not initialized"
+    async with pool.connection() as ac, ac.transaction():
+        cur = await ac.execute(
+            """
+            UPDATE jobs
+               SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                   run_at = now(),
+                   locked_by = NULL,
+                   lease_until = NULL,
+                   last_error = COALESCE(last_error, 'lease expired'),
+                   updated_at = now()
+             WHERE state = 'running' AND lease_until < now()
+            RETURNING state
+            """
+        )
+        rows = await cur.fetchall()
+    return sum(1 for (state,) in rows if state == "queued")
+
+
+async def prune_failed(retention_hours: float) -> int:
+    """Delete jobs that failed for good more than `retention_hours` ago. Returns how many."""
+    pool = get_pool()
+    assert pool is not None, "DB pool not initialized"
+    async with pool.connection() as ac, ac.transaction():
+        cur = await ac.execute(
+            """
+            DELETE FROM jobs
+             WHERE state = 'failed' AND updated_at < now() - make_interval(hours => %s)
+            """,
+            (retention_hours,),
+        )
+        deleted = cur.rowcount
+    if deleted:
+        log.info("job cleanup removed %d failed job(s)", deleted)
+    return deleted
+
+
+# ---------- worker ----------
+
+
+class Worker:
+    """
+    Runs `concurrency` claim/execute loops for the given handlers until stop().
+    Idle loops sleep until a NOTIFY on the jobs channel or JOB_POLL_SECONDS.
+    """
+
+    def __init__(self, handlers: dict[str, Handler], concurrency: int) -> None:
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._handler_tasks: set[asyncio.Task] = set()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+
+    async def run(self) -> None:
+        """Work until stop(); jobs still running then are released back to the queue."""
+        log.info("job worker %s started (concurrency=%s)", self.id, self.concurrency)
+        slots = [asyncio.create_task(self._slot()) for _ in range(self.concurrency)]
+        tasks = [*slots, asyncio.create_task(self._listen()), asyncio.create_task(self._reaper())]
+        try:
+            await self._stopping.wait()
+            # Let slots finish their current query instead of cancelling them mid-transaction
+            for t in list(self._handler_tasks):
+                t.cancel()
+            await asyncio.gather(*slots, return_exceptions=True)
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            log.info("job worker %s stopped", self.id)
+
+    async def _slot(self) -> None:
+        kinds = list(self.handlers)
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                job = await claim(self.id, kinds, settings.JOB_LEASE_SECONDS)
+            except Exception as e:
+                log.warning("claiming a job failed: %r", e)
+                job = None
+            if job is not None and self._stopping.is_set():
+                await release(job, self.id)
+                return
+            if job is None:
+                await self._idle(kinds)
+                continue
+            await self._execute(job)
+
+    async def _idle(self, kinds: list[str]) -> None:
+        """Sleep until woken by NOTIFY, the next delayed retry is due, or the poll interval."""
+        timeout = settings.JOB_POLL_SECONDS
+        try:
+            due = await seconds_until_due(kinds)
+        except Exception:
+            due = None
+        if due is not None:
+            timeout = min(timeout, due)
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+
+    async def _execute(self, job: Job) -> None:
+        task = asyncio.create_task(self.handlers[job.kind](job))
+        self._handler_tasks.add(task)
+        task.add_done_callback(self._handler_tasks.discard)
+        task.add_done_callback(_record_attempt(job.kind, time.perf_counter()))
+        interval = settings.JOB_LEASE_SECONDS / 3
+        try:
+            while not (await asyncio.wait({task}, timeout=interval))[0]:
+                try:
+                    still_ours = await heartbeat(job, self.id, settings.JOB_LEASE_SECONDS)
+                except Exception as e:
+                    log.warning("heartbeat for job %s failed: %r", job.id, e)
+                    continue
+                if not still_ours:
+                    log.warning("lost lease on job %s (%s); abandoning it", job.id, job.kind)
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    return
+        except asyncio.CancelledError:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            with contextlib.suppress(Exception):
+                await release(job, self.id)
+            raise
+
+        if task.cancelled() and self._stopping.is_set():
+            with contextlib.suppress(Exception):
+                await release(job, self.id)
+            return
+        exc = asyncio.CancelledError() if task.cancelled() else task.exception()
+        try:
+            if exc is None:
+                await complete(job, self.id)
+                return
+            log.warning(
+                "job %s (%s) attempt %s/%s failed: %r",
+                job.id,
+                job.kind,
+                job.attempts,
+                job.max_attempts,
+                exc,
+            )
+            await fail(job, self.id, repr(exc), backoff_seconds(job.attempts))
+        except Exception as e:
+            # The lease will expire and the job gets picked up again
+            log.warning("recording result of job %s failed: %r", job.id, e)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    settings.DATABASE_URL, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    async for n in conn.notifies():
+                        if n.payload in self.handlers:
+                            self._wake.set()
+            except Exception as e:
+                log.warning("job listener disconnected: %r", e)
+                await asyncio.sleep(settings.JOB_POLL_SECONDS)
+
+    async def _reaper(self) -> None:
+        while True:
+            try:
+                if await requeue_expired():
+                    self._wake.set()
+            except Exception as e:
+                log.warning("requeueing expired jobs failed: %r", e)
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS)
@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from contextvars import ContextVar
 
 import psycopg
+from psycopg.pq import TransactionStatus
 
 from app.core.config import settings
+from app.core.metrics import DB_POOL_WAIT_SECONDS, REGISTRY, Sample
 
 logger = logging.getLogger("app.db.pool")
 
@@ -15,6 +23,7 @@ except Exception:  # pragma: no cover - optional dep
     AsyncConnectionPool = None  # type: ignore[misc,assignment]
 
 _pool: AsyncConnectionPool | None = None  # type: ignore[name-defined]
+_replica_pool: AsyncConnectionPool | None = None  # type: ignore[name-defined]
 
 
 async def init_pool() -> None:
@@ -22,7 +31,7 @@ async def init_pool() -> None:
     Initialize a global async connection pool from central settings.
     Skips pooling (without crashing) if DATABASE_URL missing or psycopg-pool unavailable.
     """
-    global _pool
+    global _pool, _replica_pool
     if _pool is not None:
         return
 
@@ -40,6 +49,9 @@ async def init_pool() -> None:
         min_size=settings.DB_MIN_SIZE,
         max_size=settings.DB_MAX_SIZE,
         timeout=settings.DB_CONNECT_TIMEOUT,  # connect timeout
+        open=False,
+        configure=_configure,
+        reset=_reset,
     )
     await _pool.open()
     logger.info(
@@ -48,6 +60,46 @@ async def init_pool() -> None:
         settings.DB_MAX_SIZE,
         settings.DB_CONNECT_TIMEOUT,
     )
+    if settings.DB_WARM_POOL:
+        await _warm(_pool, "DB pool")
+    if settings.DB_REPLICA_URL:
+        # Single-statement reads, so autocommit: no BEGIN/ROLLBACK around them
+        _replica_pool = AsyncConnectionPool(
+            settings.DB_REPLICA_URL,
+            min_size=settings.DB_MIN_SIZE,
+            max_size=settings.DB_MAX_SIZE,
+            timeout=settings.DB_CONNECT_TIMEOUT,
+            open=False,
+            kwargs={"autocommit": True},
+            configure=_configure,
+        )
+        await _replica_pool.open()
+        logger.info("DB replica pool initialized")
+        if settings.DB_WARM_POOL:
+            await _warm(_replica_pool, "DB replica pool")
+
+
+async def _warm(pool: AsyncConnectionPool, what: str) -> None:  # type: ignore[name-defined]
+    """
+    Wait until the pool has connected (and configured) its DB_MIN_SIZE
+    connections, so they are ready before the first request instead of made by
+    it. A database that doesn't answer within DB_CONNECT_TIMEOUT only costs a
+    warning: the pool keeps connecting in the background as it would have
+    anyway. (pool.wait() would close the pool on timeout instead.)
+    """
+    start = time.perf_counter()
+    deadline = start + settings.DB_CONNECT_TIMEOUT
+    while pool.get_stats().get("pool_available", 0) < settings.DB_MIN_SIZE:
+        if time.perf_counter() > deadline:
+            logger.warning("%s not warmed up after %ss", what, settings.DB_CONNECT_TIMEOUT)
+            return
+        await asyncio.sleep(0.01)
+    logger.info(
+        "%s warmed up: %d connection(s) in %.0fms",
+        what,
+        settings.DB_MIN_SIZE,
+        (time.perf_counter() - start) * 1000,
+    )
 
 
 def get_pool() -> AsyncConnectionPool | None:  # type: ignore[name-defined]
@@ -55,6 +107,238 @@ def get_pool() -> AsyncConnectionPool | None:  # type: ignore[name-defined]
     return _pool
 
 
+async def _configure(conn: psycopg.AsyncConnection) -> None:
+    if not settings.DB_PREPARED_STATEMENTS:
+        conn.prepare_threshold = None  # also overrides execute(..., prepare=True)
+
+
+async def _reset(conn: psycopg.AsyncConnection) -> None:
+    # _begin() switches to autocommit for its explicit BEGIN; never hand that on
+    if conn.autocommit:
+        await conn.set_autocommit(False)
+
+
+@asynccontextmanager
+async def _begin(conn: psycopg.AsyncConnection) -> AsyncIterator[None]:
+    """
+    Run the block in a transaction. With DB_PIPELINE, BEGIN/COMMIT are plain
+    statements in libpq pipeline mode, so statements nobody reads a result
+    from (UPDATE, NOTIFY, COMMIT) travel together: a session mutation is two
+    round trips (BEGIN + SELECT ... FOR UPDATE, then UPDATE + NOTIFY + COMMIT)
+    instead of five. psycopg's own transaction() syncs at its boundaries,
+    which would cost most of that back.
+    """
+    if not (settings.DB_PIPELINE and psycopg.AsyncPipeline.is_supported()):
+        async with conn.transaction():
+            yield
+        return
+    await conn.set_autocommit(True)
+    try:
+        async with conn.pipeline():
+            await conn.execute("BEGIN")
+            yield
+            await conn.execute("COMMIT")
+    finally:
+        # The block raised or a statement failed: the transaction is still open
+        if conn.info.transaction_status != TransactionStatus.IDLE:
+            with contextlib.suppress(psycopg.Error):
+                await conn.execute("ROLLBACK")
+        with contextlib.suppress(psycopg.Error):
+            await conn.set_autocommit(False)
+
+
+# ---------- unit of work ----------
+
+
+class _UnitOfWork:
+    """One pooled connection + transaction, checked out on first use."""
+
+    def __init__(self, owner: asyncio.Task | None, stack: AsyncExitStack) -> None:
+        self.owner = owner
+        self.stack = stack
+        self.conn: psycopg.AsyncConnection | None = None
+
+    async def acquire(self) -> psycopg.AsyncConnection:
+        if self.conn is None:
+            conn = await self.stack.enter_async_context(_checkout())
+            await self.stack.enter_async_context(_begin(conn))
+            self.conn = conn
+        return self.conn
+
+
+_uow: ContextVar[_UnitOfWork | None] = ContextVar("r4t_unit_of_work", default=None)
+
+
+def _current_uow() -> _UnitOfWork | None:
+    # Tasks spawned inside a unit of work inherit the ContextVar but must not
+    # share its connection: statements from two tasks would interleave.
+    uow = _uow.get()
+    if uow is not None and uow.owner is asyncio.current_task():
+        return uow
+    return None
+
+
+@asynccontextmanager
+async def _checkout(replica: bool = False) -> AsyncIterator[psycopg.AsyncConnection]:
+    pool = _replica_pool if replica else _pool
+    assert pool is not None, "DB pool not initialized"
+    start = time.perf_counter()
+    async with pool.connection() as conn:
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+        yield conn
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[None]:
+    """
+    Run everything inside on one connection and one transaction, committed on
+    a clean exit and rolled back if the block raises. The connection is only
+    checked out by the first statement that needs a transaction; reads through
+    read_connection() before that run outside it. Nested units of work join
+    the outer one. Tasks started inside get their own connections.
+    """
+    if _current_uow() is not None:
+        yield
+        return
+    async with AsyncExitStack() as stack:
+        token = _uow.set(_UnitOfWork(asyncio.current_task(), stack))
+        try:
+            yield
+        finally:
+            _uow.reset(token)
+
+
+async def uow_dependency() -> AsyncIterator[None]:
+    """FastAPI dependency: one unit of work per request (closed before the response is sent)."""
+    async with unit_of_work():
+        yield
+
+
+def in_unit_of_work() -> bool:
+    return _current_uow() is not None
+
+
+def in_uow_transaction() -> bool:
+    """
+    True if the current unit of work has checked out its connection, so its
+    transaction may hold writes that only that connection can see.
+    """
+    uow = _current_uow()
+    return uow is not None and uow.conn is not None
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[psycopg.AsyncConnection]:
+    """
+    A connection inside a transaction. Within a unit of work this is the
+    unit's own transaction, so the block commits (or rolls back) with it.
+    """
+    uow = _current_uow()
+    if uow is not None:
+        yield await uow.acquire()
+        return
+    async with _checkout() as conn, _begin(conn):
+        yield conn
+
+
+@asynccontextmanager
+async def connection() -> AsyncIterator[psycopg.AsyncConnection]:
+    """
+    A pooled connection, or the current unit of work's. Like psycopg-pool's
+    own (non-autocommit) connections, what runs inside is one transaction.
+    """
+    async with transaction() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def read_connection() -> AsyncIterator[psycopg.AsyncConnection]:
+    """
+    A connection for single-statement reads. Inside a unit of work that has
+    begun its transaction this is that transaction's connection, so the read
+    sees its uncommitted writes. Otherwise it is an autocommit checkout of its
+    own: reads never begin the unit's transaction, so a read-only request stays
+    outside one (and keeps sharing loads through load_flight).
+    """
+    if in_uow_transaction():
+        async with connection() as conn:
+            yield conn
+        return
+    async with _checkout() as conn:
+        await conn.set_autocommit(True)  # _reset() turns it back off
+        yield conn
+
+
+# ---------- read replica ----------
+
+
+def reads_from_replica() -> bool:
+    """
+    True if replica_connection() would use the replica right now: one is
+    configured and the current unit of work (if any) has not touched the
+    primary, whose uncommitted writes the replica cannot see.
+    """
+    return _replica_pool is not None and not in_uow_transaction()
+
+
+@asynccontextmanager
+async def replica_connection() -> AsyncIterator[psycopg.AsyncConnection]:
+    """
+    An autocommit connection for reads that may lag the primary by the
+    replication delay, or read_connection() when reads_from_replica() is False.
+    Callers decide whether a lagging answer is acceptable.
+    """
+    if not reads_from_replica():
+        async with read_connection() as conn:
+            yield conn
+        return
+    async with _checkout(replica=True) as conn:
+        yield conn
+
+
+# psycopg-pool stat -> (metric, type, help, scale)
+_POOL_METRICS = {
+    "pool_size": ("r4t_db_pool_connections", "gauge", "Connections open in the pool", 1),
+    "pool_available": ("r4t_db_pool_idle", "gauge", "Connections idle in the pool", 1),
+    "requests_waiting": ("r4t_db_pool_waiting", "gauge", "Callers waiting for a connection", 1),
+    "requests_num": ("r4t_db_pool_checkouts_total", "counter", "Connections handed out", 1),
+    "requests_queued": (
+        "r4t_db_pool_checkouts_queued_total",
+        "counter",
+        "Checkouts that had to wait for a connection",
+        1,
+    ),
+    "requests_wait_ms": (
+        "r4t_db_pool_wait_seconds_total",
+        "counter",
+        "Time spent waiting for a connection",
+        0.001,
+    ),
+    "requests_errors": (
+        "r4t_db_pool_checkout_errors_total",
+        "counter",
+        "Checkouts that timed out or failed",
+        1,
+    ),
+}
+
+
+async def _collect_metrics() -> list[Sample]:
+    out: list[Sample] = []
+    for label, pool in (("primary", _pool), ("replica", _replica_pool)):
+        if pool is None:
+            continue
+        stats = pool.get_stats()  # cumulative; pop_stats() would reset them
+        out.extend(
+            (name, typ, help, {"pool": label}, stats.get(key, 0) * scale)
+            for key, (name, typ, help, scale) in _POOL_METRICS.items()
+        )
+    return out
+
+
+REGISTRY.add_collector(_collect_metrics)
+
+
 async def check_ready() -> bool:
     """
     True if we can get a connection.
@@ -83,8 +367,13 @@ async def check_ready() -> bool:
 
 
 async def close_pool() -> None:
-    """Close the pool if it exists."""
-    global _pool
+    """Close the pools if they exist."""
+    global _pool, _replica_pool
+    if _replica_pool is not None:
+        try:
+            await _replica_pool.close()
+        finally:
+            _replica_pool = None
     if _pool is not None:
         try:
             await _pool.close()
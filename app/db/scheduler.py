@@ -0,0 +1,141 @@
+"""
+Periodic background tasks, each run by one process at a time.
+
+Every web process runs a Scheduler over the same PeriodicTasks. A process runs
+a task only while it holds that task's Postgres advisory lock, taken with
+pg_try_advisory_lock on one dedicated connection. Every
+SCHEDULER_ELECTION_SECONDS the scheduler tries the locks it doesn't hold (an
+empty try doubles as a liveness check of the connection). If the leader dies
+or its connection drops, Postgres releases the lock and the next try anywhere
+else takes over. A process that loses its connection cancels the tasks it was
+running before reconnecting, so two leaders overlap by at most one election
+interval. Tasks should still be safe to run twice.
+
+A new leader runs its task immediately, then every `interval` seconds. Without
+a pool (no DATABASE_URL, so a single process on a local store) every task
+runs here.
+
+Per task: r4t_periodic_runs_total{task,outcome}, r4t_periodic_run_seconds,
+r4t_periodic_last_success_timestamp_seconds and r4t_periodic_leader (1 in the
+process currently running it).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import psycopg
+
+from app.core.config import settings
+from app.core.metrics import (
+    PERIODIC_LAST_SUCCESS,
+    PERIODIC_LEADER,
+    PERIODIC_RUNS,
+    PERIODIC_SECONDS,
+)
+from app.db.pool import get_pool
+
+log = logging.getLogger("app.db.scheduler")
+
+# Prefixed so task names never share a key with hot-session locks
+_LOCK_KEY = "hashtextextended('r4t-periodic:' || n, 0)"
+
+
+@dataclass
+class PeriodicTask:
+    name: str
+    fn: Callable[[], Awaitable[object]]
+    interval: float  # seconds between the end of one run and the start of the next
+
+
+class Scheduler:
+    def __init__(self, tasks: list[PeriodicTask]) -> None:
+        self.tasks = {t.name: t for t in tasks}
+        self._running: dict[str, asyncio.Task[None]] = {}
+        self._conn: psycopg.AsyncConnection | None = None
+        self._stop = asyncio.Event()
+
+    def leads(self, name: str) -> bool:
+        return name in self._running
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def run(self) -> None:
+        """Elect and run until stop(); then cancel what runs here and release the locks."""
+        log.info("scheduler started (%s)", ", ".join(self.tasks))
+        try:
+            while not self._stop.is_set():
+                try:
+                    await self._elect()
+                except Exception as e:
+                    log.warning("scheduler lost its lock connection: %r", e)
+                    await self._abdicate()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._stop.wait(), settings.SCHEDULER_ELECTION_SECONDS)
+        finally:
+            await self._abdicate()
+            log.info("scheduler stopped")
+
+    # ---- internals ----
+
+    async def _elect(self) -> None:
+        wanted = [name for name in self.tasks if name not in self._running]
+        if get_pool() is None:
+            for name in wanted:
+                self._lead(name)
+            return
+        if self._conn is None or self._conn.closed:
+            await self._abdicate()
+            self._conn = await psycopg.AsyncConnection.connect(
+                settings.DATABASE_URL, autocommit=True
+            )
+        cur = await self._conn.execute(
+            f"SELECT n, pg_try_advisory_lock({_LOCK_KEY}) FROM unnest(%s::text[]) AS n",
+            (wanted,),
+        )
+        for name, won in await cur.fetchall():
+            if won:
+                self._lead(name)
+
+    def _lead(self, name: str) -> None:
+        log.info("leading periodic task %s", name)
+        PERIODIC_LEADER.labels(name).set(1)
+        self._running[name] = asyncio.create_task(self._loop(self.tasks[name]))
+
+    async def _abdicate(self) -> None:
+        """Stop everything running here; closing the connection releases the locks."""
+        tasks, self._running = self._running, {}
+        for name, t in tasks.items():
+            t.cancel()
+            PERIODIC_LEADER.labels(name).set(0)
+        for t in tasks.values():
+            with contextlib.suppress(asyncio.CancelledError):
+                await t
+        if self._conn is not None:
+            with contextlib.suppress(Exception):
+                await self._conn.close()
+            self._conn = None
+
+    async def _loop(self, task: PeriodicTask) -> None:
+        while True:
+            await self._run_once(task)
+            await asyncio.sleep(task.interval)
+
+    async def _run_once(self, task: PeriodicTask) -> None:
+        start = time.perf_counter()
+        try:
+            await task.fn()
+        except Exception:
+            PERIODIC_RUNS.labels(task.name, "failed").inc()
+            log.exception("periodic task %s failed", task.name)
+        else:
+            PERIODIC_RUNS.labels(task.name, "done").inc()
+            PERIODIC_LAST_SUCCESS.labels(task.name).set(time.time())
+        finally:
+            PERIODIC_SECONDS.labels(task.name).observe(time.perf_counter() - start)
@@ -6,9 +6,10 @@ from typing import Any
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 
+from app.core.metrics import HOUSE_SIM_ITERATIONS, HOUSE_SIM_SECONDS
 from app.core.templates import templates
 from app.features.house.engine import simulate
-from app.features.house.models import SimRequest
+from app.features.house.models import SimRequest, SimResult
 
 router = APIRouter()
 
@@ -75,10 +76,17 @@ def _serialize_result(res) -> dict[str, Any]:
     }
 
 
+def _simulate(req: SimRequest) -> SimResult:
+    with HOUSE_SIM_SECONDS.time():
+        res = simulate(req)
+    HOUSE_SIM_ITERATIONS.inc(res.iterations)
+    return res
+
+
 @router.get("/api/simulate")
 async def house_api_simulate(request: Request):
     req = _build_req_from_params(dict(request.query_params))
-    res = simulate(req)
+    res = _simulate(req)
     return JSONResponse(_serialize_result(res))
 
 
@@ -86,7 +94,7 @@ async def house_api_simulate(request: Request):
 async def house_run(request: Request) -> HTMLResponse:
     form = await request.form()
     req = _build_req_from_params(dict(form))
-    res = simulate(req)
+    res = _simulate(req)
     result_json = json.dumps(_serialize_result(res))
     return templates.TemplateResponse(
         "house/index.html",
@@ -0,0 +1,83 @@
+# app/features/treasure/atlas.py
+"""
+Per-deck sprite atlas: one image + a JSON coordinate map, so a session page
+loads a single picture instead of one request per card.
+
+Atlases live under IMAGE_CACHE_DIR/atlas/ and are keyed by a hash of the
+deck's cached image contents, so identical decks share one atlas and a changed
+image produces a new, independently cacheable file. They count against
+IMAGE_CACHE_MAX_BYTES like card images; reusing an atlas marks it recently used.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+
+from app.features.treasure import imaging
+from app.features.treasure.imagestore import (
+    ATLAS_DIRNAME,
+    cache_root,
+    digest_from_url,
+    path_for_url,
+    touch,
+    url_for,
+)
+from app.features.treasure.models import Session
+
+log = logging.getLogger("r4t.atlas")
+
+
+def deck_hash(tiles: dict[str, str]) -> str:
+    """Stable hash of oracle_id -> cached image url (content hashes for sharded urls)."""
+    h = hashlib.sha256()
+    for oid in sorted(tiles):
+        url = tiles[oid]
+        h.update(f"{oid}:{digest_from_url(url) or url}\n".encode())
+    return h.hexdigest()
+
+
+def _deck_tiles(s: Session) -> dict[str, str]:
+    tiles: dict[str, str] = {}
+    for c in s.pile.cards:
+        if c.oracle_id and c.img and path_for_url(c.img) is not None:
+            tiles.setdefault(c.oracle_id, c.img)
+    return tiles
+
+
+async def build_deck_atlas(s: Session) -> str | None:
+    """
+    Compose (or reuse) the atlas for a session's pile. Returns the url of the
+    JSON map, or None when there is nothing worth packing or Pillow is missing.
+    """
+    if not imaging.available():
+        return None
+    tiles = _deck_tiles(s)
+    if len(tiles) < 2:
+        return None
+
+    key = deck_hash(tiles)
+    map_url = url_for(f"{ATLAS_DIRNAME}/{key}.json")
+    map_path = path_for_url(map_url)
+    assert map_path is not None
+    if await asyncio.to_thread(map_path.exists):
+        await asyncio.to_thread(touch, map_url)
+        return map_url
+
+    await asyncio.to_thread((cache_root() / ATLAS_DIRNAME).mkdir, parents=True, exist_ok=True)
+    image_url = url_for(f"{ATLAS_DIRNAME}/{key}.webp")
+    files = []
+    for oid, url in sorted(tiles.items()):
+        p = path_for_url(url)
+        if p is not None:
+            files.append((oid, str(p)))
+    try:
+        await imaging.run_in_process(
+            imaging.compose_atlas, files, str(path_for_url(image_url)), str(map_path), image_url
+        )
+    except Exception:
+        log.exception("atlas build failed for session %s", s.id)
+        return None
+    log.info("built atlas %s (%d cards) for session %s", key[:12], len(files), s.id)
+    return map_url
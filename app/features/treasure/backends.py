@@ -0,0 +1,371 @@
+# app/features/treasure/backends.py
+"""
+Where session documents live.
+
+The SessionStore protocol covers everything the game needs from storage:
+create, load, serialized mutate (returning the delta), version lookup and TTL
+cleanup. Settings.SESSION_STORE picks the implementation:
+
+    postgres  the `sessions` table; mutations take a row lock and NOTIFY
+              their delta, so every process hears about them
+    sqlite    one file in WAL mode, driven from a single thread; mutations
+              are optimistic (version-guarded UPDATE, retried on conflict)
+    memory    a dict in this process; nothing survives a restart
+
+The sqlite and memory stores hand each delta to `publish` (the in-process
+event bus) instead of NOTIFY. Card assets, deck fingerprints, jobs and
+precache progress stay on Postgres whichever store holds sessions.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import sqlite3
+import time
+import weakref
+from collections.abc import AsyncIterator, Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Protocol, TypeVar
+
+from psycopg.types.json import Json
+
+from app.core.metrics import SESSION_LOCK_WAIT_SECONDS
+from app.core.profiling import span
+from app.db.pool import read_connection, replica_connection, transaction, unit_of_work
+from app.features.treasure.delta import EVENTS_CHANNEL, encode_event, session_delta
+from app.features.treasure.models import Session
+
+T = TypeVar("T")
+
+Mutator = Callable[[Session], Awaitable[None]] | Callable[[Session], None]
+Publish = Callable[[str], None]
+
+
+def as_dict(val: Any) -> dict:
+    if isinstance(val, dict):
+        return val
+    if isinstance(val, (bytes, bytearray, memoryview)):
+        val = bytes(val).decode("utf-8", "strict")
+    if isinstance(val, str):
+        return json.loads(val)
+    return json.loads(json.dumps(val))
+
+
+async def _apply(s: Session, mutator: Mutator) -> dict:
+    """Run the mutator, bump the version and return the new document."""
+    res = mutator(s)
+    if asyncio.iscoroutine(res):
+        await res
+    s.version += 1
+    with span("model_dump"):
+        return s.model_dump()
+
+
+class SessionStore(Protocol):
+    async def create(self, s: Session) -> None: ...
+
+    async def load(self, sid: str, *, replica: bool = False) -> Session | None:
+        """`replica`: the answer may come from a lagging read replica (Postgres only)."""
+        ...
+
+    async def mutate(self, sid: str, mutator: Mutator) -> tuple[Session, dict]:
+        """Apply `mutator` serialized per session; raises KeyError if it doesn't exist."""
+        ...
+
+    async def version(self, sid: str, *, replica: bool = False) -> int | None: ...
+
+    async def cleanup(self, ttl_hours: int) -> int:
+        """Delete sessions untouched for `ttl_hours`; returns how many."""
+        ...
+
+    async def close(self) -> None: ...
+
+
+class _SessionLocks:
+    """Per-session asyncio locks that go away once nobody holds or waits on them."""
+
+    def __init__(self, store: str) -> None:
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._wait = SESSION_LOCK_WAIT_SECONDS.labels(store)
+
+    def __call__(self, sid: str) -> asyncio.Lock:
+        lock = self._locks.get(sid)
+        if lock is None:
+            lock = self._locks[sid] = asyncio.Lock()
+        return lock
+
+    @contextlib.asynccontextmanager
+    async def hold(self, sid: str) -> AsyncIterator[None]:
+        """Hold the session's lock, recording how long it took to get it."""
+        lock = self(sid)
+        start = time.perf_counter()
+        async with lock:
+            self._wait.observe(time.perf_counter() - start)
+            yield
+
+
+# ---------- Postgres ----------
+
+
+class PostgresSessionStore:
+    def __init__(self) -> None:
+        # The row lock is taken by the SELECT ... FOR UPDATE round trip
+        self._lock_wait = SESSION_LOCK_WAIT_SECONDS.labels("postgres")
+
+    async def create(self, s: Session) -> None:
+        async with transaction() as ac:
+            await ac.execute(
+                "INSERT INTO sessions (id, data, version) VALUES (%s, %s, %s)",
+                (s.id, Json(s.model_dump()), s.version),
+                prepare=True,
+            )
+
+    async def load(self, sid: str, *, replica: bool = False) -> Session | None:
+        async with replica_connection() if replica else read_connection() as ac:
+            cur = await ac.execute("SELECT data FROM sessions WHERE id=%s", (sid,), prepare=True)
+            row = await cur.fetchone()
+            if not row:
+                return None
+            with span("model_validate"):
+                return Session.model_validate(as_dict(row[0]))
+
+    async def mutate(self, sid: str, mutator: Mutator) -> tuple[Session, dict]:
+        """
+        Serialize mutations per session id using row-level lock.
+        NOTIFYs the delta (delivered on commit, in commit order) for real-time
+        subscribers in every process. Runs as (or joins) a unit of work, so
+        store calls made by an async mutator reuse the locked connection
+        instead of checking out another one while holding it.
+        """
+        async with unit_of_work(), transaction() as ac:
+            start = time.perf_counter()
+            cur = await ac.execute(
+                "SELECT data FROM sessions WHERE id=%s FOR UPDATE", (sid,), prepare=True
+            )
+            row = await cur.fetchone()  # pipelined: this is where we wait for the lock
+            self._lock_wait.observe(time.perf_counter() - start)
+            if not row:
+                raise KeyError("session not found")
+            before = as_dict(row[0])
+            with span("model_validate"):
+                s = Session.model_validate(before)
+            after = await _apply(s, mutator)
+            await ac.execute(
+                "UPDATE sessions SET data=%s, version=%s, updated_at=now() WHERE id=%s",
+                (Json(after), after["version"], sid),
+                prepare=True,
+            )
+            delta = session_delta(before, after)
+            await ac.execute(
+                "SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, encode_event(delta)), prepare=True
+            )
+        return s, delta
+
+    async def version(self, sid: str, *, replica: bool = False) -> int | None:
+        async with replica_connection() if replica else read_connection() as ac:
+            cur = await ac.execute("SELECT version FROM sessions WHERE id=%s", (sid,), prepare=True)
+            row = await cur.fetchone()
+        return None if row is None else int(row[0])
+
+    async def cleanup(self, ttl_hours: int) -> int:
+        async with transaction() as ac:
+            cur = await ac.execute(
+                """
+                WITH base AS (
+                  SELECT id
+                  FROM sessions
+                  WHERE COALESCE(updated_at, created_at, now()) < (now() - %s::interval)
+                )
+                DELETE FROM sessions s USING base b
+                WHERE s.id = b.id
+                RETURNING s.id
+                """,
+                (f"{int(ttl_hours)} hours",),
+            )
+            rows = await cur.fetchall()
+        return len(rows or [])
+
+    async def close(self) -> None:
+        pass  # the pool belongs to app.db.pool
+
+
+# ---------- SQLite ----------
+
+
+class SqliteSessionStore:
+    """
+    Sessions in a local SQLite file. All statements run on one dedicated
+    thread with its own connection, so the event loop never blocks on disk.
+    """
+
+    def __init__(self, path: str, publish: Publish | None = None) -> None:
+        self.path = path
+        self._publish = publish
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-sessions")
+        self._db: sqlite3.Connection | None = None
+        self._locks = _SessionLocks("sqlite")
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=5000")
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                  id TEXT PRIMARY KEY,
+                  data TEXT NOT NULL,
+                  version INTEGER NOT NULL DEFAULT 0,
+                  created_at REAL NOT NULL,
+                  updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._db = db
+        return self._db
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _insert(self, sid: str, data: str, version: int) -> None:
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO sessions (id, data, version, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (sid, data, version, now, now),
+        )
+
+    def _select(self, sid: str) -> tuple[str, int] | None:
+        return (
+            self._conn().execute("SELECT data, version FROM sessions WHERE id=?", (sid,)).fetchone()
+        )
+
+    def _update(self, sid: str, data: str, version: int, expected: int) -> bool:
+        cur = self._conn().execute(
+            "UPDATE sessions SET data=?, version=?, updated_at=? WHERE id=? AND version=?",
+            (data, version, time.time(), sid, expected),
+        )
+        return cur.rowcount == 1
+
+    def _version(self, sid: str) -> int | None:
+        row = self._conn().execute("SELECT version FROM sessions WHERE id=?", (sid,)).fetchone()
+        return None if row is None else int(row[0])
+
+    def _delete_older(self, cutoff: float) -> int:
+        return self._conn().execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount
+
+    async def create(self, s: Session) -> None:
+        await self._run(self._insert, s.id, s.model_dump_json(), s.version)
+
+    async def load(self, sid: str, *, replica: bool = False) -> Session | None:
+        row = await self._run(self._select, sid)
+        if row is None:
+            return None
+        with span("model_validate"):
+            return Session.model_validate_json(row[0])
+
+    async def mutate(self, sid: str, mutator: Mutator) -> tuple[Session, dict]:
+        async with self._locks.hold(sid):
+            while True:
+                row = await self._run(self._select, sid)
+                if row is None:
+                    raise KeyError("session not found")
+                before = json.loads(row[0])
+                with span("model_validate"):
+                    s = Session.model_validate(before)
+                after = await _apply(s, mutator)
+                # Another process sharing the file may have written meanwhile; redo on top of it
+                if await self._run(self._update, sid, json.dumps(after), s.version, row[1]):
+                    break
+        delta = session_delta(before, after)
+        if self._publish is not None:
+            self._publish(encode_event(delta))
+        return s, delta
+
+    async def version(self, sid: str, *, replica: bool = False) -> int | None:
+        return await self._run(self._version, sid)
+
+    async def cleanup(self, ttl_hours: int) -> int:
+        return await self._run(self._delete_older, time.time() - ttl_hours * 3600)
+
+    async def close(self) -> None:
+        def _close() -> None:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
+
+
+# ---------- in-memory ----------
+
+
+class MemorySessionStore:
+    """Session documents in a dict; for tests and throwaway single-process runs."""
+
+    def __init__(self, publish: Publish | None = None) -> None:
+        self._publish = publish
+        self._docs: dict[str, tuple[dict, float]] = {}  # sid -> (document, updated_at)
+        self._locks = _SessionLocks("memory")
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    async def create(self, s: Session) -> None:
+        if s.id in self._docs:
+            raise ValueError(f"session {s.id} already exists")
+        self._docs[s.id] = (s.model_dump(), time.time())
+
+    async def load(self, sid: str, *, replica: bool = False) -> Session | None:
+        doc = self._docs.get(sid)
+        if doc is None:
+            return None
+        with span("model_validate"):
+            return Session.model_validate(doc[0])
+
+    async def mutate(self, sid: str, mutator: Mutator) -> tuple[Session, dict]:
+        async with self._locks.hold(sid):
+            doc = self._docs.get(sid)
+            if doc is None:
+                raise KeyError("session not found")
+            before = doc[0]
+            with span("model_validate"):
+                s = Session.model_validate(before)
+            after = await _apply(s, mutator)
+            self._docs[sid] = (after, time.time())
+        delta = session_delta(before, after)
+        if self._publish is not None:
+            self._publish(encode_event(delta))
+        return s, delta
+
+    async def version(self, sid: str, *, replica: bool = False) -> int | None:
+        doc = self._docs.get(sid)
+        return None if doc is None else int(doc[0]["version"])
+
+    async def cleanup(self, ttl_hours: int) -> int:
+        cutoff = time.time() - ttl_hours * 3600
+        expired = [sid for sid, (_, ts) in self._docs.items() if ts < cutoff]
+        for sid in expired:
+            del self._docs[sid]
+        return len(expired)
+
+    async def close(self) -> None:
+        self._docs.clear()
+
+
+def open_session_store(
+    kind: str, *, sqlite_path: str = "", publish: Publish | None = None
+) -> SessionStore:
+    if kind == "postgres":
+        return PostgresSessionStore()
+    if kind == "sqlite":
+        return SqliteSessionStore(sqlite_path, publish)
+    if kind == "memory":
+        return MemorySessionStore(publish)
+    raise ValueError(f"unknown session store: {kind}")
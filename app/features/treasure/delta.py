@@ -0,0 +1,112 @@
+# app/features/treasure/delta.py
+"""
+Compact, versioned session deltas.
+
+A delta describes how to get from one session version to the next, computed
+from the two `model_dump()` dicts that mutate_session already has in hand:
+
+    {
+      "sid": "...", "v": 13, "base": 12,
+      "set":     {top-level fields that changed, e.g. "turn_idx": 1},
+      "players": {player_id: {changed fields, "gains+": [appended cards]}},
+      "log":     {"trim": 0, "add": ["new line"]},
+      "pile":    {"count": 57, "revealed": [...]}
+    }
+
+Only changed parts are present. The pile's card order is never included (it
+is hidden information and the table UI only needs the count). Clients apply a
+delta when `base` equals their version and resync otherwise.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+EVENTS_CHANNEL = "session_events"
+
+# pg_notify payloads must stay under 8000 bytes
+MAX_EVENT_BYTES = 7900
+
+_NESTED = {"players", "pile", "log"}
+
+
+def _log_delta(before: list[str], after: list[str]) -> dict | None:
+    """Lines are only appended, then trimmed from the front to the cap."""
+    if before == after:
+        return None
+    for trim in range(len(before) + 1):
+        kept = len(before) - trim
+        if kept <= len(after) and before[trim:] == after[:kept]:
+            return {"trim": trim, "add": after[kept:]}
+    return {"trim": len(before), "add": after}
+
+
+def _player_delta(before: dict, after: dict) -> dict:
+    out: dict[str, Any] = {}
+    for k, v in after.items():
+        old = before.get(k)
+        if old == v:
+            continue
+        if k == "gains" and isinstance(old, list) and v[: len(old)] == old:
+            out["gains+"] = v[len(old) :]
+        else:
+            out[k] = v
+    return out
+
+
+def _players_delta(before: list[dict], after: list[dict]) -> dict | None:
+    if [p.get("id") for p in before] != [p.get("id") for p in after]:
+        return None  # roster changed; caller sends the full list
+    out = {}
+    for b, a in zip(before, after, strict=True):
+        d = _player_delta(b, a)
+        if d:
+            out[a["id"]] = d
+    return out
+
+
+def session_delta(before: dict, after: dict) -> dict:
+    """Delta from `before` to `after` (both Session.model_dump() dicts)."""
+    delta: dict[str, Any] = {
+        "sid": after["id"],
+        "v": after.get("version", 0),
+        "base": before.get("version", 0),
+    }
+
+    changed = {k: v for k, v in after.items() if k not in _NESTED and before.get(k) != v}
+    changed.pop("version", None)
+
+    players = _players_delta(before.get("players") or [], after.get("players") or [])
+    if players is None:
+        changed["players"] = after.get("players") or []
+    elif players:
+        delta["players"] = players
+
+    log = _log_delta(before.get("log") or [], after.get("log") or [])
+    if log is not None:
+        delta["log"] = log
+
+    pile_b, pile_a = before.get("pile") or {}, after.get("pile") or {}
+    pile: dict[str, Any] = {}
+    if len(pile_b.get("cards") or []) != len(pile_a.get("cards") or []):
+        pile["count"] = len(pile_a.get("cards") or [])
+    if (pile_b.get("revealed") or []) != (pile_a.get("revealed") or []):
+        pile["revealed"] = pile_a.get("revealed") or []
+    if pile:
+        delta["pile"] = pile
+
+    if changed:
+        delta["set"] = changed
+    return delta
+
+
+def encode_event(delta: dict) -> str:
+    """JSON for NOTIFY/SSE; oversized deltas degrade to a bare resync marker."""
+    raw = json.dumps(delta, separators=(",", ":"), ensure_ascii=False)
+    if len(raw.encode("utf-8")) <= MAX_EVENT_BYTES:
+        return raw
+    return json.dumps(
+        {"sid": delta["sid"], "v": delta["v"], "base": delta["base"], "resync": True},
+        separators=(",", ":"),
+    )
@@ -0,0 +1,154 @@
+# app/features/treasure/events.py
+"""
+Per-process fan-out of session delta events.
+
+mutate_session NOTIFYs every delta on `session_events`. Each process runs one
+LISTEN connection (SessionBus.run) and hands events to the SSE streams
+connected to it. The sqlite and memory session stores have no NOTIFY and feed
+the bus directly. Each stream has a bounded queue. A client that falls behind
+gets a single `resync` marker instead of an ever-growing backlog. A small
+per-session ring of recent events serves reconnects carrying a Last-Event-ID.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass
+
+import psycopg
+
+from app.core.config import settings
+from app.features.treasure.delta import EVENTS_CHANNEL
+from app.features.treasure.store import add_event_listener, get_session_version
+
+log = logging.getLogger("r4t.events")
+
+REPLAY_EVENTS = 64  # per session
+REPLAY_SESSIONS = 1024  # sessions with a replay ring, least recently active dropped
+
+
+@dataclass(frozen=True)
+class Event:
+    v: int
+    base: int
+    data: str  # encoded delta, sent as-is
+
+
+# Queued in place of events a subscriber could not keep up with
+RESYNC = Event(v=-1, base=-1, data="{}")
+
+
+class Subscriber:
+    def __init__(self, maxsize: int) -> None:
+        self.queue: asyncio.Queue[Event] = asyncio.Queue(maxsize=maxsize)
+        self.lagged = False
+
+    def offer(self, ev: Event) -> None:
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(ev)
+        except asyncio.QueueFull:
+            # Drop the backlog; the client refetches state and carries on from there
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.lagged = True
+
+    async def get(self) -> Event:
+        ev = await self.queue.get()
+        if ev is RESYNC:
+            self.lagged = False
+        return ev
+
+
+class SessionBus:
+    def __init__(self) -> None:
+        self._subs: dict[str, set[Subscriber]] = {}
+        self._rings: dict[str, deque[Event]] = {}
+
+    def subscribe(self, sid: str) -> Subscriber:
+        sub = Subscriber(settings.SSE_QUEUE_SIZE)
+        self._subs.setdefault(sid, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sid: str, sub: Subscriber) -> None:
+        subs = self._subs.get(sid)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sid]
+
+    def dispatch(self, payload: str) -> None:
+        try:
+            d = json.loads(payload)
+            sid, ev = d["sid"], Event(v=int(d["v"]), base=int(d["base"]), data=payload)
+        except (ValueError, KeyError, TypeError):
+            log.warning("dropping malformed session event")
+            return
+        ring = self._rings.pop(sid, None) or deque(maxlen=REPLAY_EVENTS)
+        ring.append(ev)
+        self._rings[sid] = ring
+        while len(self._rings) > REPLAY_SESSIONS:
+            del self._rings[next(iter(self._rings))]
+        for sub in self._subs.get(sid, ()):
+            sub.offer(ev)
+
+    def replay(self, sid: str, since: int) -> list[Event] | None:
+        """Events after `since` if this process saw all of them, else None."""
+        ring = self._rings.get(sid)
+        if not ring:
+            return None
+        missing = [ev for ev in ring if ev.v > since]
+        if not missing or missing[0].base != since:
+            return None
+        return missing
+
+    def _resync_all(self) -> None:
+        self._rings.clear()
+        for subs in self._subs.values():
+            for sub in subs:
+                sub.offer(RESYNC)
+
+    async def run(self) -> None:
+        """LISTEN loop (runs until cancelled). After a reconnect every stream is told to resync."""
+        connected_before = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    settings.DATABASE_URL, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {EVENTS_CHANNEL}")
+                    if connected_before:
+                        self._resync_all()
+                    connected_before = True
+                    async for n in conn.notifies():
+                        self.dispatch(n.payload)
+            except Exception as e:
+                log.warning("session event listener disconnected: %r", e)
+                await asyncio.sleep(1.0)
+
+
+bus = SessionBus()
+add_event_listener(bus.dispatch)
+
+
+async def catch_up(sid: str, since: int | None) -> list[Event] | None:
+    """
+    What a (re)connecting stream must send before live events: [] if the client
+    is current, the missed events if this process still has them, or None if it
+    has to resync. Call after subscribing so nothing slips between the two.
+    Raises KeyError if the session does not exist.
+    """
+    current = await get_session_version(sid)
+    if current is None:
+        raise KeyError("session not found")
+    if since is None or since >= current:
+        return []
+    missed = bus.replay(sid, since)
+    if missed and missed[-1].v >= current:
+        return missed
+    return None
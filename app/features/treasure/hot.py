@@ -0,0 +1,301 @@
+# app/features/treasure/hot.py
+"""
+Hot sessions: in-memory ownership with write-behind persistence (opt-in via
+HOT_SESSIONS).
+
+A process that mutates a session claims it with a Postgres advisory lock held
+on one long-lived "owner" connection. It keeps the parsed Session behind a
+per-session asyncio.Lock, so an action is a mutate + model_dump in memory
+instead of a row-lock round trip. Dirty sessions are written back every
+HOT_SESSION_FLUSH_SECONDS in one transaction that also NOTIFYs the deltas
+accumulated since the last flush, so subscribers only ever hear about durable
+versions. Closing a session (`end`), going idle, or shutting down flushes it
+and releases the lock.
+
+A process that needs a session owned elsewhere NOTIFYs `hot_release` and
+waits for the owner to flush and let go. Flushes are guarded by the version
+last written, so a process that lost its lock (owner connection dropped) can
+never overwrite a newer owner's state. It drops its copy instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+import psycopg
+from psycopg.types.json import Json
+
+from app.core.config import settings
+from app.core.metrics import REGISTRY, SESSION_LOCK_WAIT_SECONDS, Sample
+from app.core.profiling import span
+from app.core.singleflight import SingleFlight
+from app.db.pool import get_pool
+from app.features.treasure.delta import EVENTS_CHANNEL, encode_event, session_delta
+from app.features.treasure.models import Session
+
+log = logging.getLogger("r4t.hot")
+
+RELEASE_CHANNEL = "hot_release"
+_LOCK_KEY = "hashtextextended(%s, 0)"
+
+_lock_wait = SESSION_LOCK_WAIT_SECONDS.labels("hot")
+
+
+class LostOwnership(Exception):
+    pass
+
+
+@dataclass(eq=False)
+class HotSession:
+    sid: str
+    session: Session
+    data: dict  # session.model_dump() as of the last mutation
+    persisted: int  # version currently in the sessions table
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    flushing: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pending: list[dict] = field(default_factory=list)  # deltas not flushed yet
+    last_used: float = field(default_factory=time.monotonic)
+    closed: bool = False
+
+
+class HotSessions:
+    def __init__(self) -> None:
+        self.active = False
+        self._hot: dict[str, HotSession] = {}
+        self._claims: SingleFlight[str, HotSession] = SingleFlight()
+        self._conn: psycopg.AsyncConnection | None = None
+        self._handoffs: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._hot)
+
+    # ---- reads ----
+
+    def snapshot(self, sid: str) -> Session | None:
+        """A private copy of the live state if this process owns the session."""
+        hs = self._hot.get(sid)
+        if hs is None:
+            return None
+        with span("model_validate"):
+            return Session.model_validate(hs.data)
+
+    def version(self, sid: str) -> int | None:
+        hs = self._hot.get(sid)
+        return None if hs is None else int(hs.data["version"])
+
+    # ---- writes ----
+
+    async def mutate(
+        self,
+        sid: str,
+        mutator: Callable[[Session], Awaitable[None]] | Callable[[Session], None],
+    ) -> tuple[Session, dict]:
+        """
+        Same contract as store.mutate_session_delta, applied in memory. The
+        returned Session is the live object: read what you need before awaiting.
+        """
+        while True:
+            hs = self._hot.get(sid) or await self._claims.do(sid, lambda: self._claim(sid))
+            start = time.perf_counter()
+            async with hs.lock:
+                _lock_wait.observe(time.perf_counter() - start)
+                if hs.closed:
+                    continue  # released while we waited; claim again
+                s = hs.session
+                try:
+                    res = mutator(s)
+                    if asyncio.iscoroutine(res):
+                        await res
+                except BaseException:
+                    hs.session = Session.model_validate(hs.data)  # roll back
+                    raise
+                s.version += 1
+                with span("model_dump"):
+                    after = s.model_dump()
+                delta = session_delta(hs.data, after)
+                hs.data = after
+                hs.pending.append(delta)
+                hs.last_used = time.monotonic()
+            break
+        if s.is_closed:
+            await self.release(sid)
+        return s, delta
+
+    async def release(self, sid: str) -> None:
+        """Flush, forget and unlock a session this process owns."""
+        hs = self._hot.get(sid)
+        if hs is None:
+            return
+        async with hs.lock:
+            if hs.closed:
+                return
+            await self._flush(hs)
+            self._drop(hs)
+        await self._owner().execute(f"SELECT pg_advisory_unlock({_LOCK_KEY})", (sid,))
+
+    # ---- lifecycle ----
+
+    async def start(self) -> None:
+        self._conn = await psycopg.AsyncConnection.connect(settings.DATABASE_URL, autocommit=True)
+        self.active = True
+
+    async def run(self) -> None:
+        """Write-behind, idle eviction and handoff requests (runs until cancelled)."""
+        await asyncio.gather(self._flusher(), self._listen())
+
+    async def close(self) -> None:
+        """Flush and release everything (shutdown)."""
+        self.active = False
+        for sid in list(self._hot):
+            try:
+                await self.release(sid)
+            except Exception:
+                log.exception("releasing hot session %s failed", sid)
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    # ---- internals ----
+
+    def _owner(self) -> psycopg.AsyncConnection:
+        assert self._conn is not None, "hot sessions not started"
+        return self._conn
+
+    async def _claim(self, sid: str) -> HotSession:
+        conn = self._owner()
+        deadline = time.monotonic() + settings.HOT_SESSION_HANDOFF_SECONDS
+        asked = False
+        while True:
+            cur = await conn.execute(f"SELECT pg_try_advisory_lock({_LOCK_KEY})", (sid,))
+            row = await cur.fetchone()
+            if row and row[0]:
+                break
+            if not asked:
+                await conn.execute("SELECT pg_notify(%s, %s)", (RELEASE_CHANNEL, sid))
+                asked = True
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"session {sid} is held by another process")
+            await asyncio.sleep(0.025)
+
+        try:
+            pool = get_pool()
+            assert pool is not None, "DB pool not initialized"
+            async with pool.connection() as ac:
+                cur = await ac.execute("SELECT data FROM sessions WHERE id=%s", (sid,))
+                found = await cur.fetchone()
+            if not found:
+                raise KeyError("session not found")
+        except BaseException:
+            await conn.execute(f"SELECT pg_advisory_unlock({_LOCK_KEY})", (sid,))
+            raise
+        data = found[0] if isinstance(found[0], dict) else json.loads(found[0])
+        s = Session.model_validate(data)
+        data = s.model_dump()
+        hs = HotSession(sid=sid, session=s, data=data, persisted=int(data["version"]))
+        self._hot[sid] = hs
+        return hs
+
+    def _drop(self, hs: HotSession) -> None:
+        hs.closed = True
+        if self._hot.get(hs.sid) is hs:
+            del self._hot[hs.sid]
+
+    async def _flush(self, hs: HotSession) -> None:
+        async with hs.flushing:
+            if not hs.pending:
+                return
+            # data and pending change together without an await in mutate(), so this pair is consistent
+            pending, data = hs.pending, hs.data
+            hs.pending = []
+            pool = get_pool()
+            assert pool is not None, "DB pool not initialized"
+            try:
+                async with pool.connection() as ac, ac.transaction():
+                    cur = await ac.execute(
+                        "UPDATE sessions SET data=%s, version=%s, updated_at=now()"
+                        " WHERE id=%s AND version=%s",
+                        (Json(data), data["version"], hs.sid, hs.persisted),
+                    )
+                    if cur.rowcount == 0:
+                        raise LostOwnership(hs.sid)
+                    for d in pending:
+                        await ac.execute(
+                            "SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, encode_event(d))
+                        )
+            except LostOwnership:
+                log.error("hot session %s changed or vanished underneath us; dropping it", hs.sid)
+                self._drop(hs)
+                return
+            except BaseException:
+                hs.pending[:0] = pending  # retried on the next tick
+                raise
+            hs.persisted = int(data["version"])
+
+    async def _flusher(self) -> None:
+        while True:
+            await asyncio.sleep(settings.HOT_SESSION_FLUSH_SECONDS)
+            if self._conn is None or self._conn.closed:
+                await self._reconnect()
+            idle_before = time.monotonic() - settings.HOT_SESSION_IDLE_SECONDS
+            for hs in list(self._hot.values()):
+                try:
+                    if hs.last_used < idle_before:
+                        await self.release(hs.sid)
+                    else:
+                        await self._flush(hs)
+                except Exception as e:
+                    log.warning("flushing hot session %s failed: %r", hs.sid, e)
+
+    async def _reconnect(self) -> None:
+        """The owner connection died and took our advisory locks with it."""
+        log.error(
+            "hot session owner connection lost; flushing and dropping %d session(s)", len(self)
+        )
+        for hs in list(self._hot.values()):
+            async with hs.lock:
+                with contextlib.suppress(Exception):
+                    await self._flush(hs)  # version-guarded: loses to any new owner
+                self._drop(hs)
+        try:
+            await self.start()
+        except Exception as e:
+            self.active = False
+            log.warning("hot session owner connection unavailable: %r", e)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    settings.DATABASE_URL, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {RELEASE_CHANNEL}")
+                    async for n in conn.notifies():
+                        if n.payload in self._hot:
+                            t = asyncio.create_task(self._release_quietly(n.payload))
+                            self._handoffs.add(t)
+                            t.add_done_callback(self._handoffs.discard)
+            except Exception as e:
+                log.warning("hot session release listener disconnected: %r", e)
+                await asyncio.sleep(1.0)
+
+    async def _release_quietly(self, sid: str) -> None:
+        try:
+            await self.release(sid)
+        except Exception:
+            log.exception("handing off hot session %s failed", sid)
+
+
+hot_sessions = HotSessions()
+
+
+async def _collect_metrics() -> list[Sample]:
+    return [("r4t_hot_sessions", "gauge", "Sessions this process owns hot", {}, len(hot_sessions))]
+
+
+REGISTRY.add_collector(_collect_metrics)
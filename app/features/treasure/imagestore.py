@@ -0,0 +1,387 @@
+# app/features/treasure/imagestore.py
+"""
+Content-addressed, size-bounded image cache.
+
+Layout under IMAGE_CACHE_DIR:
+  <aa>/<sha256><ext>   committed images, sharded by the first two hex chars of their digest
+  atlas/<key>.*        per-deck sprite atlases (sheet, JSON map and its .gz); see atlas.py
+  .tmp/<random>.part   in-flight downloads (renamed into place once complete)
+
+Because a file's name *is* its content hash, a truncated or corrupted file is
+detectable by re-hashing it, and the same bytes are never stored twice.
+
+Card images and atlases share IMAGE_CACHE_MAX_BYTES and one LRU order: card
+images by card_assets.last_access, atlases by their map's mtime, which is
+refreshed whenever the atlas is reused.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.core.config import settings
+from app.db.pool import get_pool
+from app.features.treasure.store import evict_assets_over_budget, forget_missing_local_paths
+
+log = logging.getLogger("r4t.imagestore")
+
+URL_PREFIX = "/img-cache"
+CHUNK_SIZE = 64 * 1024
+TMP_DIRNAME = ".tmp"
+ATLAS_DIRNAME = "atlas"
+# In-flight files younger than this may belong to another worker; leave them alone.
+STALE_TMP_SECONDS = 15 * 60
+
+_SHARDED_RE = re.compile(r"^(?P<shard>[0-9a-f]{2})/(?P<digest>[0-9a-f]{64})(?P<ext>\.[a-z0-9]+)$")
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    url: str  # public path, e.g. /img-cache/ab/ab12...ef.jpg
+    digest: str  # sha256 hex of the file contents
+    size: int  # bytes on disk
+
+
+@dataclass
+class ScanReport:
+    files: int = 0
+    bytes: int = 0
+    present: set[str] = field(default_factory=set)  # urls of verified files
+    removed: list[str] = field(default_factory=list)  # urls of corrupt files deleted
+    stale_tmp: int = 0
+
+
+@dataclass(frozen=True)
+class CachedAtlas:
+    url: str  # the JSON map's url, as referenced by sessions and decks
+    size: int  # bytes of all the atlas' files
+    used_at: float  # the map's mtime: last built or reused
+
+
+# ---------- paths ----------
+
+
+def cache_root() -> Path:
+    return Path(settings.IMAGE_CACHE_DIR)
+
+
+def ensure_cache_dir() -> Path:
+    root = cache_root()
+    (root / TMP_DIRNAME).mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def ext_for_content_type(ctype: str | None) -> str:
+    c = (ctype or "image/jpeg").lower()
+    if "webp" in c:
+        return ".webp"
+    if "avif" in c:
+        return ".avif"
+    if "png" in c:
+        return ".png"
+    return ".jpg"
+
+
+def rel_path_for(digest: str, ext: str) -> str:
+    return f"{digest[:2]}/{digest}{ext}"
+
+
+def url_for(rel_path: str) -> str:
+    return f"{URL_PREFIX}/{rel_path}"
+
+
+def path_for_url(url: str) -> Path | None:
+    """Map a /img-cache/... url back to a file under the cache root (None if it escapes it)."""
+    if not url or not url.startswith(URL_PREFIX + "/"):
+        return None
+    rel = url[len(URL_PREFIX) + 1 :]
+    if not rel or rel.startswith("/") or ".." in rel.split("/"):
+        return None
+    return cache_root() / rel
+
+
+def digest_from_url(url: str) -> str | None:
+    """Content hash encoded in a sharded cache url, or None for legacy/flat names."""
+    m = _SHARDED_RE.match(url[len(URL_PREFIX) + 1 :] if url.startswith(URL_PREFIX + "/") else url)
+    return m.group("digest") if m else None
+
+
+# ---------- writes ----------
+
+
+def commit_stream(chunks: Iterable[bytes], ext: str) -> StoredImage:
+    """
+    Stream chunks into a temp file while hashing, fsync, then atomically rename
+    into its content-addressed location. A crash at any point leaves either no
+    file or a complete one; leftovers in .tmp are swept by scan_cache().
+    """
+    root = ensure_cache_dir()
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=root / TMP_DIRNAME, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        if size == 0:
+            raise ValueError("refusing to cache an empty image")
+        digest = h.hexdigest()
+        rel = rel_path_for(digest, ext)
+        final = root / rel
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, final)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    return StoredImage(url=url_for(rel), digest=digest, size=size)
+
+
+@contextmanager
+def scratch_file(suffix: str = ".part") -> Iterator[Path]:
+    """
+    A private temp file under .tmp, deleted when the block exits. Unlike a
+    committed image, nobody else can reach (or remove) it while it is in use.
+    """
+    fd, name = tempfile.mkstemp(dir=ensure_cache_dir() / TMP_DIRNAME, suffix=suffix)
+    os.close(fd)
+    try:
+        yield Path(name)
+    finally:
+        try:
+            os.unlink(name)
+        except FileNotFoundError:
+            pass
+
+
+def exists(url: str) -> bool:
+    p = path_for_url(url)
+    return p is not None and p.is_file()
+
+
+def touch(url: str) -> None:
+    """Mark a cached file as just used (atlases are ordered for eviction by mtime)."""
+    p = path_for_url(url)
+    if p is not None:
+        try:
+            os.utime(p)
+        except FileNotFoundError:
+            pass
+
+
+def remove(url: str) -> bool:
+    p = path_for_url(url)
+    if p is None:
+        return False
+    try:
+        p.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _atlas_key(url: str) -> str | None:
+    prefix = url_for(ATLAS_DIRNAME) + "/"
+    return url[len(prefix) :].split(".", 1)[0] if url.startswith(prefix) else None
+
+
+def remove_atlas(map_url: str) -> int:
+    """Delete an atlas' sheet, map and precompressed map. Returns the number of files removed."""
+    key = _atlas_key(map_url)
+    if not key:
+        return 0
+    removed = 0
+    for f in (cache_root() / ATLAS_DIRNAME).glob(f"{key}.*"):
+        if f.suffix == ".part":
+            continue
+        try:
+            f.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def list_atlases() -> list[CachedAtlas]:
+    """Complete atlases (those with a map) under the cache root. Blocking."""
+    sizes: dict[str, int] = {}
+    used: dict[str, float] = {}
+    try:
+        files = list((cache_root() / ATLAS_DIRNAME).iterdir())
+    except FileNotFoundError:
+        return []
+    for f in files:
+        if f.suffix == ".part":
+            continue
+        key = f.name.split(".", 1)[0]
+        try:
+            st = f.stat()
+        except FileNotFoundError:
+            continue
+        sizes[key] = sizes.get(key, 0) + st.st_size
+        if f.name == f"{key}.json":
+            used[key] = st.st_mtime
+    return [
+        CachedAtlas(url_for(f"{ATLAS_DIRNAME}/{key}.json"), sizes[key], used_at)
+        for key, used_at in used.items()
+    ]
+
+
+# ---------- integrity ----------
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scan_cache(verify: bool = True) -> ScanReport:
+    """
+    Walk the cache: drop stale temp files and, with `verify`, re-hash sharded
+    files and delete any whose contents no longer match their name. Legacy flat
+    files and atlases are counted but left untouched. Without `verify` this is
+    only a listing. Blocking; run it off the event loop.
+    """
+    root = ensure_cache_dir()
+    report = ScanReport()
+    now = time.time()
+
+    for tmp in (root / TMP_DIRNAME).iterdir():
+        try:
+            if now - tmp.stat().st_mtime > STALE_TMP_SECONDS:
+                tmp.unlink()
+                report.stale_tmp += 1
+        except FileNotFoundError:
+            continue
+
+    for entry in root.iterdir():
+        if entry.name == TMP_DIRNAME:
+            continue
+        if entry.is_file():
+            report.files += 1
+            report.bytes += entry.stat().st_size
+            report.present.add(url_for(entry.name))
+            continue
+        if not entry.is_dir():
+            continue
+        for f in entry.iterdir():
+            rel = f"{entry.name}/{f.name}"
+            if f.suffix == ".part":
+                try:
+                    if now - f.stat().st_mtime > STALE_TMP_SECONDS:
+                        f.unlink()
+                        report.stale_tmp += 1
+                except FileNotFoundError:
+                    pass
+                continue
+            if entry.name == ATLAS_DIRNAME:
+                try:
+                    report.bytes += f.stat().st_size
+                except FileNotFoundError:
+                    continue
+                report.files += 1
+                continue
+            m = _SHARDED_RE.match(rel)
+            if not m or not f.is_file():
+                continue
+            try:
+                ok = not verify or _file_digest(f) == m.group("digest")
+                size = f.stat().st_size
+            except FileNotFoundError:
+                continue
+            if not ok:
+                f.unlink(missing_ok=True)
+                report.removed.append(url_for(rel))
+                continue
+            report.files += 1
+            report.bytes += size
+            report.present.add(url_for(rel))
+    return report
+
+
+# ---------- budget / lifecycle (async, DB-aware) ----------
+
+
+async def enforce_budget(max_bytes: int | None = None) -> int:
+    """
+    Evict least-recently-used card images and atlases until the cache fits the
+    byte budget. Returns the number of files deleted. A budget of 0 disables
+    eviction.
+    """
+    budget = settings.IMAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if budget <= 0 or get_pool() is None:
+        return 0
+    atlases = await asyncio.to_thread(list_atlases)
+    urls = await evict_assets_over_budget(budget, [(a.url, a.size, a.used_at) for a in atlases])
+    if not urls:
+        return 0
+    removed = 0
+    for url in urls:
+        if _atlas_key(url) is not None:
+            removed += await asyncio.to_thread(remove_atlas, url)
+        elif await asyncio.to_thread(remove, url):
+            removed += 1
+    log.info("image cache eviction removed %d file(s) (budget=%d bytes)", removed, budget)
+    return removed
+
+
+async def startup_scan() -> None:
+    """
+    Per-process startup pass: sweep stale temp files and log the cache's size.
+    Cheap (a listing, no hashing); the integrity pass is verify_cache().
+    """
+    try:
+        report = await asyncio.to_thread(scan_cache, False)
+        log.info(
+            "image cache: %d file(s), %d bytes, %d stale tmp removed",
+            report.files,
+            report.bytes,
+            report.stale_tmp,
+        )
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        log.exception("image cache startup scan failed")
+
+
+async def verify_cache() -> None:
+    """
+    Integrity pass: re-hash every file, reconcile card_assets, then trim to
+    budget. Reads the whole cache, so it runs as a periodic task (one process
+    at a time) rather than in every process on startup.
+    """
+    report = await asyncio.to_thread(scan_cache)
+    log.info(
+        "image cache scan: %d file(s), %d bytes, %d corrupt removed, %d stale tmp removed",
+        report.files,
+        report.bytes,
+        len(report.removed),
+        report.stale_tmp,
+    )
+    if get_pool() is None:
+        return
+    forgotten = await forget_missing_local_paths(report.present, exists)
+    if forgotten:
+        log.info("image cache scan: cleared %d asset row(s) with missing files", forgotten)
+    await enforce_budget()
@@ -0,0 +1,182 @@
+# app/features/treasure/imaging.py
+"""
+CPU-bound image work (Pillow) and the process pool that runs it.
+
+Everything called through run_in_process() must be a picklable top-level
+function taking plain arguments; it executes in a spawned worker process so the
+event loop never blocks on decoding or encoding pixels.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import gzip
+import importlib.util
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import tempfile
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, TypeVar
+
+from app.core.config import settings
+
+log = logging.getLogger("r4t.imaging")
+
+T = TypeVar("T")
+
+# Scryfall "small" card size
+TILE_W, TILE_H = 146, 204
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def available() -> bool:
+    # Pillow is optional (image features degrade to plain per-card images
+    # without it) and only imported where pixels are touched, mostly in the
+    # worker processes: it adds ~25ms to every web process' cold start.
+    return importlib.util.find_spec("PIL") is not None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_in_process(fn: Callable[..., T], *args: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), fn, *args)
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    d = os.path.dirname(path)
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# ---------- atlas ----------
+
+
+def compose_atlas(
+    tiles: list[tuple[str, str]],
+    image_path: str,
+    map_path: str,
+    image_url: str,
+) -> dict:
+    """
+    Paste each (key, file) tile into a near-square grid, write the atlas as WebP
+    and a JSON coordinate map (plus a .gz sibling for precompressed serving).
+    Runs in a worker process.
+    """
+    from PIL import Image  # noqa: PLC0415 - see available()
+
+    cols = max(1, math.ceil(math.sqrt(len(tiles))))
+    rows = max(1, math.ceil(len(tiles) / cols))
+    sheet = Image.new("RGB", (cols * TILE_W, rows * TILE_H), (10, 10, 10))
+
+    cards: dict[str, list[int]] = {}
+    for i, (key, path) in enumerate(tiles):
+        col, row = i % cols, i // cols
+        try:
+            with Image.open(path) as im:
+                tile = im.convert("RGB").resize((TILE_W, TILE_H), Image.Resampling.LANCZOS)
+        except Exception:
+            continue
+        sheet.paste(tile, (col * TILE_W, row * TILE_H))
+        cards[key] = [col, row]
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(image_path), suffix=".part")
+    os.close(fd)
+    try:
+        sheet.save(tmp, format="WEBP", quality=80, method=4)
+        os.replace(tmp, image_path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+    atlas_map = {
+        "image": image_url,
+        "cols": cols,
+        "rows": rows,
+        "tile": [TILE_W, TILE_H],
+        "cards": cards,
+    }
+    raw = json.dumps(atlas_map, separators=(",", ":")).encode("utf-8")
+    _atomic_write(map_path + ".gz", gzip.compress(raw, mtime=0))
+    _atomic_write(map_path, raw)
+    return atlas_map
+
+
+# ---------- resized variants ----------
+
+
+@functools.cache
+def supported_formats() -> list[str]:
+    """Modern encoders this Pillow build can write, smallest-first."""
+    if not available():
+        return []
+    from PIL import features  # noqa: PLC0415 - see available()
+
+    return [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+
+
+def make_variants(
+    src_path: str, widths: list[int], formats: list[str]
+) -> list[tuple[int, str, bytes]]:
+    """
+    Resize one source image to each target width (never upscaling) and encode
+    it in each format. Returns (width, format, encoded_bytes). Runs in a worker process.
+    """
+    from PIL import Image  # noqa: PLC0415 - see available()
+
+    out: list[tuple[int, str, bytes]] = []
+    with Image.open(src_path) as im:
+        src = im.convert("RGB")
+    done: set[int] = set()
+    for target in sorted(widths):
+        w = min(target, src.width)
+        if w in done:
+            continue
+        done.add(w)
+        h = round(src.height * w / src.width)
+        resized = src if w == src.width else src.resize((w, h), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            buf = io.BytesIO()
+            if fmt == "avif":
+                resized.save(buf, format="AVIF", quality=55)
+            else:
+                resized.save(buf, format="WEBP", quality=78, method=4)
+            out.append((w, fmt, buf.getvalue()))
+    return out
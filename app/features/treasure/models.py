@@ -4,7 +4,13 @@ import random
 from datetime import datetime
 from uuid import uuid4
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
+
+
+class ImageVariant(BaseModel):
+    url: str  # /img-cache/... resized copy
+    w: int  # pixel width, for srcset "<url> <w>w"
+    fmt: str  # "avif" | "webp"
 
 
 class Card(BaseModel):
@@ -16,12 +22,18 @@ class Card(BaseModel):
     img: str | None = None  # URL (local /img-cache/... or remote fallback)
     scry: str | None = None  # Scryfall page URL
     oracle_id: str | None = None  # for dedupe / lookups
+    variants: list[ImageVariant] = []  # resized modern-format copies (srcset)
 
 
 class PileState(BaseModel):
     cards: list[Card]  # top is index 0
     revealed: list[Card] = []  # buffer during a “strike gold”
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def count(self) -> int:
+        return len(self.cards)
+
 
 class Player(BaseModel):
     id: str = Field(default_factory=lambda: uuid4().hex)
@@ -40,12 +52,14 @@ class Session(BaseModel):
     turn_num: int = 1
     pile: PileState
     log: list[str] = []
+    version: int = 0  # bumped by every mutate_session; clients use it to order deltas
 
     # gate UI until images are prefetched
     is_ready: bool = False
     precache_total: int = 0
     precache_done: int = 0
     precache_error: str | None = None
+    atlas: str | None = None  # url of the deck sprite-atlas JSON map, once built
 
     # revealed cards when 6 is rolled
     pending_choices: list[Card] = []
@@ -58,9 +72,6 @@ class Session(BaseModel):
         return self.closed_at is not None
 
 
-SESSIONS: dict[str, Session] = {}
-
-
 def current_player(s: Session) -> Player:
     return s.players[s.turn_idx]
 
@@ -0,0 +1,495 @@
+# app/features/treasure/precache.py
+"""
+Precache orchestration: resolve card names on Scryfall, make sure every card's
+image is in the local cache, then stamp image/oracle metadata onto the session.
+
+Names are processed in pile order through a per-session priority queue: the
+session becomes playable as soon as the top PRECACHE_READY_TOP_K positions are
+cached, the rest keeps filling in the background, and rolls that reach
+uncached cards bump them to the front.
+
+Repeated work is shared in three ways:
+  - a deck fingerprint (hash of the sorted name multiset) remembers the resolved
+    card metadata of every fully precached deck, so the same decklist is ready
+    the moment its session is created;
+  - name lookups and per-oracle_id downloads are single-flight within the
+    process, so concurrent sessions for one deck never fetch the same thing twice;
+  - names Scryfall could not resolve are remembered for
+    PRECACHE_MISS_RETRY_SECONDS, so rolls that reach them don't look them up
+    (and rewrite the session) every time.
+
+Session precache runs as a durable job (app.db.jobs) so it survives restarts
+and spreads over every worker; a retried job resumes from the cards already
+stamped on the session. Without Postgres (SESSION_STORE=memory/sqlite and no
+DATABASE_URL) there is no job queue, asset table or deck fingerprint store:
+precache runs once as a task in this process and every card is downloaded into
+the content-addressed file cache, which dedupes the bytes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import itertools
+import logging
+import time
+from collections.abc import Callable, Coroutine
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import PRECACHE_CARDS
+from app.core.singleflight import SingleFlight, register_flight
+from app.db import jobs
+from app.db.pool import get_pool, unit_of_work
+from app.features.treasure import progress, thumbs
+from app.features.treasure.atlas import build_deck_atlas
+from app.features.treasure.imagestore import enforce_budget, path_for_url, touch
+from app.features.treasure.models import Card, ImageVariant, Session
+from app.features.treasure.scryfall import download_small, fetch_card_meta_by_name
+from app.features.treasure.store import (
+    get_asset,
+    get_deck,
+    load_session as db_load,
+    mutate_session as db_mutate,
+    record_deck,
+    touch_assets,
+    upsert_asset,
+)
+
+log = logging.getLogger("r4t.precache")
+
+CHUNK_SIZE = 25
+DOWNLOAD_CONCURRENCY = 4
+
+PRECACHE_JOB = "treasure.precache"
+
+meta_flight: SingleFlight[str, dict | None] = register_flight("scryfall_meta", SingleFlight())
+asset_flight: SingleFlight[str, dict | None] = register_flight("asset_lookups", SingleFlight())
+
+_cached = PRECACHE_CARDS.labels("cached")
+_downloaded = PRECACHE_CARDS.labels("downloaded")
+_failed = PRECACHE_CARDS.labels("failed")
+
+# sid -> queue of the precache running for it in this process
+_active: dict[str, PrecacheQueue] = {}
+# strong refs for fire-and-forget bump, local precache and variant stamping tasks
+_bump_tasks: set[asyncio.Task] = set()
+# name -> monotonic time Scryfall last failed to resolve it (oldest first)
+_unresolved: dict[str, float] = {}
+UNRESOLVED_SIZE = 4096
+# oracle_id -> thumbnail variants being rendered for it (None if that failed)
+_variant_jobs: dict[str, asyncio.Task[list[dict] | None]] = {}
+
+
+class PrecacheQueue:
+    """Unique card names ordered by pile position; bumped names jump ahead of all of them."""
+
+    BUMPED = -1
+
+    def __init__(self, names_in_pile_order: list[str]) -> None:
+        self._seq = itertools.count()
+        self._heap: list[tuple[int, int, str]] = [
+            (pos, next(self._seq), name) for pos, name in enumerate(names_in_pile_order)
+        ]
+        heapq.heapify(self._heap)
+        self.taken: set[str] = set()
+
+    def bump(self, names: list[str]) -> None:
+        for n in names:
+            if n not in self.taken:
+                heapq.heappush(self._heap, (self.BUMPED, next(self._seq), n))
+
+    def next_batch(self, size: int) -> list[str]:
+        batch: list[str] = []
+        while self._heap and len(batch) < size:
+            _, _, name = heapq.heappop(self._heap)
+            if name in self.taken:
+                continue
+            self.taken.add(name)
+            batch.append(name)
+        return batch
+
+
+def deck_fingerprint(names: list[str]) -> str:
+    h = hashlib.sha256()
+    for n in sorted(names):
+        h.update(n.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+# ---------- per-card work (single-flight) ----------
+
+
+async def resolve_meta(name: str) -> dict | None:
+    return await meta_flight.do(name, lambda: run_in_threadpool(fetch_card_meta_by_name, name))
+
+
+def _remember_unresolved(name: str) -> None:
+    _unresolved.pop(name, None)
+    _unresolved[name] = time.monotonic()
+    while len(_unresolved) > UNRESOLVED_SIZE:
+        del _unresolved[next(iter(_unresolved))]
+
+
+def recently_unresolved(name: str) -> bool:
+    """True if Scryfall failed to resolve `name` within PRECACHE_MISS_RETRY_SECONDS."""
+    failed_at = _unresolved.get(name)
+    if failed_at is None:
+        return False
+    if time.monotonic() - failed_at < settings.PRECACHE_MISS_RETRY_SECONDS:
+        return True
+    del _unresolved[name]
+    return False
+
+
+def _spawn(coro: Coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _bump_tasks.add(task)
+    task.add_done_callback(_bump_tasks.discard)
+    return task
+
+
+async def _render_variants(oid: str, source_url: str) -> list[dict] | None:
+    # Variants are best-effort: cards fall back to the small image without them
+    try:
+        job = await thumbs.get_pipeline().submit(oid, source_url)
+        return await job
+    except Exception:
+        return None  # the pipeline logged it
+
+
+def _start_variants(oid: str, source_url: str) -> None:
+    if oid in _variant_jobs:
+        return
+    task = asyncio.create_task(_render_variants(oid, source_url))
+    _variant_jobs[oid] = task
+
+    def _forget(t: asyncio.Task, k: str = oid) -> None:
+        if _variant_jobs.get(k) is t:
+            del _variant_jobs[k]
+
+    task.add_done_callback(_forget)
+
+
+async def _ensure_asset(oid: str, meta: dict) -> dict | None:
+    """
+    Make sure the card's small image is cached. Thumbnail variants it lacks are
+    started in the background (see _variant_jobs), never waited for here.
+    """
+    asset: dict | None = None
+    if get_pool() is not None:
+        # Lookup and LRU touch share one transaction (two round trips, pipelined)
+        async with unit_of_work():
+            asset = await get_asset(oid)
+            if asset and asset.get("local_small_path"):
+                await touch_assets([oid])
+    cached = bool(asset and asset.get("local_small_path"))
+
+    if thumbs.enabled() and meta.get("normal_url") and not (asset and asset.get("variants")):
+        _start_variants(oid, meta["normal_url"])
+
+    if cached:
+        _cached.inc()
+    else:
+        stored, etag, last_modified = await run_in_threadpool(
+            download_small, oid, meta["small_url"]
+        )
+        if get_pool() is None:
+            asset = {"oracle_id": oid, "local_small_path": stored.url, "variants": None}
+        else:
+            asset = await upsert_asset(
+                oid,
+                meta["name"],
+                meta["small_url"],
+                stored.url,
+                etag,
+                last_modified,
+                content_hash=stored.digest,
+                size_bytes=stored.size,
+            )
+        _downloaded.inc()
+    return asset
+
+
+async def ensure_asset(oid: str, meta: dict) -> dict | None:
+    return await asset_flight.do(oid, lambda: _ensure_asset(oid, meta))
+
+
+def _card_meta(meta: dict, asset: dict | None) -> dict:
+    asset = asset or {}
+    return {
+        "oracle_id": meta["oracle_id"],
+        "img": asset.get("local_small_path") or meta["small_url"],
+        "scry": meta["scry_uri"],
+        "variants": asset.get("variants") or [],
+    }
+
+
+def _stamped_meta(c: Card) -> dict:
+    """Card metadata already on the session, in the same shape as _card_meta()."""
+    return {
+        "oracle_id": c.oracle_id,
+        "img": c.img,
+        "scry": c.scry,
+        "variants": [v.model_dump() for v in c.variants],
+    }
+
+
+def _all_cards(s: Session) -> list[Card]:
+    cards = [*s.pile.cards, *s.pile.revealed, *s.pending_choices]
+    for p in s.players:
+        cards.extend(p.gains)
+    return cards
+
+
+def apply_card_meta(s: Session, by_name: dict[str, dict]) -> None:
+    for c in _all_cards(s):
+        m = by_name.get(c.name)
+        if not m:
+            continue
+        c.oracle_id = m["oracle_id"]
+        c.img = m["img"]
+        c.scry = m["scry"]
+        c.variants = [ImageVariant(**v) for v in m["variants"]]
+
+
+async def _stamp_variants(
+    sid: str, jobs: dict[str, asyncio.Task[list[dict] | None]]
+) -> dict[str, list[dict]]:
+    """Wait for thumbnail variants and write them onto the session's cards. Returns them by oracle_id."""
+    results = await asyncio.gather(*jobs.values(), return_exceptions=True)
+    by_oid = {oid: v for oid, v in zip(jobs, results, strict=True) if isinstance(v, list) and v}
+    if not by_oid:
+        return by_oid
+
+    def do_mutate(s: Session):
+        for c in _all_cards(s):
+            if c.oracle_id in by_oid:
+                c.variants = [ImageVariant(**v) for v in by_oid[c.oracle_id]]
+
+    with contextlib.suppress(KeyError):  # session deleted meanwhile
+        await db_mutate(sid, do_mutate)
+    return by_oid
+
+
+async def precache_names(
+    sid: str,
+    names: list[str],
+    ready_when: Callable[[Session], bool] | None = None,
+) -> tuple[dict[str, dict], bool, asyncio.Task[dict[str, list[dict]]] | None]:
+    """
+    Resolve + cache one batch of names and write their metadata onto the session.
+    If `ready_when(session)` holds after applying, the session is marked playable.
+    Returns the applied metadata by name, whether the session is now ready, and
+    the background task that stamps thumbnail variants still being rendered
+    (None if there are none); progress and readiness never wait for them.
+    Names that recently failed to resolve are skipped; without `ready_when`,
+    a batch where nothing resolved doesn't touch the session (ready is False).
+    """
+    name_meta: dict[str, dict] = {}
+    for nm in dict.fromkeys([n for n in names if n]):
+        if recently_unresolved(nm):
+            continue
+        meta = await resolve_meta(nm)
+        if not meta or not meta.get("oracle_id"):
+            _remember_unresolved(nm)
+            continue
+        name_meta[nm] = meta
+    if not name_meta and ready_when is None:
+        return {}, False, None
+
+    uniq_by_oid = {m["oracle_id"]: m for m in name_meta.values()}
+    gate = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+
+    async def one(oid: str, meta: dict) -> tuple[str, dict | None]:
+        async with gate:
+            try:
+                return oid, await ensure_asset(oid, meta)
+            except Exception as e:
+                log.warning("caching image for %s failed: %r", oid, e)
+                _failed.inc()
+                return oid, None
+
+    assets = dict(await asyncio.gather(*(one(o, m) for o, m in uniq_by_oid.items())))
+    by_name = {
+        nm: _card_meta(meta, assets.get(meta["oracle_id"])) for nm, meta in name_meta.items()
+    }
+
+    def do_mutate(s: Session):
+        apply_card_meta(s, by_name)
+        if ready_when is not None and not s.is_ready and ready_when(s):
+            s.is_ready = True
+
+    after = await db_mutate(sid, do_mutate)
+    pending = {oid: t for oid in uniq_by_oid if (t := _variant_jobs.get(oid)) is not None}
+    stamping = _spawn(_stamp_variants(sid, pending)) if pending else None
+    return by_name, after.is_ready, stamping
+
+
+def uncached_names(cards: list[Card]) -> list[str]:
+    """Names of cards without an image, except those Scryfall recently failed to resolve."""
+    return list(
+        dict.fromkeys(c.name for c in cards if not c.img and not recently_unresolved(c.name))
+    )
+
+
+async def bump(sid: str, names: list[str]) -> None:
+    """
+    Move names to the front of this session's precache. If no precache is
+    running for it in this process, fetch them right away in the background.
+    """
+    if not names:
+        return
+    q = _active.get(sid)
+    if q is not None:
+        q.bump(names)
+        return
+    _spawn(precache_names(sid, names))
+
+
+# ---------- deck-level ----------
+
+
+def _deck_files_present(cards: dict[str, dict], atlas: str | None) -> bool:
+    urls = [atlas] if atlas else []
+    for m in cards.values():
+        urls.append(m["img"])
+        urls.extend(v["url"] for v in m["variants"])
+    for url in urls:
+        p = path_for_url(url)
+        if p is not None and not p.exists():
+            return False
+    return True
+
+
+async def apply_known_deck(s: Session) -> bool:
+    """
+    If this exact decklist was fully precached before (and its files are still
+    cached), stamp the known metadata on `s` and mark it ready. Does not persist.
+    """
+    if get_pool() is None:
+        return False
+    known = await get_deck(deck_fingerprint([c.name for c in s.pile.cards]))
+    if not known:
+        return False
+    cards: dict[str, dict] = known["cards"]
+    if not await asyncio.to_thread(_deck_files_present, cards, known["atlas"]):
+        return False
+    apply_card_meta(s, cards)
+    s.atlas = known["atlas"]
+    s.precache_total = s.precache_done = len(cards)
+    s.is_ready = True
+    await touch_assets([m["oracle_id"] for m in cards.values()])
+    if known["atlas"]:
+        await asyncio.to_thread(touch, known["atlas"])
+    return True
+
+
+async def bg_precache_session(sid: str) -> None:
+    s = await db_load(sid)
+    if not s:
+        return
+    names = [c.name for c in s.pile.cards]
+    uniq = list(dict.fromkeys(names))
+    total = len(uniq)
+    top_k = settings.PRECACHE_READY_TOP_K
+
+    # A retried job picks up where the previous attempt stopped
+    resolved = {c.name: _stamped_meta(c) for c in s.pile.cards if c.oracle_id and c.img}
+    q = PrecacheQueue(uniq)
+    q.taken.update(resolved)
+    _active[sid] = q
+
+    def top_ready(s2: Session) -> bool:
+        return all(c.name in q.taken for c in s2.pile.cards[:top_k])
+
+    ready = s.is_ready
+    stamping: list[asyncio.Task[dict[str, list[dict]]]] = []
+    try:
+        await progress.publish(sid, total, len(q.taken), ready)
+        # First batch is exactly the top of the pile so the game can start early
+        size = len(dict.fromkeys(names[:top_k])) or CHUNK_SIZE
+        while batch := q.next_batch(size):
+            by_name, ready, variants = await precache_names(sid, batch, ready_when=top_ready)
+            resolved.update(by_name)
+            if variants is not None:
+                stamping.append(variants)
+            await progress.publish(sid, total, len(q.taken), ready)
+            size = CHUNK_SIZE
+    finally:
+        _active.pop(sid, None)
+
+    cached = await db_load(sid)
+    atlas = await build_deck_atlas(cached) if cached else None
+
+    async def finish(s2: Session):
+        s2.atlas = atlas
+        s2.is_ready = True
+        s2.precache_total = total
+        s2.precache_done = len(q.taken)
+
+    await db_mutate(sid, finish)
+    await progress.publish(sid, total, len(q.taken), True)
+
+    # The deck is remembered with the variants rendered after its cards were stamped
+    for by_oid in await asyncio.gather(*stamping):
+        for m in resolved.values():
+            if m["oracle_id"] in by_oid:
+                m["variants"] = by_oid[m["oracle_id"]]
+
+    # Only remember decks that resolved and cached completely, so transient misses get retried
+    complete = len(resolved) == len(uniq) and all(path_for_url(m["img"]) for m in resolved.values())
+    if complete and get_pool() is not None:
+        await record_deck(deck_fingerprint(names), resolved, atlas)
+    await enforce_budget()
+
+
+# ---------- durable job ----------
+
+
+async def schedule_precache(sid: str) -> None:
+    """
+    Queue the session's precache; any web process or `python -m app.worker`
+    picks it up. Without a DB pool it runs here instead, as a background task.
+    """
+    if get_pool() is None:
+        _spawn(_precache_locally(sid))
+        return
+    await jobs.enqueue(PRECACHE_JOB, {"sid": sid}, key=sid)
+
+
+async def _open_anyway(sid: str) -> None:
+    """Give up on precache: open the table, uncached cards show placeholders."""
+
+    def mark_ready(s: Session):
+        s.is_ready = True
+
+    with contextlib.suppress(KeyError):
+        s = await db_mutate(sid, mark_ready)
+        await progress.publish(sid, s.precache_total, s.precache_done, True)
+
+
+async def _precache_locally(sid: str) -> None:
+    """A single attempt with no job queue behind it (no retries, lost on restart)."""
+    try:
+        await bg_precache_session(sid)
+    except Exception:
+        log.exception("precache of session %s failed", sid)
+        await _open_anyway(sid)
+
+
+async def run_precache_job(job: jobs.Job) -> None:
+    sid = job.payload["sid"]
+    try:
+        await bg_precache_session(sid)
+    except Exception:
+        if job.last_attempt:
+            await _open_anyway(sid)  # out of retries
+        raise
+
+
+JOB_HANDLERS: dict[str, jobs.Handler] = {PRECACHE_JOB: run_precache_job}
@@ -0,0 +1,138 @@
+# app/features/treasure/progress.py
+"""
+Precache progress, kept out of the session document.
+
+Writers (the precache job, wherever it runs) upsert one small row in
+`precache_progress` and NOTIFY it on the `precache_progress` channel. Each web
+process keeps the latest value per session in memory, fed by its own publishes
+and by a LISTEN connection for everyone else's, so readers and SSE streams
+rarely touch the database and never load the session. Without a DB pool
+(local, single-process mode) the in-memory registry is all there is.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+from collections.abc import AsyncIterator
+from dataclasses import asdict, dataclass
+
+import psycopg
+
+from app.core.config import settings
+from app.db.pool import get_pool
+
+log = logging.getLogger("r4t.progress")
+
+NOTIFY_CHANNEL = "precache_progress"
+
+
+@dataclass(frozen=True)
+class Progress:
+    total: int
+    done: int
+    is_ready: bool
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+REGISTRY_SIZE = 4096
+
+# sid -> latest progress seen by this process (insertion-ordered, oldest dropped first)
+_latest: dict[str, Progress] = {}
+# sid -> event set (and replaced) on every change
+_changed: dict[str, asyncio.Event] = {}
+
+
+def _apply(sid: str, p: Progress) -> None:
+    old = _latest.get(sid)
+    # Our own publish and its NOTIFY echo can arrive in either order; progress never goes back
+    if old is not None and (old.is_ready or (p.done < old.done and not p.is_ready)):
+        return
+    _latest.pop(sid, None)
+    _latest[sid] = p
+    while len(_latest) > REGISTRY_SIZE:
+        del _latest[next(iter(_latest))]
+    ev = _changed.pop(sid, None)
+    if ev is not None:
+        ev.set()
+
+
+async def publish(sid: str, total: int, done: int, is_ready: bool = False) -> None:
+    p = Progress(total=total, done=done, is_ready=is_ready)
+    pool = get_pool()
+    if pool is None:
+        _apply(sid, p)
+        return
+    async with pool.connection() as ac, ac.transaction():
+        await ac.execute(
+            """
+            INSERT INTO precache_progress (sid, total, done, is_ready, updated_at)
+            VALUES (%s, %s, %s, %s, now())
+            ON CONFLICT (sid) DO UPDATE
+               SET total = EXCLUDED.total, done = EXCLUDED.done,
+                   is_ready = precache_progress.is_ready OR EXCLUDED.is_ready,
+                   updated_at = now()
+            """,
+            (sid, total, done, is_ready),
+        )
+        await ac.execute(
+            "SELECT pg_notify(%s, %s)",
+            (NOTIFY_CHANNEL, json.dumps({"sid": sid, **p.as_dict()})),
+        )
+    _apply(sid, p)
+
+
+async def get(sid: str) -> Progress | None:
+    """Latest known progress, or None if precache never reported for this session."""
+    p = _latest.get(sid)
+    pool = get_pool()
+    if p is not None or pool is None:
+        return p
+    async with pool.connection() as ac:
+        cur = await ac.execute(
+            "SELECT total, done, is_ready FROM precache_progress WHERE sid=%s", (sid,)
+        )
+        row = await cur.fetchone()
+    return Progress(total=row[0], done=row[1], is_ready=row[2]) if row else None
+
+
+async def watch(sid: str, timeout: float = 15.0) -> AsyncIterator[Progress | None]:
+    """
+    Yield the current progress and then each change until the session is ready.
+    Yields None when nothing changed for `timeout` seconds (a chance to send a
+    keepalive); the value is re-read then, so a missed notification only delays.
+    """
+    last: Progress | None = None
+    while True:
+        changed = _changed.setdefault(sid, asyncio.Event())
+        cur = await get(sid)
+        if cur is not None and cur != last:
+            last = cur
+            yield cur
+            if cur.is_ready:
+                return
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=timeout)
+        except TimeoutError:
+            yield None
+
+
+async def listen() -> None:
+    """Feed the in-process registry from other processes' NOTIFYs (runs until cancelled)."""
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                settings.DATABASE_URL, autocommit=True
+            ) as conn:
+                await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                async for n in conn.notifies():
+                    with contextlib.suppress(ValueError, KeyError, TypeError):
+                        d = json.loads(n.payload)
+                        _apply(d["sid"], Progress(d["total"], d["done"], d["is_ready"]))
+        except Exception as e:
+            log.warning("progress listener disconnected: %r", e)
+            await asyncio.sleep(5.0)
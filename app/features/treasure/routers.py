@@ -1,13 +1,19 @@
 # app/features/treasure/routers.py
+import asyncio
+import json
 import re
 from datetime import UTC, datetime
 from typing import Any
 
-from fastapi import APIRouter, BackgroundTasks, Form, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
 from fastapi.concurrency import run_in_threadpool
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 
+from app.core.config import settings
+from app.core.http import etag_matches
 from app.core.templates import templates
+from app.db.pool import uow_dependency
+from app.features.treasure import events, progress, snapshots
 from app.features.treasure.models import (
     Card,
     PileState,
@@ -17,17 +23,22 @@ from app.features.treasure.models import (
     roll_d6,
     shuffle_bottom_random,
 )
-from app.features.treasure.scryfall import download_small, fetch_card_meta_by_name
+from app.features.treasure.precache import (
+    apply_known_deck,
+    bump as bump_precache,
+    schedule_precache,
+    uncached_names,
+)
 from app.features.treasure.service import build_pile_from_source
 from app.features.treasure.store import (
     create_session as db_create,
-    get_asset,
+    get_session_version,
     load_session as db_load,
-    mutate_session as db_mutate,
-    upsert_asset,
+    mutate_session_delta as db_mutate_delta,
 )
 
-router = APIRouter()
+# One connection and transaction per request, checked out on first use
+router = APIRouter(dependencies=[Depends(uow_dependency)])
 
 
 def _append_log(s: Session, line: str, cap: int = 500) -> None:
@@ -55,66 +66,23 @@ def _norm_sid(raw: str) -> str:
     return m.group(1).lower()
 
 
-# ---------- Precache orchestration ----------
-
-
-async def _precache_card_images(sid: str, names: list[str]) -> None:
-    name_meta: dict[str, dict] = {}
-    for nm in dict.fromkeys([n for n in names if n]):
-        meta = await run_in_threadpool(fetch_card_meta_by_name, nm)
-        if not meta or not meta.get("oracle_id"):
-            continue
-        name_meta[nm] = meta
-
-    uniq_by_oid = {m["oracle_id"]: m for m in name_meta.values()}
-    for oid, meta in uniq_by_oid.items():
-        existing = await get_asset(oid)
-        if existing and existing.get("local_small_path"):
-            continue
-        local_path, etag, last_modified = await run_in_threadpool(
-            download_small, oid, meta["small_url"]
-        )
-        await upsert_asset(oid, meta["name"], meta["small_url"], local_path, etag, last_modified)
-
-    async def do_mutate(s: Session):
-        for c in s.pile.cards:
-            meta = name_meta.get(c.name)
-            if not meta:
-                continue
-            c.oracle_id = meta["oracle_id"]
-            asset = await get_asset(c.oracle_id)
-            c.img = (asset.get("local_small_path") if asset else None) or meta["small_url"]
-            c.scry = meta["scry_uri"]
-
-    await db_mutate(sid, do_mutate)
-
-
-async def _bg_precache_session(sid: str) -> None:
-    s = await db_load(sid)
+async def _precache_snapshot(code: str) -> dict:
+    """Progress from the lightweight store; the session is only loaded if precache never reported."""
+    p = await progress.get(code)
+    if p is not None:
+        return p.as_dict()
+    s = await db_load(code, replica=True)
     if not s:
-        return
-    names = [c.name for c in s.pile.cards]
-    total = len(set(names))
-
-    async def set_progress(done_cnt: int):
-        async def mut(s2: Session):
-            s2.precache_total = total
-            s2.precache_done = done_cnt
-
-        await db_mutate(sid, mut)
-
-    await set_progress(0)
-    uniq = list(dict.fromkeys(names))
-    for chunk_start in range(0, len(uniq), 25):
-        chunk = uniq[chunk_start : chunk_start + 25]
-        await _precache_card_images(sid, chunk)
-        done = min(len(uniq), chunk_start + len(chunk))
-        await set_progress(done)
+        raise HTTPException(404, "session not found")
+    return {
+        "total": s.precache_total or 0,
+        "done": s.precache_done or 0,
+        "is_ready": bool(s.is_ready),
+    }
 
-    async def finish(s2: Session):
-        s2.is_ready = True
 
-    await db_mutate(sid, finish)
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
 
 
 # ---------- Routes ----------
@@ -126,7 +94,7 @@ async def treasure_home(request: Request):
 
 
 @router.api_route("/create", methods=["GET", "POST"])
-async def treasure_create(request: Request, background: BackgroundTasks):
+async def treasure_create(request: Request):
     form = await request.form() if request.method == "POST" else {}
 
     def first(key: str, default: str | None = None) -> str | None:
@@ -167,29 +135,45 @@ async def treasure_create(request: Request, background: BackgroundTasks):
     s.is_ready = False
     s.precache_total = 0
     s.precache_done = 0
+    if await apply_known_deck(s):
+        await db_create(s)
+        return RedirectResponse(url=f"/treasure/{s.id}", status_code=303)
     await db_create(s)
-
-    background.add_task(_bg_precache_session, s.id)
+    await schedule_precache(s.id)
 
     return templates.TemplateResponse("treasure/precache.html", {"request": request, "sid": s.id})
 
 
 @router.get("/precache_status")
 async def precache_status(sid: str = Query(...)):
-    s = await db_load(_norm_sid(sid))
-    if not s:
-        raise HTTPException(404, "session not found")
-    return {
-        "total": s.precache_total or 0,
-        "done": s.precache_done or 0,
-        "is_ready": bool(s.is_ready),
-    }
+    return await _precache_snapshot(_norm_sid(sid))
+
+
+@router.get("/{sid}/precache/events")
+async def precache_events(sid: str):
+    """Server-Sent Events: a `progress` event per change, closed once the session is ready."""
+    code = _norm_sid(sid)
+    first = await _precache_snapshot(code)
+
+    async def stream():
+        yield "retry: 3000\n\n"
+        yield _sse("progress", first)
+        if first["is_ready"]:
+            return
+        async for p in progress.watch(code):
+            yield ": ping\n\n" if p is None else _sse("progress", p.as_dict())
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/open")
 async def treasure_open(request: Request, sid: str = Query(..., description="Session code or URL")):
     code = _norm_sid(sid)
-    s = await db_load(code)
+    s = await db_load(code, replica=True)
     if not s:
         raise HTTPException(404, "session not found")
     if not s.is_ready:
@@ -200,11 +184,103 @@ async def treasure_open(request: Request, sid: str = Query(..., description="Ses
 
 
 @router.get("/{sid}/state")
-async def treasure_state(sid: str):
-    s = await db_load(_norm_sid(sid))
-    if not s:
+async def treasure_state(
+    request: Request,
+    sid: str,
+    view: str = Query("full"),
+    fields: str | None = Query(None),
+    player_id: str | None = Query(None),
+    *,
+    min_version: int | None = Query(None, ge=0),
+):
+    """
+    Session state as a projection: `view=full|table|player` (player needs
+    `player_id`) or an explicit `fields=a,b,pile.count` list. Served from the
+    read replica when one is configured, unless it is behind `min_version` or
+    the version in If-None-Match (the newest the client has seen).
+    """
+    code = _norm_sid(sid)
+    try:
+        key = snapshots.projection_key(view, fields, player_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e)) from e
+    inm = request.headers.get("if-none-match")
+    seen = max(min_version or 0, snapshots.etag_version(inm) or 0)
+    version = await get_session_version(code, replica=True, min_version=seen)
+    if version is None:
         raise HTTPException(404, "session not found")
-    return JSONResponse(s.model_dump())
+    headers = {"ETag": snapshots.etag_for(version, key), "Cache-Control": "no-cache"}
+    if etag_matches(inm, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    body = snapshots.cache.get(code, version, key)
+    if body is None:
+        s = await db_load(code, replica=True, min_version=version)
+        if not s:
+            raise HTTPException(404, "session not found")
+        try:
+            body = snapshots.render(s, key)
+        except KeyError as e:
+            raise HTTPException(404, "player not found") from e
+        snapshots.cache.put(code, s.version, body, key)
+        headers["ETag"] = snapshots.etag_for(s.version, key)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/{sid}/events")
+async def treasure_events(request: Request, sid: str, since: int | None = Query(None)):
+    """
+    Server-Sent Events: one `delta` event per session version (id = version).
+    Reconnects resume from Last-Event-ID; `resync` asks the client to refetch /state.
+    """
+    code = _norm_sid(sid)
+    last_id = request.headers.get("Last-Event-ID", "")
+    if last_id.isdigit():
+        since = int(last_id)
+
+    sub = events.bus.subscribe(code)
+    try:
+        backlog = await events.catch_up(code, since)
+    except KeyError:
+        events.bus.unsubscribe(code, sub)
+        raise HTTPException(404, "session not found")
+    except BaseException:
+        events.bus.unsubscribe(code, sub)
+        raise
+
+    def frame(ev: events.Event) -> str:
+        if ev is events.RESYNC:
+            return "event: resync\ndata: {}\n\n"
+        return f"id: {ev.v}\nevent: delta\ndata: {ev.data}\n\n"
+
+    async def stream():
+        sent = since if since is not None else -1
+        try:
+            yield "retry: 2000\n\n"
+            if backlog is None:
+                yield frame(events.RESYNC)
+            else:
+                for ev in backlog:
+                    yield frame(ev)
+                    sent = ev.v
+            while True:
+                try:
+                    ev = await asyncio.wait_for(sub.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                except TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if ev is not events.RESYNC and ev.v <= sent:
+                    continue  # already replayed
+                yield frame(ev)
+                sent = max(sent, ev.v)
+        finally:
+            events.bus.unsubscribe(code, sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/{sid}/roll")
@@ -246,12 +322,8 @@ async def treasure_roll(sid: str, player_id: str | None = Form(None)):
                 s.pending_choices = list(drawn)
                 s.pending_player_id = p.id
                 _append_log(s, f"{p.name} rolled 6 — choose one of the top {len(drawn)}.")
-                result_payload.update(
-                    {
-                        "mode": "choose",
-                        "choices": [c.model_dump() for c in drawn],
-                    }
-                )
+                # the choices travel in the delta (pending_choices)
+                result_payload.update({"mode": "choose"})
                 return
             else:
                 _append_log(s, f"{p.name} rolled 6 but the pile was empty.")
@@ -273,22 +345,21 @@ async def treasure_roll(sid: str, player_id: str | None = Form(None)):
             _append_log(s, f"{p.name} dug {n} and found **{kept.name}**.")
             revealed_payload = [dict(kept.model_dump(), kept=True)]
             revealed_payload += [dict(c.model_dump(), kept=False) for c in rest]
-            result_payload.update(
-                {
-                    "mode": "auto",
-                    "received": kept.model_dump(),
-                    "revealed": revealed_payload,
-                }
-            )
+            # the kept card is flagged in `revealed` and appended to gains in the delta
+            result_payload.update({"mode": "auto", "revealed": revealed_payload})
         else:
             _append_log(s, f"{p.name} dug {n} but found nothing.")
             result_payload.update({"mode": "auto", "revealed": []})
 
         # NOTE: Do NOT advance; pass must be explicit.
 
-    await db_mutate(_norm_sid(sid), do_roll)
-    s = await db_load(_norm_sid(sid))
-    return JSONResponse({"ok": True, "state": s.model_dump() if s else {}, **result_payload})
+    after, delta = await db_mutate_delta(_norm_sid(sid), do_roll)
+    # Progressive precache: make sure what was just reached (and what's next) gets images first
+    reached = [*after.pending_choices, *after.pile.cards[: settings.PRECACHE_READY_TOP_K]]
+    for pl in after.players:
+        reached.extend(pl.gains[-1:])
+    await bump_precache(after.id, uncached_names(reached))
+    return JSONResponse({"ok": True, "delta": delta, **result_payload})
 
 
 @router.post("/{sid}/choose")
@@ -327,18 +398,12 @@ async def treasure_choose(sid: str, player_id: str | None = Form(None), card_id:
         s.pending_player_id = None
 
         _append_log(s, f"{p.name} chooses **{chosen.name}**.")
-        result_payload.update(
-            {
-                "ok": True,
-                "received": chosen.model_dump(),
-                "revealed": [c.model_dump() for c in rest],
-            }
-        )
+        # the chosen card is appended to gains in the delta
+        result_payload.update({"ok": True})
         # NOTE: Do NOT advance; pass must be explicit.
 
-    await db_mutate(_norm_sid(sid), do_choose)
-    s = await db_load(_norm_sid(sid))
-    return JSONResponse({"ok": True, "state": s.model_dump() if s else {}, **result_payload})
+    _, delta = await db_mutate_delta(_norm_sid(sid), do_choose)
+    return JSONResponse({"ok": True, "delta": delta, **result_payload})
 
 
 @router.post("/{sid}/pass")
@@ -353,16 +418,16 @@ async def treasure_pass(sid: str):
         else:
             _append_log(s, f"{p.name} passes the turn.")
         _advance_turn(s)
-        result_payload.update({"ok": True, "turn_advanced": True, "state": s.model_dump()})
+        result_payload.update({"ok": True, "turn_advanced": True})
 
-    await db_mutate(_norm_sid(sid), do_pass)
-    return JSONResponse(result_payload)
+    _, delta = await db_mutate_delta(_norm_sid(sid), do_pass)
+    return JSONResponse({**result_payload, "delta": delta})
 
 
 @router.get("/{sid}")
 async def treasure_open_direct(request: Request, sid: str):
     code = _norm_sid(sid)
-    s = await db_load(code)
+    s = await db_load(code, replica=True)
     if not s:
         raise HTTPException(404, "session not found")
     if not s.is_ready:
@@ -385,8 +450,8 @@ async def treasure_end(sid: str):
             s.pending_player_id = None
         _append_log(s, "Game ended.")
 
-    await db_mutate(sid, do_close)
-    s = await db_load(sid)
-    if not s:
+    try:
+        _, delta = await db_mutate_delta(sid, do_close)
+    except KeyError:
         raise HTTPException(404, "session not found")
-    return JSONResponse({"ok": True, "state": s.model_dump()})
+    return JSONResponse({"ok": True, "delta": delta})
@@ -1,9 +1,14 @@
 # app/features/treasure/scryfall.py
 from __future__ import annotations
 
-import os
+from pathlib import Path
 
-import requests
+from app.features.treasure.imagestore import (
+    CHUNK_SIZE,
+    StoredImage,
+    commit_stream,
+    ext_for_content_type,
+)
 
 UA_HEADERS = {
     "User-Agent": "Roll4Treasure/1.0 (+https://example.com/contact)",
@@ -17,50 +22,52 @@ IMG_HEADERS = {
 }
 
 
-def _cache_dir() -> str:
-    return os.getenv("IMAGE_CACHE_DIR", "/opt/r4t/img-cache").rstrip("/")
-
-
-def ensure_cache_dir() -> str:
-    d = _cache_dir()
-    os.makedirs(d, exist_ok=True)
-    return d
-
-
 def fetch_card_meta_by_name(name: str) -> dict | None:
     """
-    Scryfall 'named' endpoint. We want oracle_id + small image + scryfall_uri.
+    Scryfall 'named' endpoint. We want oracle_id + small/normal images + scryfall_uri.
     """
+    import requests  # noqa: PLC0415 - ~100ms to import; web processes may never fetch
+
     url = "https://api.scryfall.com/cards/named"
     r = requests.get(url, params={"exact": name}, headers=UA_HEADERS, timeout=15)
     if r.status_code != 200:
         return None
     data = r.json()
     # single-faced only (per the user request); ignore special cases
-    img = (data.get("image_uris") or {}).get("small")
+    uris = data.get("image_uris") or {}
     return {
         "name": data.get("name") or name,
         "oracle_id": data.get("oracle_id"),
-        "small_url": img,
+        "small_url": uris.get("small"),
+        "normal_url": uris.get("normal"),  # source for resized variants
         "scry_uri": data.get("scryfall_uri"),
     }
 
 
-def download_small(oracle_id: str, small_url: str) -> tuple[str, str | None, str | None]:
+def download_small(oracle_id: str, small_url: str) -> tuple[StoredImage, str | None, str | None]:
     """
-    Download small image to cache dir and return (local_path, etag, last_modified).
+    Stream the small image into the content-addressed cache and return
+    (stored_image, etag, last_modified). The body is never held in memory whole.
     """
-    ensure_cache_dir()
-    r = requests.get(small_url, headers=IMG_HEADERS, timeout=30)
-    r.raise_for_status()
-    ctype = r.headers.get("Content-Type", "image/jpeg").lower()
-    ext = ".jpg"
-    if "webp" in ctype:
-        ext = ".webp"
-    elif "avif" in ctype:
-        ext = ".avif"
-    fname = f"{oracle_id}{ext}"
-    path = os.path.join(_cache_dir(), fname)
-    with open(path, "wb") as f:
-        f.write(r.content)
-    return f"/img-cache/{fname}", r.headers.get("ETag"), r.headers.get("Last-Modified")
+    return download_image(small_url)
+
+
+def download_image(url: str) -> tuple[StoredImage, str | None, str | None]:
+    import requests  # noqa: PLC0415 - see fetch_card_meta_by_name
+
+    with requests.get(url, headers=IMG_HEADERS, timeout=30, stream=True) as r:
+        r.raise_for_status()
+        ext = ext_for_content_type(r.headers.get("Content-Type"))
+        stored = commit_stream(r.iter_content(CHUNK_SIZE), ext)
+        return stored, r.headers.get("ETag"), r.headers.get("Last-Modified")
+
+
+def download_to(url: str, dest: Path) -> None:
+    """Stream an image into `dest` without committing it to the cache."""
+    import requests  # noqa: PLC0415 - see fetch_card_meta_by_name
+
+    with requests.get(url, headers=IMG_HEADERS, timeout=30, stream=True) as r:
+        r.raise_for_status()
+        with dest.open("wb") as f:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                f.write(chunk)
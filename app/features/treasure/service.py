@@ -1,16 +1,17 @@
 # app/features/treasure/service.py
 from __future__ import annotations
 
+import logging
 import os
 import re
 from collections.abc import Iterable
 from typing import Any
 from uuid import uuid4
 
-import requests
-
 from .models import Card
 
+log = logging.getLogger("r4t.service")
+
 UA_HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -106,8 +107,10 @@ def fetch_moxfield_list(deck_url: str) -> list[str]:
         "Cookie": cookie,
     }
 
+    import requests  # noqa: PLC0415 - ~100ms to import, only needed for deck URLs
+
     r = requests.get(api_url, headers=headers, timeout=20)
-    print(f"[moxfield] GET {api_url} -> {r.status_code}, body_len={len(r.text)}")
+    log.info("moxfield GET %s -> %s (%d bytes)", api_url, r.status_code, len(r.content))
     if r.status_code != 200:
         raise RuntimeError(f"Moxfield fetch failed: {r.status_code} {r.text[:200]}")
 
@@ -129,10 +132,10 @@ def fetch_moxfield_list(deck_url: str) -> list[str]:
                 entries = []
             names = _collect_from_entries(entries)
             if names:
-                print(f"[treasure] mainboard extracted via boards: {len(names)} names")
+                log.info("mainboard extracted via boards: %d names", len(names))
                 return names
     except Exception as e:
-        print(f"[treasure] boards parse fallback: {e!r}")
+        log.warning("moxfield boards parse failed, falling back to walker: %r", e)
 
     # --- Fallback: guarded recursive walk, capturing only when board is mainboard ---
     names: list[str] = []
@@ -164,7 +167,7 @@ def fetch_moxfield_list(deck_url: str) -> list[str]:
 
     walk(data)
 
-    print(f"[treasure] mainboard extracted via fallback walker: {len(names)} names")
+    log.info("mainboard extracted via fallback walker: %d names", len(names))
     return names
 
 
@@ -212,13 +215,13 @@ def build_pile_from_source(deck_url: str | None, raw_list: str | None) -> list[C
     names: list[str] = []
     if deck_url:
         names = fetch_moxfield_list(deck_url)
-        print(f"[treasure] build_pile_from_source: got {len(names)} names before normalization")
+        log.debug("build_pile_from_source: %d names from moxfield", len(names))
     elif raw_list:
         names = parse_raw_list(raw_list)
-        print(f"[treasure] build_pile_from_source: got {len(names)} names from raw list")
+        log.debug("build_pile_from_source: %d names from raw list", len(names))
     else:
         return []
 
     cards = normalize_to_cards(names)
-    print(f"[treasure] final cards count (mainboard only): {len(cards)}")
+    log.info("built pile of %d cards (mainboard only)", len(cards))
     return cards
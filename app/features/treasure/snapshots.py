@@ -0,0 +1,172 @@
+# app/features/treasure/snapshots.py
+"""
+Serialized session snapshots, cached per version.
+
+A /state body is rendered once per session version with pydantic's
+model_dump_json and reused until the version moves on. The version (and so the
+ETag) comes from the `sessions.version` column, so an unchanged poll costs one
+primary-key lookup and never touches the JSON document.
+
+Bodies are projections of the session, each cached under its own key:
+
+    full            the whole document (what mutate_session stores)
+    table           what the table UI renders: turn, players and their gains,
+                    the visible reveal, log, pile *count* (no pile order)
+    player:<id>     the table view with only that player's gains
+    fields:<a,b.c>  explicit top-level fields, or dotted sub-fields
+
+Every projection is serialized straight from the model with
+model_dump_json(include=...), never by trimming a rendered dict.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any
+
+from app.core.config import settings
+from app.core.profiling import span
+from app.features.treasure.models import PileState, Player, Session
+
+VIEWS = ("full", "table", "player")
+
+# Card fields the UI draws with; type_line, oracle_text and tag stay server-side
+_CARD = {"__all__": {"id", "name", "img", "scry", "oracle_id", "variants"}}
+_PLAYER = {"id": True, "name": True, "digs_this_game": True, "dug_this_turn": True}
+_TABLE: dict[str, Any] = {
+    "id": True,
+    "version": True,
+    "turn_idx": True,
+    "turn_num": True,
+    "log": True,
+    "is_ready": True,
+    "atlas": True,
+    "closed_at": True,
+    "pending_player_id": True,
+    "pending_choices": _CARD,
+    "pile": {"count": True, "revealed": _CARD},
+    "players": {"__all__": {**_PLAYER, "gains": _CARD}},
+}
+
+_SUBFIELDS = {
+    "pile": set(PileState.model_fields) | set(PileState.model_computed_fields),
+    "players": set(Player.model_fields),
+}
+
+
+def projection_key(
+    view: str = "full", fields: str | None = None, player_id: str | None = None
+) -> str:
+    """
+    Normalized cache key for a requested projection. `fields` (comma separated,
+    e.g. "turn_idx,players,pile.count") takes precedence over `view`.
+    Raises ValueError for unknown views or fields.
+    """
+    if fields:
+        names = sorted({f.strip() for f in fields.split(",") if f.strip()})
+        for name in names:
+            top, _, sub = name.partition(".")
+            if top not in Session.model_fields or (sub and sub not in _SUBFIELDS.get(top, ())):
+                raise ValueError(f"unknown field: {name}")
+        return "fields:" + ",".join(names)
+    if view not in VIEWS:
+        raise ValueError(f"unknown view: {view}")
+    if view == "player":
+        if not player_id:
+            raise ValueError("view=player needs player_id")
+        return f"player:{player_id}"
+    return view
+
+
+def _fields_include(spec: str) -> dict[str, Any]:
+    include: dict[str, Any] = {}
+    for name in spec.split(","):  # sorted, so "players" comes before "players.name"
+        top, _, sub = name.partition(".")
+        if not sub:
+            include[top] = True
+        elif include.get(top) is not True:
+            nested = include.setdefault(top, {})
+            if top == "players":
+                nested = nested.setdefault("__all__", {})
+            nested[sub] = True
+    return include
+
+
+def render(s: Session, key: str) -> bytes:
+    """
+    Serialize the projection named by `key` (from projection_key).
+    Raises KeyError if a player view names a player not in the session.
+    """
+    kind, _, arg = key.partition(":")
+    include: dict[str, Any] | None
+    if kind == "full":
+        include = None
+    elif kind == "table":
+        include = _TABLE
+    elif kind == "player":
+        idx = next((i for i, p in enumerate(s.players) if p.id == arg), None)
+        if idx is None:
+            raise KeyError("player not found")
+        include = {
+            **_TABLE,
+            "players": {
+                i: {**_PLAYER, "gains": _CARD} if i == idx else _PLAYER
+                for i in range(len(s.players))
+            },
+        }
+    else:
+        include = _fields_include(arg)
+    with span("model_dump"):
+        return s.model_dump_json(include=include).encode("utf-8")
+
+
+def etag_for(version: int, key: str = "full") -> str:
+    if key == "full":
+        return f'"v{version}"'
+    if key == "table":
+        return f'"v{version}-table"'
+    return f'"v{version}-{hashlib.sha1(key.encode()).hexdigest()[:12]}"'
+
+
+def etag_version(header: str | None) -> int | None:
+    """Newest session version named in an If-None-Match header (None if none)."""
+    return max((int(v) for v in re.findall(r'"v(\d+)', header or "")), default=None)
+
+
+class SnapshotCache:
+    """Byte-bounded LRU of the latest rendered body per (session, projection)."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[tuple[str, str], tuple[int, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, sid: str, version: int, key: str = "full") -> bytes | None:
+        item = self._items.get((sid, key))
+        if item is None or item[0] != version:
+            return None
+        self._items.move_to_end((sid, key))
+        return item[1]
+
+    def put(self, sid: str, version: int, body: bytes, key: str = "full") -> None:
+        old = self._items.get((sid, key))
+        if old is not None:
+            if old[0] > version:
+                return  # a newer render already landed
+            self.size -= len(old[1])
+            del self._items[(sid, key)]
+        if len(body) > self.max_bytes:
+            return
+        self._items[(sid, key)] = (version, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+cache = SnapshotCache(settings.STATE_CACHE_MAX_BYTES)
@@ -2,28 +2,31 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
+import time
 from collections.abc import Awaitable, Callable
-from typing import Any
 
-import psycopg
 from psycopg.types.json import Json
 
-from app.db.pool import get_pool
+from app.core.config import settings
+from app.core.metrics import SESSION_OP_SECONDS
+from app.core.profiling import span
+from app.core.singleflight import SingleFlight, register_flight
+from app.db.pool import connection, in_uow_transaction, reads_from_replica, transaction
+from app.features.treasure.backends import SessionStore, as_dict, open_session_store
+from app.features.treasure.hot import hot_sessions
 from app.features.treasure.models import Session
 
 log = logging.getLogger("r4t.store")
 
+# Concurrent loads of one session share a single SELECT + validation
+load_flight: SingleFlight[str, Session | None] = register_flight("session_loads", SingleFlight())
+replica_flight: SingleFlight[str, Session | None] = register_flight(
+    "replica_session_loads", SingleFlight()
+)
 
-def _as_dict(val: Any) -> dict:
-    if isinstance(val, dict):
-        return val
-    if isinstance(val, (bytes, bytearray, memoryview)):
-        val = bytes(val).decode("utf-8", "strict")
-    if isinstance(val, str):
-        return json.loads(val)
-    return json.loads(json.dumps(val))
+# Sessions this process wrote lately -> monotonic time the replica is trusted again
+_fenced: dict[str, float] = {}
 
 
 # ---------- schema management ----------
@@ -32,11 +35,9 @@ def _as_dict(val: Any) -> dict:
 async def ensure_schema() -> None:
     """
     Create tables required by this feature if they do not exist.
-    Uses the central async pool from app.db.pool.
+    Uses the central async pool from app.db.pool (or the current unit of work).
     """
-    pool = get_pool()
-    assert pool is not None, "DB pool not initialized"
-    async with pool.connection() as ac, ac.transaction():
+    async with transaction() as ac:
         await ac.execute(
             """
             CREATE TABLE IF NOT EXISTS card_assets (
@@ -50,94 +51,210 @@ async def ensure_schema() -> None:
             )
             """
         )
+        await ac.execute(
+            """
+            CREATE TABLE IF NOT EXISTS deck_fingerprints (
+              fingerprint TEXT PRIMARY KEY,
+              cards JSONB NOT NULL,
+              atlas TEXT,
+              created_at TIMESTAMPTZ DEFAULT now()
+            )
+            """
+        )
+        await ac.execute(
+            """
+            CREATE TABLE IF NOT EXISTS precache_progress (
+              sid TEXT PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+              total INTEGER NOT NULL DEFAULT 0,
+              done INTEGER NOT NULL DEFAULT 0,
+              is_ready BOOLEAN NOT NULL DEFAULT false,
+              updated_at TIMESTAMPTZ DEFAULT now()
+            )
+            """
+        )
+        await ac.execute(
+            """
+            ALTER TABLE card_assets
+              ADD COLUMN IF NOT EXISTS content_hash TEXT,
+              ADD COLUMN IF NOT EXISTS size_bytes BIGINT,
+              ADD COLUMN IF NOT EXISTS last_access TIMESTAMPTZ,
+              ADD COLUMN IF NOT EXISTS variants JSONB
+            """
+        )
+        # Where each rendered variant came from. Outlives the variant's file
+        # (and card_assets.variants) so /img-cache can redirect a session's
+        # srcset entries to the remote original after eviction.
+        await ac.execute(
+            """
+            CREATE TABLE IF NOT EXISTS variant_sources (
+              url TEXT PRIMARY KEY,
+              source_url TEXT NOT NULL
+            )
+            """
+        )
 
 
-# ---------- sessions CRUD ----------
+# ---------- sessions ----------
 
+_sessions: SessionStore | None = None
 
-async def create_session(s: Session) -> None:
-    pool = get_pool()
-    assert pool is not None, "DB pool not initialized"
-    async with pool.connection() as ac, ac.transaction():
-        await ac.execute(
-            "INSERT INTO sessions (id, data) VALUES (%s, %s)",
-            (s.id, Json(s.model_dump())),
+# In-process delta subscribers, fed by the stores that have no LISTEN/NOTIFY
+_event_listeners: list[Callable[[str], None]] = []
+
+
+def add_event_listener(fn: Callable[[str], None]) -> None:
+    _event_listeners.append(fn)
+
+
+def _publish_local(payload: str) -> None:
+    for fn in _event_listeners:
+        fn(payload)
+
+
+def session_store() -> SessionStore:
+    """The configured SessionStore (settings.SESSION_STORE), opened on first use."""
+    global _sessions
+    if _sessions is None:
+        _sessions = open_session_store(
+            settings.SESSION_STORE,
+            sqlite_path=settings.SESSION_SQLITE_PATH,
+            publish=_publish_local,
         )
+    return _sessions
 
 
-async def load_session(sid: str) -> Session | None:
-    pool = get_pool()
-    assert pool is not None, "DB pool not initialized"
-    async with pool.connection() as ac, ac.transaction():
-        cur = await ac.execute("SELECT data FROM sessions WHERE id=%s", (sid,))
-        row = await cur.fetchone()
-        if not row:
-            return None
-        return Session.model_validate(_as_dict(row[0]))
+async def close_session_store() -> None:
+    global _sessions
+    if _sessions is not None:
+        await _sessions.close()
+        _sessions = None
 
 
-async def _load_for_update(ac: psycopg.AsyncConnection, sid: str) -> Session:
-    cur = await ac.execute("SELECT data FROM sessions WHERE id=%s FOR UPDATE", (sid,))
-    row = await cur.fetchone()
-    if not row:
-        raise KeyError("session not found")
-    return Session.model_validate(_as_dict(row[0]))
+def _fence(sid: str) -> None:
+    """Read `sid` from the primary until the replica has had time to catch up."""
+    if not settings.DB_REPLICA_URL:
+        return
+    now = time.monotonic()
+    _fenced.pop(sid, None)  # re-insert at the end: the dict stays ordered by expiry
+    _fenced[sid] = now + settings.DB_REPLICA_FENCE_SECONDS
+    while (oldest := next(iter(_fenced))) != sid and _fenced[oldest] <= now:
+        del _fenced[oldest]
 
 
-async def _save(ac: psycopg.AsyncConnection, s: Session) -> None:
-    await ac.execute(
-        "UPDATE sessions SET data=%s, updated_at=now() WHERE id=%s",
-        (Json(s.model_dump()), s.id),
-    )
+def _replica_ok(sid: str) -> bool:
+    if not reads_from_replica():
+        return False
+    until = _fenced.get(sid)
+    return until is None or until <= time.monotonic()
+
+
+async def create_session(s: Session) -> None:
+    await session_store().create(s)
+    load_flight.forget(s.id)
+    _fence(s.id)
+
+
+async def load_session(
+    sid: str, *, replica: bool = False, min_version: int | None = None
+) -> Session | None:
+    """
+    Load a session. Concurrent callers for the same id share one read and one
+    parsed Session, so treat the result as read-only; changes go through
+    mutate_session. A load started after a local write never joins a read that
+    began before it. If this process owns the session hot, that live state wins.
+
+    With `replica`, the read may be served by the read replica (DB_REPLICA_URL)
+    unless this process wrote the session in the last DB_REPLICA_FENCE_SECONDS.
+    A replica miss, or a copy older than `min_version` (the newest version the
+    client has seen), is read again from the primary.
+    """
+    with SESSION_OP_SECONDS.labels("load_session").time(), span("db_load"):
+        if hot_sessions.active and (hot := hot_sessions.snapshot(sid)) is not None:
+            return hot
+        if replica and _replica_ok(sid):
+            s = await replica_flight.do(sid, lambda: session_store().load(sid, replica=True))
+            if s is not None and s.version >= (min_version or 0):
+                return s
+        if in_uow_transaction():
+            # Must see this transaction's own uncommitted writes, so no shared flight.
+            # Reads don't begin it (read_connection), so read-only requests still share.
+            return await session_store().load(sid)
+        return await load_flight.do(sid, lambda: session_store().load(sid))
+
+
+async def mutate_session_delta(
+    sid: str,
+    mutator: Callable[[Session], Awaitable[None]] | Callable[[Session], None],
+) -> tuple[Session, dict]:
+    """
+    Apply `mutator` to the session, serialized per session id, bump its
+    version and publish the delta to real-time subscribers. Returns the
+    mutated session and that delta. Raises KeyError if the session is gone.
+
+    With HOT_SESSIONS on, the mutation is applied to this process's in-memory
+    copy instead and persisted (and NOTIFYed) write-behind; see hot.py.
+    """
+    with SESSION_OP_SECONDS.labels("mutate_session").time(), span("db_mutate"):
+        if hot_sessions.active:
+            return await hot_sessions.mutate(sid, mutator)
+        s, delta = await session_store().mutate(sid, mutator)
+    load_flight.forget(sid)
+    _fence(sid)
+    return s, delta
 
 
 async def mutate_session(
     sid: str,
     mutator: Callable[[Session], Awaitable[None]] | Callable[[Session], None],
 ) -> Session:
+    s, _ = await mutate_session_delta(sid, mutator)
+    return s
+
+
+async def get_session_version(
+    sid: str, *, replica: bool = False, min_version: int | None = None
+) -> int | None:
     """
-    Serialize mutations per session id using row-level lock.
+    Current version without loading the document (None if the session doesn't
+    exist). `replica` and `min_version` work as for load_session.
     """
-    pool = get_pool()
-    assert pool is not None, "DB pool not initialized"
-    async with pool.connection() as ac, ac.transaction():
-        s = await _load_for_update(ac, sid)
-        res = mutator(s)
-        if asyncio.iscoroutine(res):
-            await res
-        await _save(ac, s)
-        return s
+    if hot_sessions.active and (v := hot_sessions.version(sid)) is not None:
+        return v
+    if replica and _replica_ok(sid):
+        v = await session_store().version(sid, replica=True)
+        if v is not None and v >= (min_version or 0):
+            return v
+    return await session_store().version(sid)
 
 
 # ---------- card asset helpers ----------
 
 
+_ASSET_COLUMNS = (
+    "oracle_id",
+    "name",
+    "small_url",
+    "local_small_path",
+    "etag",
+    "last_modified",
+    "fetched_at",
+    "content_hash",
+    "size_bytes",
+    "last_access",
+    "variants",
+)
+_ASSET_SELECT = ", ".join(_ASSET_COLUMNS)
+
+
 async def get_asset(oracle_id: str) -> dict | None:
-    pool = get_pool()
-    assert pool is not None, "DB pool not initialized"
-    async with pool.connection() as ac:
-        async with ac.transaction():
-            cur = await ac.execute(
-                """
-                SELECT oracle_id, name, small_url, local_small_path, etag, last_modified, fetched_at
-                FROM card_assets
-                WHERE oracle_id=%s
-                """,
-                (oracle_id,),
-            )
-            row = await cur.fetchone()
-            if not row:
-                return None
-            keys = [
-                "oracle_id",
-                "name",
-                "small_url",
-                "local_small_path",
-                "etag",
-                "last_modified",
-                "fetched_at",
-            ]
-            return dict(zip(keys, row, strict=False))
+    async with connection() as ac:
+        cur = await ac.execute(
+            f"SELECT {_ASSET_SELECT} FROM card_assets WHERE oracle_id=%s",
+            (oracle_id,),
+            prepare=True,
+        )
+        row = await cur.fetchone()
+    return dict(zip(_ASSET_COLUMNS, row, strict=True)) if row else None
 
 
 async def upsert_asset(
@@ -147,84 +264,296 @@ async def upsert_asset(
     local_small_path: str | None,
     etag: str | None,
     last_modified: str | None,
+    *,
+    content_hash: str | None = None,
+    size_bytes: int | None = None,
+) -> dict:
+    """Insert or refresh an asset row; returns it as get_asset would."""
+    async with connection() as ac:
+        cur = await ac.execute(
+            f"""
+            INSERT INTO card_assets (oracle_id, name, small_url, local_small_path, etag, last_modified,
+                                     content_hash, size_bytes, fetched_at, last_access)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, now(), now())
+            ON CONFLICT (oracle_id) DO UPDATE
+            SET name = EXCLUDED.name,
+                small_url = EXCLUDED.small_url,
+                local_small_path = EXCLUDED.local_small_path,
+                etag = EXCLUDED.etag,
+                last_modified = EXCLUDED.last_modified,
+                content_hash = EXCLUDED.content_hash,
+                size_bytes = EXCLUDED.size_bytes,
+                fetched_at = now(),
+                last_access = now()
+            RETURNING {_ASSET_SELECT}
+            """,
+            (
+                oracle_id,
+                name,
+                small_url,
+                local_small_path,
+                etag,
+                last_modified,
+                content_hash,
+                size_bytes,
+            ),
+            prepare=True,
+        )
+        row = await cur.fetchone()
+    assert row is not None
+    return dict(zip(_ASSET_COLUMNS, row, strict=True))
+
+
+async def find_remote_image(
+    content_hash: str | None, oracle_id: str | None, url: str | None = None
+) -> str | None:
+    """
+    Remote (Scryfall) url for a cached image, looked up by content hash or
+    oracle id, or for a resized variant by its local `url`.
+    """
+    async with connection() as ac:
+        cur = await ac.execute(
+            """
+            (SELECT small_url FROM card_assets
+             WHERE (content_hash = %s OR oracle_id = %s) AND small_url IS NOT NULL
+             LIMIT 1)
+            UNION ALL
+            SELECT source_url FROM variant_sources WHERE url = %s
+            LIMIT 1
+            """,
+            (content_hash, oracle_id, url),
+        )
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+
+async def set_asset_variants(
+    oracle_id: str, variants: list[dict], source_url: str | None = None
 ) -> None:
-    pool = get_pool()
-    assert pool is not None, "DB pool not initialized"
-    async with pool.connection() as ac:
-        async with ac.transaction():
+    """
+    Record resized variants ({url, w, fmt, bytes}) for an asset, and the
+    remote image they were rendered from (see find_remote_image).
+    """
+    async with transaction() as ac:
+        await ac.execute(
+            "UPDATE card_assets SET variants = %s WHERE oracle_id = %s",
+            (Json(variants), oracle_id),
+        )
+        if source_url and variants:
             await ac.execute(
                 """
-                INSERT INTO card_assets (oracle_id, name, small_url, local_small_path, etag, last_modified, fetched_at)
-                VALUES (%s, %s, %s, %s, %s, %s, now())
-                ON CONFLICT (oracle_id) DO UPDATE
-                SET name = EXCLUDED.name,
-                    small_url = EXCLUDED.small_url,
-                    local_small_path = EXCLUDED.local_small_path,
-                    etag = EXCLUDED.etag,
-                    last_modified = EXCLUDED.last_modified,
-                    fetched_at = now()
+                INSERT INTO variant_sources (url, source_url)
+                SELECT u, %s FROM unnest(%s::text[]) AS u
+                ON CONFLICT (url) DO UPDATE SET source_url = EXCLUDED.source_url
                 """,
-                (oracle_id, name, small_url, local_small_path, etag, last_modified),
+                (source_url, [v["url"] for v in variants]),
             )
 
 
-# ---------- TTL cleanup ----------
+async def touch_assets(oracle_ids: list[str]) -> None:
+    """Record an access for LRU eviction."""
+    if not oracle_ids:
+        return
+    async with transaction() as ac:
+        await ac.execute(
+            "UPDATE card_assets SET last_access = now() WHERE oracle_id = ANY(%s)",
+            (list(oracle_ids),),
+            prepare=True,
+        )
 
 
-async def cleanup_expired_sessions_once(ttl_hours: int = 72) -> int:
+async def preload_card_assets(limit: int) -> int:
     """
-    Delete sessions whose updated_at (or created_at if updated_at is null) is older than ttl_hours.
-    Assumes a schema with columns: id TEXT PK, data JSONB, created_at TIMESTAMPTZ DEFAULT now(), updated_at TIMESTAMPTZ.
-    Returns number of rows deleted.
+    Pull card_assets' primary-key index (with pg_prewarm, when installed) and
+    the `limit` most recently used rows into Postgres' buffer cache, so the
+    first precache lookups after a deploy or database restart don't wait on
+    disk. Returns the number of rows read.
     """
-    pool = get_pool()
-    assert pool is not None, "DB pool not initialized"
-    to_interval = f"{int(ttl_hours)} hours"
-    async with pool.connection() as ac, ac.transaction():
+    async with connection() as ac:
+        cur = await ac.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'")
+        if await cur.fetchone():
+            await ac.execute("SELECT pg_prewarm('card_assets_pkey'::regclass)")
+        cur = await ac.execute(
+            f"""
+            SELECT {_ASSET_SELECT} FROM card_assets
+            ORDER BY last_access DESC NULLS LAST
+            LIMIT %s
+            """,
+            (limit,),
+        )
+        return len(await cur.fetchall())
+
+
+async def evict_assets_over_budget(
+    max_bytes: int, files: list[tuple[str, int, float]] | None = None
+) -> list[str]:
+    """
+    Detach local files from the least-recently-accessed assets until the cached
+    total fits in max_bytes. `files` are other cached files competing for the
+    same budget, as (url, bytes, last used in epoch seconds); they take their
+    place in the same LRU order. Returns the local paths that are no longer
+    referenced by any asset, and the urls of evicted `files` (safe to delete
+    from disk).
+    """
+    files = files or []
+    async with transaction() as ac:
         cur = await ac.execute(
             """
-            WITH base AS (
-              SELECT id
-              FROM sessions
-              WHERE COALESCE(updated_at, created_at, now()) < (now() - %s::interval)
+            WITH sized AS (
+              SELECT oracle_id,
+                     local_small_path,
+                     variants,
+                     COALESCE(size_bytes, 0) + COALESCE(
+                       (SELECT SUM((v->>'bytes')::bigint) FROM jsonb_array_elements(variants) v), 0
+                     ) AS total,
+                     COALESCE(last_access, fetched_at) AS used_at
+              FROM card_assets
+              WHERE local_small_path IS NOT NULL OR variants IS NOT NULL
+              UNION ALL
+              SELECT NULL, f.url, NULL, f.bytes, to_timestamp(f.used_at)
+              FROM unnest(%s::text[], %s::bigint[], %s::float8[]) AS f(url, bytes, used_at)
+            ),
+            ranked AS (
+              SELECT oracle_id, local_small_path, variants,
+                     SUM(total) OVER (
+                       ORDER BY used_at DESC NULLS LAST, oracle_id, local_small_path
+                     ) AS running
+              FROM sized
+            ),
+            evicted AS (
+              UPDATE card_assets a
+              SET local_small_path = NULL, variants = NULL
+              FROM ranked r
+              WHERE a.oracle_id = r.oracle_id AND r.running > %s
+              RETURNING r.local_small_path, r.variants
             )
-            DELETE FROM sessions s USING base b
-            WHERE s.id = b.id
-            RETURNING s.id
+            SELECT local_small_path AS path FROM evicted
+            UNION
+            SELECT v->>'url' FROM evicted, jsonb_array_elements(evicted.variants) v
+            UNION
+            SELECT local_small_path FROM ranked WHERE oracle_id IS NULL AND running > %s
+            """,
+            (
+                [url for url, _, _ in files],
+                [size for _, size, _ in files],
+                [used_at for _, _, used_at in files],
+                max_bytes,
+                max_bytes,
+            ),
+        )
+        paths = [r[0] for r in await cur.fetchall() if r[0]]
+        if not paths:
+            return []
+        cur = await ac.execute(
+            """
+            SELECT local_small_path FROM card_assets WHERE local_small_path = ANY(%s)
+            UNION
+            SELECT v->>'url' FROM card_assets, jsonb_array_elements(variants) v
+            WHERE variants IS NOT NULL AND v->>'url' = ANY(%s)
             """,
-            (to_interval,),
+            (paths, paths),
+        )
+        still_used = {r[0] for r in await cur.fetchall()}
+        return [p for p in paths if p not in still_used]
+
+
+async def forget_missing_local_paths(present: set[str], exists: Callable[[str], bool]) -> int:
+    """
+    Clear local paths/variants on rows whose files are not in `present` (a
+    listing of the cache). The listing is a snapshot, so each candidate is
+    re-checked with `exists` (blocking; run in a thread) before it is cleared,
+    and a row is only cleared if it still points at what was checked: files
+    committed, and rows written, after the listing survive. Returns rows updated.
+    """
+    async with connection() as ac:
+        cur = await ac.execute(
+            """
+            SELECT oracle_id, local_small_path, variants FROM card_assets
+            WHERE local_small_path IS NOT NULL OR variants IS NOT NULL
+            """
         )
         rows = await cur.fetchall()
-        deleted = len(rows or [])
-        if deleted:
-            log.info("TTL cleanup removed %d session(s)", deleted)
-        return deleted
+
+    def check() -> tuple[list[tuple[str, str]], list[tuple[str, list[dict]]]]:
+        missing: list[tuple[str, str]] = []
+        broken: list[tuple[str, list[dict]]] = []
+        for oid, path, variants in rows:
+            if path and path not in present and not exists(path):
+                missing.append((oid, path))
+            elif variants and any(
+                v.get("url") not in present and not exists(v.get("url") or "") for v in variants
+            ):
+                broken.append((oid, variants))
+        return missing, broken
+
+    missing, broken_variants = await asyncio.to_thread(check)
+    if not (missing or broken_variants):
+        return 0
+    async with transaction() as ac:
+        updated = 0
+        if missing:
+            cur = await ac.execute(
+                """
+                UPDATE card_assets a SET local_small_path = NULL, variants = NULL
+                FROM unnest(%s::text[], %s::text[]) AS m(oracle_id, path)
+                WHERE a.oracle_id = m.oracle_id AND a.local_small_path = m.path
+                """,
+                ([oid for oid, _ in missing], [path for _, path in missing]),
+            )
+            updated += cur.rowcount
+        if broken_variants:
+            cur = await ac.execute(
+                """
+                UPDATE card_assets a SET variants = NULL
+                FROM unnest(%s::text[], %s::jsonb[]) AS m(oracle_id, variants)
+                WHERE a.oracle_id = m.oracle_id AND a.variants = m.variants
+                """,
+                (
+                    [oid for oid, _ in broken_variants],
+                    [Json(variants) for _, variants in broken_variants],
+                ),
+            )
+            updated += cur.rowcount
+        return updated
 
 
-async def periodic_cleanup(
-    ttl_hours: int = 72,
-    interval_seconds: int = 900,
-    stop_event: asyncio.Event | None = None,
-) -> None:
+# ---------- deck fingerprints ----------
+
+
+async def get_deck(fingerprint: str) -> dict | None:
+    async with connection() as ac:
+        cur = await ac.execute(
+            "SELECT cards, atlas FROM deck_fingerprints WHERE fingerprint=%s", (fingerprint,)
+        )
+        row = await cur.fetchone()
+        if not row:
+            return None
+        return {"cards": as_dict(row[0]), "atlas": row[1]}
+
+
+async def record_deck(fingerprint: str, cards: dict[str, dict], atlas: str | None) -> None:
+    """Remember resolved card metadata (name -> oracle_id/img/scry/variants) for a precached deck."""
+    async with transaction() as ac:
+        await ac.execute(
+            """
+            INSERT INTO deck_fingerprints (fingerprint, cards, atlas, created_at)
+            VALUES (%s, %s, %s, now())
+            ON CONFLICT (fingerprint) DO UPDATE
+            SET cards = EXCLUDED.cards, atlas = EXCLUDED.atlas, created_at = now()
+            """,
+            (fingerprint, Json(cards), atlas),
+        )
+
+
+# ---------- TTL cleanup ----------
+
+
+async def cleanup_expired_sessions_once(ttl_hours: int = 72) -> int:
+    """
+    Delete sessions not updated (or, never updated, created) in the last ttl_hours.
+    Returns the number of sessions deleted.
     """
-    Background loop to periodically call cleanup_expired_sessions_once.
-    Create/cancel lifecycle in app.startup/shutdown.
-    """
-    log.info("Starting periodic_cleanup loop (ttl=%sh, every=%ss)", ttl_hours, interval_seconds)
-    try:
-        while True:
-            try:
-                await cleanup_expired_sessions_once(ttl_hours)
-            except Exception as e:
-                log.exception("periodic_cleanup iteration failed: %s", e)
-            # Wait for next tick or early stop
-            try:
-                if stop_event:
-                    await asyncio.wait_for(stop_event.wait(), timeout=interval_seconds)
-                    break
-                else:
-                    await asyncio.sleep(interval_seconds)
-            except TimeoutError:
-                continue
-    finally:
-        log.info("periodic_cleanup loop stopped")
+    deleted = await session_store().cleanup(ttl_hours)
+    if deleted:
+        log.info("TTL cleanup removed %d session(s)", deleted)
+    return deleted
@@ -0,0 +1,118 @@
+# app/features/treasure/thumbs.py
+"""
+Multi-resolution thumbnail stage that runs after the small image is cached.
+
+Jobs go through a bounded asyncio queue (producers wait when it is full) to a
+fixed set of consumers. Each consumer downloads the card's `normal` image to a
+private scratch file (never the shared cache, where another render of the same
+card could delete it mid-read), renders the configured widths in every supported modern format in the image
+process pool, commits the results to the content-addressed cache and records
+them on the card_assets row (when there is a database to record them in).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.pool import get_pool
+from app.features.treasure import imaging
+from app.features.treasure.imagestore import commit_stream, scratch_file
+from app.features.treasure.scryfall import download_to
+from app.features.treasure.store import set_asset_variants
+
+log = logging.getLogger("r4t.thumbs")
+
+
+@dataclass
+class _Job:
+    oracle_id: str
+    source_url: str
+    done: asyncio.Future
+
+
+class ThumbnailPipeline:
+    def __init__(self, maxsize: int, workers: int) -> None:
+        self.queue: asyncio.Queue[_Job] = asyncio.Queue(maxsize=maxsize)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    async def submit(self, oracle_id: str, source_url: str) -> asyncio.Future:
+        """Enqueue a job (waiting while the queue is full); the future resolves to its variants."""
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put(_Job(oracle_id, source_url, fut))
+        return fut
+
+    async def stop(self) -> None:
+        for t in self.tasks:
+            t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            if not job.done.done():
+                job.done.cancel()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                variants = await render_variants(job.source_url)
+                if get_pool() is not None:
+                    await set_asset_variants(job.oracle_id, variants, job.source_url)
+                if not job.done.done():
+                    job.done.set_result(variants)
+            except asyncio.CancelledError:
+                if not job.done.done():
+                    job.done.cancel()
+                raise
+            except Exception as e:
+                log.warning("thumbnail job failed for %s: %r", job.oracle_id, e)
+                if not job.done.done():
+                    job.done.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+
+async def render_variants(source_url: str) -> list[dict]:
+    """Download a source image, render variants off-loop and commit them. Returns variant dicts."""
+    formats = imaging.supported_formats()
+    with scratch_file() as src_path:
+        await run_in_threadpool(download_to, source_url, src_path)
+        rendered = await imaging.run_in_process(
+            imaging.make_variants, str(src_path), list(settings.IMAGE_VARIANT_WIDTHS), formats
+        )
+
+    variants: list[dict] = []
+    for width, fmt, data in rendered:
+        stored = await asyncio.to_thread(commit_stream, [data], f".{fmt}")
+        variants.append({"url": stored.url, "w": width, "fmt": fmt, "bytes": stored.size})
+    return variants
+
+
+_pipeline: ThumbnailPipeline | None = None
+_pipeline_loop: asyncio.AbstractEventLoop | None = None
+
+
+def enabled() -> bool:
+    return bool(settings.IMAGE_VARIANT_WIDTHS) and bool(imaging.supported_formats())
+
+
+def get_pipeline() -> ThumbnailPipeline:
+    """Pipeline bound to the running loop (created on first use)."""
+    global _pipeline, _pipeline_loop
+    loop = asyncio.get_running_loop()
+    if _pipeline is None or _pipeline_loop is not loop:
+        _pipeline = ThumbnailPipeline(settings.IMAGE_QUEUE_SIZE, settings.IMAGE_WORKERS)
+        _pipeline_loop = loop
+    return _pipeline
+
+
+async def stop_pipeline() -> None:
+    global _pipeline, _pipeline_loop
+    if _pipeline is not None and _pipeline_loop is asyncio.get_running_loop():
+        await _pipeline.stop()
+    _pipeline = None
+    _pipeline_loop = None
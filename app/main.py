@@ -2,69 +2,143 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
 import time
 import uuid
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
-from typing import Any
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core.config import configure_root_logger, settings
-from app.db.pool import close_pool, init_pool
-from app.features.treasure.store import periodic_cleanup
+from app.core.logs import access_sampler, setup_json_logging, stop_logging
+from app.core.metrics import HTTP_LATENCY, HTTP_REQUESTS
+from app.core.profiling import Sampler, collect_spans, profile_requested
+from app.db.pool import close_pool, get_pool, init_pool
+from app.db.scheduler import PeriodicTask, Scheduler
+from app.features.treasure.store import (
+    cleanup_expired_sessions_once,
+    close_session_store,
+    preload_card_assets,
+)
+from app.web.health import readiness
+
+# Background machinery (job worker, listeners, hot sessions, the image
+# pipeline) is imported in lifespan() behind the settings that turn it on, so
+# a process that doesn't run it doesn't pay for the import.
 from app.web.router import make_root_router
 
-# -------- JSON logging (preserve existing behavior) --------
+# -------- Middleware (preserve header casing) --------
 
 
-class JsonFormatter(logging.Formatter):
-    def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
-        payload: dict[str, Any] = {
-            "level": record.levelname,
-            "logger": record.name,
-            "message": record.getMessage(),
-        }
-        for k in ("request_id", "path", "method", "status_code", "latency_ms"):
-            if hasattr(record, k):
-                payload[k] = getattr(record, k)
-        return json.dumps(payload, ensure_ascii=False)
+class RequestIdMiddleware:
+    """
+    Raw ASGI middleware: propagates X-Request-ID, writes one JSON access-log
+    line per request and records its latency, timed to the last body byte.
+    Spans and on-demand sampling (app.core.profiling) hang off the same line.
+    Unlike BaseHTTPMiddleware it runs the app in the same task and never
+    re-wraps the response stream, so streaming responses (SSE) pass straight
+    through.
+    """
 
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.logger = logging.getLogger("app.access")
+        self.sampler = access_sampler()
+        self.spans = settings.PROFILE_SPANS
+        self.profiling = bool(settings.PROFILE_TOKEN)
+        self._routes: dict[object, str] = {}  # endpoint -> path template
 
-def setup_json_logging() -> None:
-    root = logging.getLogger()
-    root.setLevel(logging.INFO)
-    handler = logging.StreamHandler()
-    handler.setFormatter(JsonFormatter())
-    root.handlers.clear()
-    root.addHandler(handler)
+    def _route(self, scope: Scope) -> str:
+        """Path template of the matched route, so metric labels stay bounded."""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        label = self._routes.get(endpoint)
+        if label is None:
+            label = "unmatched"
+            for r in scope["app"].router.routes:
+                if getattr(r, "endpoint", None) is endpoint or getattr(r, "app", None) is endpoint:
+                    label = r.path or "/"
+                    break
+            self._routes[endpoint] = label
+        return label
 
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-# -------- Middleware (preserve header casing) --------
+        req_id = ""
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                req_id = value.decode("latin-1")
+                break
+        req_id = req_id or str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = req_id
+        sampler = Sampler.start_for(req_id) if self.profiling and profile_requested(scope) else None
+        spans: dict[str, float] | None = None
+        start = time.perf_counter()
+        status_code = 500
+        logged = False
 
+        def log_request() -> None:
+            nonlocal logged
+            logged = True
+            elapsed = time.perf_counter() - start
+            route, method = self._route(scope), scope["method"]
+            HTTP_LATENCY.labels(route, method).observe(elapsed)
+            HTTP_REQUESTS.labels(route, method, str(status_code)).inc()
+            latency = elapsed * 1000.0
+            if sampler is not None:
+                sampler.stop()
+                rate: float | None = 1.0
+            else:
+                rate = self.sampler.keep(scope["path"], status_code, latency)
+            if rate is None:
+                return
+            extra: dict[str, object] = {
+                "request_id": req_id,
+                "path": scope["path"],
+                "method": scope["method"],
+                "status_code": status_code,
+                "latency_ms": round(latency, 2),
+            }
+            if rate < 1.0:
+                extra["sample_rate"] = rate
+            if spans:
+                extra["spans"] = {k: round(v, 2) for k, v in spans.items()}
+            if sampler is not None:
+                extra["profile"] = sampler.path.name
+            self.logger.info("request", extra=extra)
 
-class RequestIdMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        req_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        start = time.perf_counter()
-        request.state.request_id = req_id  # type: ignore[attr-defined]
-        response = await call_next(request)
-        response.headers["X-Request-ID"] = req_id
-        logger = logging.getLogger("app.access")
-        latency = (time.perf_counter() - start) * 1000.0
-        extra = {
-            "request_id": req_id,
-            "path": request.url.path,
-            "method": request.method,
-            "status_code": response.status_code,
-            "latency_ms": round(latency, 2),
-        }
-        logger.info("request", extra=extra)
-        return response
+        async def send_with_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", ()))
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = req_id
+                if sampler is not None:
+                    headers["X-Profile-Id"] = sampler.path.name
+            await send(message)
+            if message["type"] == "http.response.pathsend" or (
+                message["type"] == "http.response.body" and not message.get("more_body", False)
+            ):
+                log_request()
+
+        try:
+            if self.spans or sampler is not None:
+                with collect_spans() as spans:
+                    await self.app(scope, receive, send_with_id)
+            else:
+                await self.app(scope, receive, send_with_id)
+        finally:
+            if not logged:  # raised, or the client went away mid-stream
+                log_request()
 
 
 # -------- Lifespan: startup/shutdown orchestration --------
@@ -76,28 +150,131 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     setup_json_logging()
     configure_root_logger()
 
-    # DB pool
+    log = logging.getLogger("r4t.app")
+    started = time.perf_counter()
+
+    # DB pool, warmed up to DB_MIN_SIZE before we serve (DB_WARM_POOL)
     await init_pool()
+    pool_ms = (time.perf_counter() - started) * 1000
 
-    # Periodic TTL cleanup (sessions)
-    app.state.cleanup_stop = asyncio.Event()
-    app.state.cleanup_task = asyncio.create_task(
-        periodic_cleanup(ttl_hours=72, interval_seconds=900, stop_event=app.state.cleanup_stop)
-    )
+    # Hot card_assets rows into the database's cache (PRELOAD_CARD_ASSETS)
+    if settings.PRELOAD_CARD_ASSETS and get_pool() is not None:
+        try:
+            rows = await preload_card_assets(settings.PRELOAD_CARD_ASSETS)
+            log.info("preloaded %d card asset(s)", rows)
+        except Exception as e:
+            log.warning("card asset preload failed: %r", e)
+
+    # Periodic tasks, each run by one elected process (TTL cleanup of sessions
+    # and failed jobs, image cache integrity)
+    from app.features.treasure.imagestore import startup_scan, verify_cache  # noqa: PLC0415
+
+    periodic = [
+        PeriodicTask(
+            "session_cleanup",
+            lambda: cleanup_expired_sessions_once(settings.SESSION_TTL_HOURS),
+            settings.SESSION_CLEANUP_SECONDS,
+        ),
+        PeriodicTask("image_cache_verify", verify_cache, settings.IMAGE_CACHE_VERIFY_SECONDS),
+    ]
+    if get_pool() is not None:
+        from app.db.jobs import prune_failed  # noqa: PLC0415
+
+        periodic.append(
+            PeriodicTask(
+                "job_cleanup",
+                lambda: prune_failed(settings.JOB_FAILED_RETENTION_HOURS),
+                settings.JOB_CLEANUP_SECONDS,
+            )
+        )
+    app.state.scheduler = Scheduler(periodic)
+    app.state.scheduler_task = asyncio.create_task(app.state.scheduler.run())
+
+    # Readiness checks in the background; /readyz serves the last result
+    app.state.readiness_task = asyncio.create_task(readiness.run())
+
+    # Image cache listing and stale temp sweep (off the request path)
+    app.state.image_scan_task = asyncio.create_task(startup_scan())
+
+    # Precache progress published by other processes
+    if get_pool() is not None:
+        from app.features.treasure import events, progress  # noqa: PLC0415
 
+        app.state.progress_task = asyncio.create_task(progress.listen())
+        app.state.events_task = asyncio.create_task(events.bus.run())
+
+    # Hot sessions (in-memory ownership, write-behind)
+    if settings.HOT_SESSIONS and settings.SESSION_STORE == "postgres" and get_pool() is not None:
+        from app.features.treasure.hot import hot_sessions  # noqa: PLC0415
+
+        await hot_sessions.start()
+        app.state.hot_sessions = hot_sessions
+        app.state.hot_task = asyncio.create_task(hot_sessions.run())
+
+    # Embedded job worker (dedicated ones run via `python -m app.worker`)
+    if settings.JOB_EMBEDDED_CONCURRENCY and get_pool() is not None:
+        from app.db.jobs import Worker  # noqa: PLC0415
+        from app.features.treasure.precache import JOB_HANDLERS  # noqa: PLC0415
+
+        app.state.job_worker = Worker(JOB_HANDLERS, settings.JOB_EMBEDDED_CONCURRENCY)
+        app.state.job_worker_task = asyncio.create_task(app.state.job_worker.run())
+
+    log.info(
+        "startup complete in %.0fms (db pool %.0fms)",
+        (time.perf_counter() - started) * 1000,
+        pool_ms,
+    )
     try:
         yield
     finally:
-        # Stop periodic task gracefully
-        stop = getattr(app.state, "cleanup_stop", None)
-        task = getattr(app.state, "cleanup_task", None)
+        worker = getattr(app.state, "job_worker", None)
+        if worker is not None:
+            worker.stop()
+            try:
+                await app.state.job_worker_task
+            except Exception:
+                logging.getLogger("r4t.app").exception("Error stopping job worker")
+
+        for name in (
+            "readiness_task",
+            "image_scan_task",
+            "progress_task",
+            "events_task",
+            "hot_task",
+        ):
+            t = getattr(app.state, name, None)
+            if t and not t.done():
+                t.cancel()
+
+        # Stop periodic tasks (releases leadership to the remaining processes)
+        scheduler = getattr(app.state, "scheduler", None)
+        if scheduler is not None:
+            scheduler.stop()
+            try:
+                await app.state.scheduler_task
+            except Exception:
+                logging.getLogger("r4t.app").exception("Error stopping the scheduler")
+
+        hot = getattr(app.state, "hot_sessions", None)
+        if hot is not None and hot.active:
+            try:
+                await hot.close()
+            except Exception:
+                logging.getLogger("r4t.app").exception("Error flushing hot sessions")
+
         try:
-            if stop:
-                stop.set()
-            if task:
-                await task
+            await close_session_store()
         except Exception:
-            logging.getLogger("r4t.app").exception("Error stopping periodic cleanup task")
+            logging.getLogger("r4t.app").exception("Error closing session store")
+
+        from app.features.treasure.imaging import shutdown_executor  # noqa: PLC0415
+        from app.features.treasure.thumbs import stop_pipeline  # noqa: PLC0415
+
+        try:
+            await stop_pipeline()
+        except Exception:
+            logging.getLogger("r4t.app").exception("Error stopping thumbnail pipeline")
+        shutdown_executor()
 
         # Close DB pool
         try:
@@ -105,6 +282,8 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         except Exception:
             logging.getLogger("r4t.app").exception("Error closing DB pool")
 
+        stop_logging()
+
 
 def create_app() -> FastAPI:
     app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
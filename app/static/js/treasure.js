@@ -5,6 +5,10 @@
    - Shows kept card (1–5) in reveal, highlighted
    - Chosen-card flash overlay
    - End Game lock
+   - Renders cards from the deck sprite atlas when one is available
+   - Otherwise picks the smallest avif/webp variant that fits (srcset)
+   - Follows other devices' moves live over SSE (/events), applying versioned deltas
+   - Actions answer with the same deltas instead of full state dumps
 */
 (function () {
   const { $, $$, toast, haptic, escapeHtml } = window.EDH;
@@ -27,6 +31,8 @@
   let choicePending = false;
   let lastReveal = [];
   let playerSlider = null;
+  let atlas = null;          // { image, cols, rows, tile, cards: { oracle_id: [col, row] } }
+  let atlasLoading = null;
 
   // --- Banner ---
   const banner = document.createElement("div");
@@ -43,15 +49,36 @@
   flashHost.setAttribute("aria-hidden", "true");
   document.body.appendChild(flashHost);
 
+  // Rendered widths (CSS px) per view; the browser multiplies by DPR when picking from srcset
+  const SIZES_TILE  = "(min-width: 480px) 160px, 33vw";
+  const SIZES_FLASH = "min(42vmin, 420px)";   // matches #tc-flash .card img
+
+  // <picture> with one <source> per modern format, falling back to the small image
+  function pictureEl(c, sizes, lazy = true) {
+    const pic = document.createElement("picture");
+    for (const fmt of ["avif", "webp"]) {
+      const vs = (c.variants || []).filter(v => v.fmt === fmt);
+      if (!vs.length) continue;
+      const src = document.createElement("source");
+      src.type = `image/${fmt}`;
+      src.srcset = vs.map(v => `${v.url} ${v.w}w`).join(", ");
+      src.sizes = sizes;
+      pic.appendChild(src);
+    }
+    const img = new Image();
+    if (lazy) img.loading = "lazy";
+    img.src = c.img;
+    img.alt = c.name || "";
+    pic.appendChild(img);
+    return pic;
+  }
+
   function flashChosen(card) {
     if (!card || !card.img) return;
     flashHost.innerHTML = "";
     const wrap = document.createElement("div");
     wrap.className = "card";
-    const img = new Image();
-    img.src = card.img;
-    img.alt = card.name || "Chosen card";
-    wrap.appendChild(img);
+    wrap.appendChild(pictureEl({ ...card, name: card.name || "Chosen card" }, SIZES_FLASH, false));
     flashHost.appendChild(wrap);
 
     // restart animation
@@ -148,16 +175,58 @@
     a.className = `tc-card${extraClass ? " " + extraClass : ""}`;
     a.setAttribute("aria-label", c.name);
 
-    const img = new Image();
-    img.loading = "lazy";
-    img.src = c.img;
-    img.alt = c.name;
-
-    a.appendChild(img);
+    const pos = atlas && c.oracle_id ? atlas.cards[c.oracle_id] : null;
+    if (pos) {
+      a.appendChild(spriteEl(c, pos));
+    } else if (!c.img) {
+      // Still being cached (progressive precache); show the name until the image lands
+      const ph = document.createElement("span");
+      ph.className = "tc-placeholder";
+      ph.textContent = c.name;
+      a.appendChild(ph);
+    } else {
+      a.appendChild(pictureEl(c, SIZES_TILE));
+    }
     a.title = c.name;
     return a;
   };
 
+  // One tile of the atlas, positioned with percentages so it scales with the grid cell
+  const spriteEl = (c, [col, row]) => {
+    const s = document.createElement("span");
+    s.className = "tc-sprite";
+    s.setAttribute("role", "img");
+    s.setAttribute("aria-label", c.name);
+    s.style.backgroundImage = `url("${atlas.image}")`;
+    s.style.backgroundSize = `${atlas.cols * 100}% ${atlas.rows * 100}%`;
+    const x = atlas.cols > 1 ? (col / (atlas.cols - 1)) * 100 : 0;
+    const y = atlas.rows > 1 ? (row / (atlas.rows - 1)) * 100 : 0;
+    s.style.backgroundPosition = `${x}% ${y}%`;
+    return s;
+  };
+
+  // Fetch the atlas map once; resolves after the sheet itself has loaded
+  function loadAtlas() {
+    if (atlas || atlasLoading || !state?.atlas) return atlasLoading;
+    atlasLoading = (async () => {
+      try {
+        const r = await fetch(state.atlas);
+        if (!r.ok) return;
+        const map = await r.json();
+        await new Promise((resolve) => {
+          const sheet = new Image();
+          sheet.onload = resolve;
+          sheet.onerror = resolve;
+          sheet.src = map.image;
+        });
+        atlas = map;
+      } catch (e) {
+        console.warn("atlas unavailable", e);
+      }
+    })();
+    return atlasLoading;
+  }
+
   const renderDeck = (override) => {
     const src = (override && override.length)
       ? override
@@ -210,13 +279,29 @@
   };
 
   async function fetchState() {
-    const r = await fetch(`/treasure/${sid}/state`);
+    // Never accept an older copy than we've seen (the server may read a lagging replica)
+    const seen = Math.max(state?.version || 0, newestSeen);
+    const r = await fetch(`/treasure/${sid}/state?view=table&min_version=${seen}`);
     if (!r.ok) throw new Error("Failed to load session");
     return r.json();
   }
 
   async function refreshState() {
     state = await fetchState();
+    await renderState();
+  }
+
+  const updateBanner = () => {
+    if (isClosed() || choicePending) return;
+    if (currentPlayer()?.dug_this_turn) {
+      showBanner("Roll complete — press “Pass turn” when you’re done.");
+    } else {
+      hideBanner();
+    }
+  };
+
+  async function renderState() {
+    await loadAtlas();
     updateTurnUI();
 
     if (isClosed()) {
@@ -239,11 +324,7 @@
     } else {
       choicePending = false;
       renderDeck();
-      if (currentPlayer()?.dug_this_turn) {
-        showBanner("Roll complete — press “Pass turn” when you’re done.");
-      } else {
-        hideBanner();
-      }
+      updateBanner();
       disableChoice();
     }
 
@@ -252,6 +333,78 @@
     updateControls();
   }
 
+  // --- Live updates ---
+  // Deltas: { v, base, set, players: {id: {..., "gains+": [...]}}, log: {trim, add}, pile: {count, revealed} }
+  const DECK_KEYS = ["pending_choices", "turn_idx", "closed_at", "atlas"];
+  let resyncing = null;
+  let newestSeen = 0;   // highest version announced while a resync was in flight
+
+  function resync() {
+    if (!resyncing) {
+      resyncing = refreshState()
+        .catch((e) => console.warn("resync failed", e))
+        .finally(() => {
+          resyncing = null;
+          if (newestSeen > (state?.version || 0)) resync();
+        });
+    }
+    return resyncing;
+  }
+
+  function applyDelta(d) {
+    Object.assign(state, d.set || {});
+    for (const [pid, ch] of Object.entries(d.players || {})) {
+      const p = state.players.find((x) => x.id === pid);
+      if (!p) continue;
+      const { "gains+": added, ...rest } = ch;
+      Object.assign(p, rest);
+      if (added) p.gains = [...(p.gains || []), ...added];
+    }
+    if (d.log) state.log = [...(state.log || []).slice(d.log.trim), ...d.log.add];
+    if (d.pile) {
+      state.pile = state.pile || {};
+      if ("count" in d.pile) state.pile.count = d.pile.count;
+      if ("revealed" in d.pile) state.pile.revealed = d.pile.revealed;
+    }
+    state.version = d.v;
+  }
+
+  // Our own action's delta from the POST response; resync only if versions skipped
+  async function syncFrom(d) {
+    const v = state?.version || 0;
+    if (!d || d.v <= v) return;            // the SSE echo got here first
+    if (d.base === v && !d.resync) applyDelta(d);
+    else await resync();
+  }
+
+  function onDelta(d) {
+    if (resyncing) { newestSeen = Math.max(newestSeen, d.v); return; }
+    if (!state || d.v <= (state.version || 0)) return;   // stale or our own echo
+    if (d.resync || d.base !== (state.version || 0)) { resync(); return; }
+    applyDelta(d);
+    const touchesDeck = DECK_KEYS.some((k) => k in (d.set || {})) || "revealed" in (d.pile || {});
+    if (touchesDeck) {
+      if ("turn_idx" in (d.set || {})) lastReveal = [];
+      renderState();
+      return;
+    }
+    // Keep whatever reveal is on the table; refresh the rest in place
+    updateTurnUI();
+    renderHand();
+    renderLog();
+    updateBanner();
+    updateControls();
+  }
+
+  function connectEvents() {
+    if (!window.EventSource) return;
+    const es = new EventSource(`/treasure/${sid}/events?since=${state?.version || 0}`);
+    es.addEventListener("delta", (ev) => {
+      try { onDelta(JSON.parse(ev.data)); } catch (e) { console.warn("bad delta", e); }
+    });
+    es.addEventListener("resync", () => { resync(); });
+  }
+
   // --- Actions ---
   async function roll() {
     if (inflight || choicePending || isClosed()) return;
@@ -263,11 +416,11 @@
       if (!r.ok) throw new Error(await r.text());
       const res = await r.json();
 
-      state = res.state;
+      await syncFrom(res.delta);
       updateTurnUI();
 
       if (res.mode === "choose") {
-        lastReveal = (res.choices || []);
+        lastReveal = (state.pending_choices || []);
         renderDeck(lastReveal);
         enableChoice(lastReveal);
         choicePending = true;
@@ -283,7 +436,8 @@
         choicePending = false;
 
         // flash the kept card
-        if (res.received) flashChosen(res.received);
+        const kept = lastReveal.find((c) => c.kept);
+        if (kept) flashChosen(kept);
       }
 
       updateControls();
@@ -298,6 +452,7 @@
 
   async function choose(cardId) {
     if (inflight || isClosed()) return;
+    const picked = lastReveal.find((c) => c.id === cardId);
     setBusy(true);
     try {
       const fd = new FormData();
@@ -307,7 +462,7 @@
       if (!r.ok) throw new Error(await r.text());
       const res = await r.json();
 
-      state = res.state;
+      await syncFrom(res.delta);
       lastReveal = [];
       choicePending = false;
 
@@ -321,7 +476,7 @@
       updateControls();
 
       // flash the chosen card
-      if (res.received) flashChosen(res.received);
+      if (picked) flashChosen(picked);
 
       haptic("success");
       toast(`Chosen.`);
@@ -341,7 +496,7 @@
       const r = await fetch(`/treasure/${sid}/pass`, { method: "POST" });
       if (!r.ok) throw new Error(await r.text());
       const res = await r.json();
-      state = res.state;
+      await syncFrom(res.delta);
       lastReveal = [];
       hideBanner();
       disableChoice();
@@ -370,7 +525,7 @@
       const r = await fetch(`/treasure/${sid}/end`, { method: "POST" });
       if (!r.ok) throw new Error(await r.text());
       const res = await r.json();
-      state = res.state;
+      await syncFrom(res.delta);
       choicePending = false;
       disableChoice();
       lockAll();
@@ -405,6 +560,7 @@
       });
     }
     await refreshState();
+    connectEvents();
   }
 
   init();
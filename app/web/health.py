@@ -1,12 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import shutil
 import tempfile
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 
 from fastapi import APIRouter
 
 from app.core.config import settings
-from app.db.pool import check_ready as db_ready
+from app.core.singleflight import SingleFlight
+from app.db.pool import check_ready as db_ready, get_pool
+
+log = logging.getLogger("r4t.health")
 
 router = APIRouter(tags=["health"])
 
@@ -29,9 +38,99 @@ def _is_cache_writable() -> bool:
         return False
 
 
+def _cache_free_bytes() -> int | None:
+    try:
+        return shutil.disk_usage(settings.IMAGE_CACHE_DIR).free
+    except OSError:
+        return None
+
+
+def _pool_saturated() -> bool:
+    """Every connection is out and READY_POOL_MAX_WAITING callers are queued for one."""
+    pool = get_pool()
+    if pool is None:
+        return False
+    stats = pool.get_stats()
+    return (
+        stats.get("pool_available", 0) == 0
+        and stats.get("pool_size", 0) >= stats.get("pool_max", 0)
+        and stats.get("requests_waiting", 0) >= settings.READY_POOL_MAX_WAITING
+    )
+
+
+@dataclass
+class Readiness:
+    cache_writable: bool
+    cache_free_bytes: int | None
+    db_ready: bool
+    pool_saturated: bool
+    checked_at: float  # time.time()
+    monotonic: float
+
+    @property
+    def ok(self) -> bool:
+        free_ok = (self.cache_free_bytes or 0) >= settings.READY_MIN_FREE_BYTES
+        return self.cache_writable and free_ok and self.db_ready and not self.pool_saturated
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "status": "ok" if self.ok else "degraded",
+            "cache_writable": self.cache_writable,
+            "cache_free_bytes": self.cache_free_bytes,
+            "db_ready": self.db_ready,
+            "pool_saturated": self.pool_saturated,
+            "checked_at": self.checked_at,
+            "age_seconds": round(time.monotonic() - self.monotonic, 3),
+        }
+
+
+class ReadinessChecker:
+    """
+    Runs the readiness checks every READY_CHECK_SECONDS in the background so a
+    probe only reads the last result. Probes arriving while no result is fresh
+    (the loop isn't running, or has fallen three intervals behind) run the
+    checks themselves, one run shared by every probe waiting on it.
+    """
+
+    def __init__(self) -> None:
+        self.last: Readiness | None = None
+        self._flight: SingleFlight[str, Readiness] = SingleFlight()
+
+    async def _check(self) -> Readiness:
+        cache_ok = await asyncio.to_thread(_is_cache_writable)
+        free = await asyncio.to_thread(_cache_free_bytes)
+        db_ok = await db_ready()
+        now = time.monotonic()
+        return Readiness(cache_ok, free, db_ok, _pool_saturated(), time.time(), now)
+
+    async def check(self) -> Readiness:
+        return await self._flight.do("readyz", self._check)
+
+    async def current(self) -> Readiness:
+        last = self.last
+        if (
+            last is not None
+            and time.monotonic() - last.monotonic < 3 * settings.READY_CHECK_SECONDS
+        ):
+            return last
+        return await self.check()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                try:
+                    self.last = await self.check()
+                except Exception as e:
+                    log.warning("readiness check failed: %r", e)
+                await asyncio.sleep(settings.READY_CHECK_SECONDS)
+        finally:
+            self.last = None
+
+
+readiness = ReadinessChecker()
+
+
 @router.get("/readyz")
-async def readyz() -> dict[str, str | bool]:
-    cache_ok = _is_cache_writable()
-    db_ok = await db_ready()
-    status = "ok" if (cache_ok and db_ok) else "degraded"
-    return {"status": status, "cache_writable": cache_ok, "db_ready": db_ok}
+async def readyz() -> dict[str, Any]:
+    """Readiness probe: the last background check, with its age."""
+    return (await readiness.current()).as_dict()
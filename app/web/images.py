@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.http import etag_matches
+from app.core.metrics import IMAGE_REQUESTS
+from app.db.pool import get_pool
+from app.features.treasure.imagestore import URL_PREFIX, digest_from_url, path_for_url
+from app.features.treasure.store import find_remote_image
+
+router = APIRouter(tags=["images"])
+
+# Cache files never change in place: sharded names are their content hash, and
+# legacy flat names are no longer written.
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+    ".json": "application/json",
+}
+# Precompressed siblings, in order of preference
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# (path, mtime_ns, size) -> sha256, for legacy files whose name is not their hash
+# (insertion-ordered by last use, oldest dropped first)
+_legacy_digests: dict[tuple[str, int, int], str] = {}
+LEGACY_DIGESTS_SIZE = 4096
+
+_hit = IMAGE_REQUESTS.labels("hit")
+_not_modified = IMAGE_REQUESTS.labels("not_modified")
+_miss = IMAGE_REQUESTS.labels("miss")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class CacheFileResponse(FileResponse):
+    """
+    FileResponse that can send a single byte range of the file. A whole body
+    goes out as `http.response.pathsend` when the server supports it, so the
+    server can sendfile() it instead of Python reading it in chunks.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        stat_result: os.stat_result,
+        headers: dict[str, str],
+        media_type: str,
+        byte_range: tuple[int, int] | None = None,
+    ) -> None:
+        super().__init__(
+            path,
+            status_code=206 if byte_range else 200,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+        )
+        self.byte_range = byte_range
+        if byte_range:
+            start, end = byte_range
+            self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+            self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers}
+        )
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if self.byte_range is None and "http.response.pathsend" in scope.get("extensions", {}):
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            return
+        assert self.stat_result is not None
+        start, end = self.byte_range or (0, self.stat_result.st_size - 1)
+        remaining = end - start + 1
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            if start:
+                await f.seek(start)
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": remaining > 0}
+                )
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _media_type(path: Path) -> str:
+    return (
+        _MEDIA_TYPES.get(path.suffix.lower())
+        or mimetypes.guess_type(path.name)[0]
+        or "application/octet-stream"
+    )
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(64 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+async def _content_digest(url: str, path: Path, st: os.stat_result) -> str:
+    digest = digest_from_url(url)
+    if digest is not None:
+        return digest
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    digest = _legacy_digests.pop(key, None)
+    if digest is None:
+        digest = await asyncio.to_thread(_sha256_file, path)
+    _legacy_digests[key] = digest
+    while len(_legacy_digests) > LEGACY_DIGESTS_SIZE:
+        del _legacy_digests[next(iter(_legacy_digests))]
+    return digest
+
+
+def _etag(digest: str, encoding: str | None) -> str:
+    """Strong validator of the exact bytes sent: each content coding gets its own."""
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def _accepted_encodings(header: str | None) -> set[str]:
+    out: set[str] = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        key, _, val = params.strip().partition("=")
+        if key.strip() == "q":
+            try:
+                q = float(val)
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            out.add(name.strip().lower())
+    return out
+
+
+def _parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Single `bytes=` range -> inclusive (start, end). Multi-range requests get the full body."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    spec = header[len("bytes=") :].strip()
+    first, sep, last = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            n = int(last)
+            if n <= 0:
+                raise RangeNotSatisfiable
+            return max(0, size - n), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+async def _remote_fallback(url: str, path: Path) -> Response:
+    """
+    Cache miss: send the browser to the Scryfall original instead of a broken
+    image. Evicted variants go to the `normal` image they were rendered from,
+    since a <source srcset> that fails never falls back to the <img src>.
+    """
+    if get_pool() is None:
+        raise HTTPException(404, "image not cached")
+    digest = digest_from_url(url)
+    oracle_id = None if digest else path.stem
+    remote = await find_remote_image(digest, oracle_id, url)
+    if not remote:
+        raise HTTPException(404, "image not cached")
+    return RedirectResponse(remote, status_code=307, headers={"Cache-Control": "no-store"})
+
+
+@router.api_route(URL_PREFIX + "/{rel:path}", methods=["GET", "HEAD"])
+async def cached_image(rel: str, request: Request) -> Response:
+    url = f"{URL_PREFIX}/{rel}"
+    path = path_for_url(url)
+    if path is None:
+        raise HTTPException(404, "not found")
+    try:
+        st = await asyncio.to_thread(path.stat)
+    except (FileNotFoundError, NotADirectoryError):
+        _miss.inc()
+        return await _remote_fallback(url, path)
+
+    headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+    body_path, body_stat, body_encoding = path, st, None
+    accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+    for encoding, suffix in _ENCODINGS:
+        if encoding not in accepted:
+            continue
+        variant = path.with_name(path.name + suffix)
+        try:
+            body_stat = await asyncio.to_thread(variant.stat)
+        except FileNotFoundError:
+            continue
+        body_path, body_encoding = variant, encoding
+        headers["Content-Encoding"] = encoding
+        break
+
+    etag = _etag(await _content_digest(url, path, st), body_encoding)
+    headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        _not_modified.inc()
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    _hit.inc()
+
+    media_type = _media_type(path)
+
+    if settings.IMAGE_CACHE_ACCEL_PREFIX:
+        # Let the reverse proxy sendfile() the body; we only supply headers.
+        suffix = body_path.name[len(path.name) :]
+        headers["X-Accel-Redirect"] = (
+            f"{settings.IMAGE_CACHE_ACCEL_PREFIX.rstrip('/')}/{rel}{suffix}"
+        )
+        return Response(status_code=200, headers=headers, media_type=media_type)
+
+    headers["Accept-Ranges"] = "bytes"
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if "Content-Encoding" not in headers and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(request.headers.get("range"), body_stat.st_size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{body_stat.st_size}"},
+            )
+    return CacheFileResponse(
+        body_path,
+        stat_result=body_stat,
+        headers=headers,
+        media_type=media_type,
+        byte_range=byte_range,
+    )
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, Response
+
+from app.core.config import settings
+from app.core.metrics import CONTENT_TYPE, REGISTRY
+from app.core.singleflight import FLIGHTS
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus exposition for this process."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(404, "metrics disabled")
+    return Response(await REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/statz")
+async def statz() -> dict[str, dict[str, int | float]]:
+    """In-process request-coalescing counters (this worker only)."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(404, "metrics disabled")
+    return {name: flight.stats() for name, flight in FLIGHTS.items()}
@@ -4,12 +4,16 @@ from app.features.house.routers import router as house_router
 from app.features.treasure.routers import router as treasure_router
 from app.web.health import router as health_router
 from app.web.home import router as home_router
+from app.web.images import router as images_router
+from app.web.metrics import router as metrics_router
 
 
 def make_root_router() -> APIRouter:
     root = APIRouter()
     root.include_router(home_router)
     root.include_router(health_router)
+    root.include_router(metrics_router)
+    root.include_router(images_router)
     root.include_router(treasure_router, prefix="/treasure", tags=["treasure"])
     root.include_router(house_router, prefix="/house", tags=["house"])
     return root
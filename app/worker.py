@@ -0,0 +1,76 @@
+# app/worker.py
+"""
+Standalone job worker:
+
+    python -m app.worker [--concurrency N]
+
+Runs the same job handlers as the worker embedded in each web process; start
+more of these to add precache throughput. SIGINT/SIGTERM stop claiming, hand
+in-flight jobs back to the queue and exit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import signal
+
+from app.core.config import configure_root_logger, settings
+from app.core.logs import setup_json_logging, stop_logging
+from app.core.metrics import serve_metrics
+from app.db.jobs import Worker
+from app.db.pool import close_pool, get_pool, init_pool
+from app.features.treasure.hot import hot_sessions
+from app.features.treasure.imaging import shutdown_executor
+from app.features.treasure.precache import JOB_HANDLERS
+from app.features.treasure.store import close_session_store
+from app.features.treasure.thumbs import stop_pipeline
+
+
+async def main(concurrency: int | None = None) -> None:
+    setup_json_logging()
+    configure_root_logger()
+
+    await init_pool()
+    if get_pool() is None:
+        raise SystemExit("DATABASE_URL must be set to run the job worker")
+
+    # Jobs mutate sessions too, so they take part in hot-session ownership
+    hot_task = None
+    if settings.HOT_SESSIONS and settings.SESSION_STORE == "postgres":
+        await hot_sessions.start()
+        hot_task = asyncio.create_task(hot_sessions.run())
+
+    metrics_task = None
+    if settings.METRICS_WORKER_PORT:
+        metrics_task = asyncio.create_task(
+            serve_metrics(settings.HOST, settings.METRICS_WORKER_PORT)
+        )
+
+    worker = Worker(JOB_HANDLERS, concurrency or settings.JOB_WORKER_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+        if hot_task is not None:
+            hot_task.cancel()
+            await hot_sessions.close()
+        await close_session_store()
+        await stop_pipeline()
+        shutdown_executor()
+        await close_pool()
+        stop_logging()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background jobs (precache, ...).")
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
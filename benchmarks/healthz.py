@@ -0,0 +1,118 @@
+# benchmarks/healthz.py
+"""
+Requests/sec on GET /healthz through the full app, driven in-process over ASGI
+(no server, no sockets), with the access-log middleware as it was
+(BaseHTTPMiddleware) and as it is now (raw ASGI):
+
+    python -m benchmarks.healthz [--requests 20000]
+
+Access-log lines are formatted but discarded so terminal output doesn't
+dominate the numbers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.logs import JsonFormatter
+from app.main import RequestIdMiddleware
+from app.web.router import make_root_router
+
+
+class LegacyRequestIdMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation this replaced, for comparison."""
+
+    async def dispatch(self, request: Request, call_next):
+        req_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        start = time.perf_counter()
+        request.state.request_id = req_id
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = req_id
+        latency = (time.perf_counter() - start) * 1000.0
+        extra = {
+            "request_id": req_id,
+            "path": request.url.path,
+            "method": request.method,
+            "status_code": response.status_code,
+            "latency_ms": round(latency, 2),
+        }
+        logging.getLogger("app.access").info("request", extra=extra)
+        return response
+
+
+class _Discard(logging.Handler):
+    def emit(self, record: logging.LogRecord) -> None:
+        self.format(record)
+
+
+def _app(middleware: type) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware)
+    app.include_router(make_root_router())
+    return app
+
+
+async def _drive(app: FastAPI, n: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/healthz",
+        "raw_path": b"/healthz",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(200):  # warm-up
+        await app(dict(scope), receive, send)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    return n / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    handler = _Discard()
+    handler.setFormatter(JsonFormatter())
+    access = logging.getLogger("app.access")
+    access.handlers[:] = [handler]
+    access.setLevel(logging.INFO)
+    access.propagate = False
+
+    results = {}
+    for label, mw in (
+        ("BaseHTTPMiddleware", LegacyRequestIdMiddleware),
+        ("raw ASGI", RequestIdMiddleware),
+    ):
+        results[label] = asyncio.run(_drive(_app(mw), args.requests))
+        print(f"{label:<20} {results[label]:>9.0f} req/s")
+    before, after = results["BaseHTTPMiddleware"], results["raw ASGI"]
+    print(f"{'speedup':<20} {after / before:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
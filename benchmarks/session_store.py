@@ -0,0 +1,92 @@
+# benchmarks/session_store.py
+"""
+Per-action latency of the session stores:
+
+    python -m benchmarks.session_store [--stores memory,sqlite,postgres] [--actions 500]
+
+Each action is a dig-and-pass mutation on a 100-card, 4-player game (the shape
+of a roll followed by a pass), applied sequentially through
+SessionStore.mutate. Postgres uses DATABASE_URL and needs the migrated schema.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from app.core.config import settings
+from app.db.pool import close_pool, init_pool
+from app.features.treasure.backends import open_session_store
+from app.features.treasure.models import Card, PileState, Player, Session
+
+
+def _game() -> Session:
+    cards = [
+        Card(
+            id=str(i),
+            name=f"Card {i}",
+            type_line="Artifact",
+            oracle_text="{T}: Add one mana of any color. " * 3,
+            img=f"/img-cache/{i:02x}/{i:064x}.jpg",
+            oracle_id=f"{i:032x}",
+        )
+        for i in range(100)
+    ]
+    return Session(players=[Player(name=f"p{i}") for i in range(4)], pile=PileState(cards=cards))
+
+
+def _dig_and_pass(s: Session) -> None:
+    p = s.players[s.turn_idx]
+    if s.pile.cards:
+        p.gains.append(s.pile.cards.pop(0))
+    s.log.append(f"{p.name} dug")
+    s.turn_idx = (s.turn_idx + 1) % len(s.players)
+
+
+async def bench(kind: str, actions: int, tmp: str) -> list[float]:
+    if kind == "postgres":
+        await init_pool()
+    store = open_session_store(kind, sqlite_path=f"{tmp}/bench.sqlite3")
+    samples: list[float] = []
+    try:
+        s = _game()
+        await store.create(s)
+        for i in range(actions):
+            if i and i % 90 == 0:  # keep the pile from running dry
+                s = _game()
+                await store.create(s)
+            t0 = time.perf_counter()
+            await store.mutate(s.id, _dig_and_pass)
+            samples.append((time.perf_counter() - t0) * 1000)
+    finally:
+        await store.close()
+        if kind == "postgres":
+            await close_pool()
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--stores", default="memory,sqlite,postgres")
+    parser.add_argument("--actions", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'store':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'actions/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.stores.split(","):
+            if kind == "postgres" and not settings.DATABASE_URL:
+                print(f"{kind:<10} skipped (DATABASE_URL not set)")
+                continue
+            samples = asyncio.run(bench(kind, args.actions, tmp))
+            q = statistics.quantiles(samples, n=100)
+            rate = len(samples) / (sum(samples) / 1000)
+            print(f"{kind:<10} {q[49]:>8.3f} {q[94]:>8.3f} {q[98]:>8.3f} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/startup.py
+"""
+Cold start of a web process, measured in a fresh interpreter each run:
+
+    python -m benchmarks.startup [--runs 3] [--top 12]
+
+  import      `import app.main`
+  create_app  building the app (routers, middleware, templates)
+  startup     the lifespan up to serving: DB pool warm-up (DB_WARM_POOL),
+              card asset preload (PRELOAD_CARD_ASSETS), background tasks
+
+followed by an import-time report: self time from `python -X importtime`
+summed per top-level package, so every millisecond is counted once. Uses
+DATABASE_URL when set; without it there is no pool to warm.
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_PROBE = """
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+application = app.main.create_app()
+t2 = time.perf_counter()
+
+async def startup():
+    async with application.router.lifespan_context(application):
+        t3 = time.perf_counter()
+        print(json.dumps({
+            "import_ms": (t1 - t0) * 1000,
+            "create_app_ms": (t2 - t1) * 1000,
+            "startup_ms": (t3 - t2) * 1000,
+            "modules": sorted(sys.modules),
+        }), file=sys.stdout, flush=True)
+
+asyncio.run(startup())
+"""
+
+
+def measure() -> tuple[dict, dict[str, float]]:
+    """One cold start: (timings + loaded modules, import self-time in ms per top-level package)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "LOG_LEVEL": "WARNING"},
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    packages: collections.defaultdict[str, float] = collections.defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+    return result, dict(packages)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    print(f"{'phase':<12} {'median ms':>10} {'min ms':>8}")
+    for phase in ("import_ms", "create_app_ms", "startup_ms"):
+        values = [r[phase] for r, _ in runs]
+        print(f"{phase[:-3]:<12} {statistics.median(values):>10.1f} {min(values):>8.1f}")
+
+    _, packages = runs[-1]
+    total = sum(packages.values())
+    print(f"\n{'package':<24} {'import ms':>10} {'share':>6}")
+    for name, ms in sorted(packages.items(), key=lambda kv: -kv[1])[: args.top]:
+        print(f"{name:<24} {ms:>10.1f} {ms / total:>6.0%}")
+    print(f"{'(all)':<24} {total:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
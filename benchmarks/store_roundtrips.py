@@ -0,0 +1,193 @@
+# benchmarks/store_roundtrips.py
+"""
+Postgres round trips and latency per Treasure action, with the store's
+transactions pipelined and its hot queries prepared (DB_PIPELINE,
+DB_PREPARED_STATEMENTS) and without:
+
+    python -m benchmarks.store_roundtrips [--actions 500] [--rtt 0.5]
+
+Each action runs the store calls its route makes, in one unit of work:
+state (version + load), roll and pass (a session mutation), and asset (the
+precache lookup + touch of a cached card). Round trips are counted from a
+libpq trace of the single pooled connection: every switch from sending to
+receiving is one. Uses DATABASE_URL and needs the migrated schema.
+
+A local socket makes round trips nearly free, which hides what saving them is
+worth; --rtt ms puts a proxy in front of the server that delays each
+direction by half that, like a database on another host.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+
+from app.core.config import settings
+from app.db.pool import close_pool, get_pool, init_pool, unit_of_work
+from app.features.treasure import store
+from benchmarks.session_store import _dig_and_pass, _game
+
+ORACLE_ID = "0" * 31 + "b"
+
+
+def _round_trips(path: str) -> int:
+    n, prev = 0, ""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            d = line[:1]
+            if d == "B" and prev == "F":
+                n += 1
+            if d in "FB":
+                prev = d
+    return n
+
+
+async def _traced(fn: Callable[[], Awaitable[None]]) -> int:
+    pool = get_pool()
+    assert pool is not None
+    fd, path = tempfile.mkstemp(suffix=".trace")
+    try:
+        async with pool.connection() as conn:
+            conn.pgconn.trace(fd)
+            conn.pgconn.set_trace_flags(psycopg.pq.Trace.SUPPRESS_TIMESTAMPS)
+        try:
+            await fn()
+        finally:
+            async with pool.connection() as conn:
+                conn.pgconn.untrace()
+        return _round_trips(path)
+    finally:
+        os.close(fd)
+        os.unlink(path)
+
+
+async def _delayed(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float
+) -> None:
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[tuple[float, bytes]] = asyncio.Queue()
+
+    async def deliver() -> None:
+        while True:
+            due, data = await queue.get()
+            await asyncio.sleep(due - loop.time())
+            if not data:
+                writer.close()
+                return
+            writer.write(data)
+            await writer.drain()
+
+    task = asyncio.create_task(deliver())
+    while data := await reader.read(65536):
+        queue.put_nowait((loop.time() + delay, data))
+    queue.put_nowait((loop.time() + delay, b""))
+    await task
+
+
+async def _latency_proxy(dsn: str, rtt_ms: float) -> tuple[asyncio.Server, str]:
+    """Listen on localhost, forwarding to dsn's server with rtt_ms/2 added each way."""
+    info = conninfo_to_dict(dsn)
+    host, port = str(info.get("host") or "localhost"), str(info.get("port") or 5432)
+    delay = rtt_ms / 2000
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if host.startswith("/"):
+            up_reader, up_writer = await asyncio.open_unix_connection(f"{host}/.s.PGSQL.{port}")
+        else:
+            up_reader, up_writer = await asyncio.open_connection(host, int(port))
+        with contextlib.suppress(asyncio.CancelledError):  # torn down with the loop
+            await asyncio.gather(
+                _delayed(reader, up_writer, delay),
+                _delayed(up_reader, writer, delay),
+                return_exceptions=True,
+            )
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    proxy_port = server.sockets[0].getsockname()[1]
+    return server, make_conninfo(dsn, host="127.0.0.1", port=str(proxy_port))
+
+
+async def bench(fast: bool, actions: int, rtt_ms: float) -> dict[str, tuple[int, list[float]]]:
+    settings.DB_PIPELINE = settings.DB_PREPARED_STATEMENTS = fast
+    settings.DB_MIN_SIZE = settings.DB_MAX_SIZE = 1  # every action on the traced connection
+    dsn = settings.DATABASE_URL
+    proxy = None
+    if rtt_ms:
+        proxy, settings.DATABASE_URL = await _latency_proxy(dsn, rtt_ms)
+    await init_pool()
+    try:
+        s = _game()
+        await store.create_session(s)
+        await store.upsert_asset(
+            ORACLE_ID, "Bench Card", "https://example.invalid/b.jpg", None, None, None
+        )
+
+        async def state() -> None:
+            async with unit_of_work():
+                await store.get_session_version(s.id)
+                await store.load_session(s.id)
+
+        async def roll() -> None:
+            async with unit_of_work():
+                await store.mutate_session(s.id, _dig_and_pass)
+
+        async def asset() -> None:
+            async with unit_of_work():
+                await store.get_asset(ORACLE_ID)
+                await store.touch_assets([ORACLE_ID])
+
+        out: dict[str, tuple[int, list[float]]] = {}
+        for name, fn in (("state", state), ("roll", roll), ("pass", roll), ("asset", asset)):
+            await fn()  # warm: prepared statements are per connection
+            trips = await _traced(fn)
+            samples = []
+            for i in range(actions):
+                if i and i % 90 == 0:  # keep the pile from running dry
+                    s = _game()
+                    await store.create_session(s)
+                t0 = time.perf_counter()
+                await fn()
+                samples.append((time.perf_counter() - t0) * 1000)
+            out[name] = (trips, samples)
+        return out
+    finally:
+        await store.close_session_store()
+        await close_pool()
+        settings.DATABASE_URL = dsn
+        if proxy is not None:
+            proxy.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--actions", type=int, default=500)
+    parser.add_argument("--rtt", type=float, default=0.0, help="added round-trip time, ms")
+    args = parser.parse_args()
+
+    if not settings.DATABASE_URL:
+        print("skipped (DATABASE_URL not set)")
+        return
+    settings.SESSION_STORE = "postgres"
+    settings.HOT_SESSIONS = False
+
+    print(f"{'action':<8} {'mode':<10} {'trips':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for fast in (False, True):
+        mode = "pipelined" if fast else "plain"
+        for name, (trips, samples) in asyncio.run(bench(fast, args.actions, args.rtt)).items():
+            q = statistics.quantiles(samples, n=100)
+            print(f"{name:<8} {mode:<10} {trips:>6} {q[49]:>8.3f} {q[98]:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
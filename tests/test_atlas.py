@@ -0,0 +1,83 @@
+import asyncio
+import io
+import json
+import os
+
+import pytest
+
+from app.core.config import settings
+from app.features.treasure import atlas, imagestore, imaging
+from app.features.treasure.models import Card, PileState, Player, Session
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _jpeg(color) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (146, 204), color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _session(monkeypatch, tmp_path) -> Session:
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path))
+    cards = []
+    for i, color in enumerate([(255, 0, 0), (0, 255, 0), (0, 0, 255)]):
+        stored = imagestore.commit_stream([_jpeg(color)], ".jpg")
+        cards.append(Card(id=f"c{i}", name=f"Card {i}", oracle_id=f"oid{i}", img=stored.url))
+    cards.append(cards[0].model_copy(update={"id": "dup"}))
+    return Session(players=[Player(name="A")], pile=PileState(cards=cards))
+
+
+def test_deck_hash_ignores_order():
+    a = {"x": "/img-cache/aa/1.jpg", "y": "/img-cache/bb/2.jpg"}
+    b = dict(reversed(list(a.items())))
+    assert atlas.deck_hash(a) == atlas.deck_hash(b)
+    assert atlas.deck_hash(a) != atlas.deck_hash({"x": "/img-cache/aa/1.jpg"})
+
+
+def test_build_deck_atlas_writes_sheet_and_map(monkeypatch, tmp_path):
+    s = _session(monkeypatch, tmp_path)
+    try:
+        map_url = asyncio.run(atlas.build_deck_atlas(s))
+    finally:
+        imaging.shutdown_executor()
+
+    assert map_url and map_url.startswith("/img-cache/atlas/")
+    data = json.loads(imagestore.path_for_url(map_url).read_text())
+    assert set(data["cards"]) == {"oid0", "oid1", "oid2"}
+    assert (data["cols"], data["rows"]) == (2, 2)
+    assert imagestore.path_for_url(map_url + ".gz").exists()
+
+    with Image.open(imagestore.path_for_url(data["image"])) as sheet:
+        assert sheet.size == (2 * imaging.TILE_W, 2 * imaging.TILE_H)
+        col, row = data["cards"]["oid1"]
+        r, g, b = sheet.getpixel((col * imaging.TILE_W + 70, row * imaging.TILE_H + 100))
+        assert g > 200 and r < 60 and b < 60
+
+    # Same deck again reuses the existing atlas without rebuilding, and marks it used
+    os.utime(imagestore.path_for_url(map_url), (1, 1))
+    assert asyncio.run(atlas.build_deck_atlas(s)) == map_url
+    (cached,) = imagestore.list_atlases()
+    files = list((tmp_path / "atlas").iterdir())
+    assert cached.url == map_url and cached.used_at > 1
+    assert cached.size == sum(f.stat().st_size for f in files)
+
+    # Counted by the scan, and removed as a unit
+    assert imagestore.scan_cache().files == 3 + len(files)
+    assert imagestore.remove_atlas(map_url) == len(files) == 3
+    assert imagestore.list_atlases() == []
+
+
+def test_make_variants_never_upscales(tmp_path):
+    src = tmp_path / "normal.jpg"
+    Image.new("RGB", (488, 680), (200, 10, 10)).save(src, format="JPEG")
+    formats = imaging.supported_formats()
+    out = imaging.make_variants(str(src), [146, 244, 1000], formats)
+
+    widths = sorted({w for w, _, _ in out})
+    assert widths == [146, 244, 488]
+    assert {fmt for _, fmt, _ in out} == set(formats)
+    for w, fmt, data in out:
+        with Image.open(io.BytesIO(data)) as im:
+            assert im.width == w
+            assert im.format.lower() == fmt
@@ -7,3 +7,20 @@ def test_check_ready_false_when_uninitialized():
     # Ensure pool is closed/None
     asyncio.run(dbpool.close_pool())
     assert asyncio.run(dbpool.check_ready()) is False
+
+
+def test_unit_of_work_checks_out_nothing_until_used():
+    async def main():
+        async with dbpool.unit_of_work():
+            assert dbpool.in_unit_of_work()
+            async with dbpool.unit_of_work():  # nested: joins
+                assert dbpool.in_unit_of_work()
+
+            async def child():
+                return dbpool.in_unit_of_work()
+
+            assert await asyncio.create_task(child()) is False
+        assert not dbpool.in_unit_of_work()
+
+    asyncio.run(dbpool.close_pool())
+    asyncio.run(main())  # no pool: fine, since no statement ran
@@ -0,0 +1,48 @@
+import json
+
+from app.features.treasure.delta import MAX_EVENT_BYTES, encode_event, session_delta
+from app.features.treasure.models import Card, PileState, Player, Session
+
+
+def _session() -> Session:
+    cards = [Card(id=f"c{i}", name=f"Card {i}") for i in range(10)]
+    return Session(players=[Player(name="A"), Player(name="B")], pile=PileState(cards=cards))
+
+
+def test_delta_carries_only_what_changed():
+    s = _session()
+    s.log = [f"line {i}" for i in range(3)]
+    before = s.model_dump()
+
+    p = s.players[0]
+    p.gains.append(s.pile.cards.pop(0))
+    p.dug_this_turn = True
+    s.log = [*s.log[1:], "A dug 1"]  # appended, then trimmed from the front
+    s.version += 1
+    d = session_delta(before, s.model_dump())
+
+    assert d["v"] == 1 and d["base"] == 0
+    assert d["players"] == {p.id: {"dug_this_turn": True, "gains+": [p.gains[0].model_dump()]}}
+    assert d["log"] == {"trim": 1, "add": ["A dug 1"]}
+    assert d["pile"] == {"count": 9}
+    assert "set" not in d
+    assert "cards" not in json.dumps(d["pile"])
+
+
+def test_top_level_changes_go_in_set():
+    s = _session()
+    before = s.model_dump()
+    s.turn_idx = 1
+    s.version += 1
+    d = session_delta(before, s.model_dump())
+    assert d["set"] == {"turn_idx": 1}
+    assert set(d) == {"sid", "v", "base", "set"}
+
+
+def test_oversized_event_becomes_resync_marker():
+    s = _session()
+    before = s.model_dump()
+    s.log = ["x" * (MAX_EVENT_BYTES + 1)]
+    s.version += 1
+    ev = json.loads(encode_event(session_delta(before, s.model_dump())))
+    assert ev == {"sid": s.id, "v": 1, "base": 0, "resync": True}
@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+from app.features.treasure.events import RESYNC, SessionBus, Subscriber
+
+
+def _payload(sid: str, v: int) -> str:
+    return json.dumps({"sid": sid, "v": v, "base": v - 1})
+
+
+def test_slow_subscriber_gets_one_resync_instead_of_backlog():
+    async def run() -> list:
+        sub = Subscriber(maxsize=2)
+        bus = SessionBus()
+        bus._subs["s"] = {sub}
+        for v in range(1, 6):
+            bus.dispatch(_payload("s", v))
+        got = [await sub.get()]
+        bus.dispatch(_payload("s", 6))  # delivered normally again after the resync
+        got.append(await sub.get())
+        return got
+
+    got = asyncio.run(run())
+    assert got[0] is RESYNC
+    assert got[1].v == 6
+
+
+def test_replay_only_when_contiguous():
+    bus = SessionBus()
+    for v in (3, 4, 5):
+        bus.dispatch(_payload("s", v))
+    assert [e.v for e in bus.replay("s", 3) or []] == [4, 5]
+    assert [e.v for e in bus.replay("s", 2) or []] == [3, 4, 5]
+    assert bus.replay("s", 1) is None  # version 2 never seen here
+    assert bus.replay("other", 0) is None
@@ -1,5 +1,8 @@
+import asyncio
+
 from fastapi.testclient import TestClient
 
+from app.core.config import settings
 from app.main import create_app
 from app.web import health
 
@@ -30,3 +33,48 @@ def test_readyz_degraded(monkeypatch):
     r = client.get("/readyz")
     assert r.status_code == 200
     assert r.json()["status"] == "degraded"
+
+
+def test_readyz_serves_the_background_result_with_its_age(monkeypatch):
+    calls = 0
+
+    async def counting_db_ready():
+        nonlocal calls
+        calls += 1
+        return True
+
+    monkeypatch.setattr(health, "db_ready", counting_db_ready, raising=True)
+    checker = health.ReadinessChecker()
+    monkeypatch.setattr(health, "readiness", checker)
+    checker.last = asyncio.run(checker.check())
+    calls = 0
+    bodies = [client.get("/readyz").json() for _ in range(3)]
+    assert calls == 0  # probes read the cached result
+    assert bodies[0]["db_ready"] is True
+    assert bodies[-1]["age_seconds"] >= bodies[0]["age_seconds"] >= 0
+
+    checker.last.monotonic -= 3 * settings.READY_CHECK_SECONDS  # loop stalled
+    client.get("/readyz")
+    assert calls == 1
+
+
+def test_readyz_degraded_on_low_disk_or_saturated_pool(monkeypatch):
+    async def fake_db_ready():
+        return True
+
+    class SaturatedPool:
+        def get_stats(self):
+            return {"pool_max": 2, "pool_size": 2, "pool_available": 0, "requests_waiting": 9}
+
+    monkeypatch.setattr(health, "db_ready", fake_db_ready, raising=True)
+    monkeypatch.setattr(settings, "READY_MIN_FREE_BYTES", 0)
+    assert client.get("/readyz").json()["status"] == "ok"
+
+    saturated = SaturatedPool()
+    monkeypatch.setattr(health, "get_pool", lambda: saturated)
+    body = client.get("/readyz").json()
+    assert body["pool_saturated"] is True and body["status"] == "degraded"
+
+    monkeypatch.setattr(health, "get_pool", lambda: None)
+    monkeypatch.setattr(settings, "READY_MIN_FREE_BYTES", 1 << 62)
+    assert client.get("/readyz").json()["status"] == "degraded"
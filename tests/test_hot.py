@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from app.features.treasure.hot import HotSession, HotSessions
+from app.features.treasure.models import Card, PileState, Player, Session
+
+
+def _hot() -> tuple[HotSessions, Session]:
+    s = Session(players=[Player(name="a")], pile=PileState(cards=[Card(id="1", name="x")]))
+    hot = HotSessions()
+    data = s.model_dump()
+    hot._hot[s.id] = HotSession(sid=s.id, session=s, data=data, persisted=0)
+    return hot, s
+
+
+def test_mutations_apply_in_memory_and_queue_deltas():
+    hot, s = _hot()
+
+    def bump(x: Session) -> None:
+        x.turn_num += 1
+
+    async def main():
+        for _ in range(3):
+            await hot.mutate(s.id, bump)
+
+    asyncio.run(main())
+    hs = hot._hot[s.id]
+    assert [d["v"] for d in hs.pending] == [1, 2, 3]
+    assert hot.version(s.id) == 3 and hs.persisted == 0
+    assert hot.snapshot(s.id).turn_num == 4  # type: ignore[union-attr]
+
+
+def test_failed_mutation_rolls_back():
+    hot, s = _hot()
+
+    def bad(x: Session) -> None:
+        x.pile.cards.clear()
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        asyncio.run(hot.mutate(s.id, bad))
+    hs = hot._hot[s.id]
+    assert len(hs.session.pile.cards) == 1 and not hs.pending
+    assert hot.version(s.id) == 0
@@ -0,0 +1,126 @@
+import asyncio
+import gzip
+import hashlib
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.features.treasure import imagestore
+from app.main import create_app
+from app.web import images
+
+app = create_app()
+client = TestClient(app)
+
+
+def _stored(monkeypatch, tmp_path, data=b"0123456789" * 10):
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path))
+    return imagestore.commit_stream([data], ".jpg")
+
+
+def test_serves_with_immutable_cache_and_content_etag(monkeypatch, tmp_path):
+    stored = _stored(monkeypatch, tmp_path)
+    r = client.get(stored.url)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/jpeg"
+    assert r.headers["etag"] == f'"{stored.digest}"'
+    assert "immutable" in r.headers["cache-control"]
+    assert len(r.content) == stored.size
+
+
+def test_if_none_match_returns_304(monkeypatch, tmp_path):
+    stored = _stored(monkeypatch, tmp_path)
+    r = client.get(stored.url, headers={"If-None-Match": f'"{stored.digest}"'})
+    assert r.status_code == 304
+    assert r.content == b""
+
+
+def test_range_request(monkeypatch, tmp_path):
+    stored = _stored(monkeypatch, tmp_path)
+    r = client.get(stored.url, headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.content == b"0123456789"
+    assert r.headers["content-range"] == f"bytes 10-19/{stored.size}"
+
+    r = client.get(stored.url, headers={"Range": f"bytes={stored.size}-"})
+    assert r.status_code == 416
+
+
+def test_precompressed_variant(monkeypatch, tmp_path):
+    stored = _stored(monkeypatch, tmp_path)
+    path = imagestore.path_for_url(stored.url)
+    path.with_name(path.name + ".gz").write_bytes(gzip.compress(path.read_bytes()))
+    r = client.get(stored.url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+
+    assert r.headers["etag"] == f'"{stored.digest}"'
+
+    r = client.get(stored.url, headers={"Accept-Encoding": "gzip"})
+    assert r.headers.get("content-encoding") == "gzip"
+    assert r.content == path.read_bytes()
+    # Different bytes, different strong validator
+    assert r.headers["etag"] == f'"{stored.digest}-gzip"'
+    assert r.headers["vary"] == "Accept-Encoding"
+
+    gz_etag = r.headers["etag"]
+    r = client.get(stored.url, headers={"Accept-Encoding": "gzip", "If-None-Match": gz_etag})
+    assert r.status_code == 304
+    r = client.get(stored.url, headers={"Accept-Encoding": "identity", "If-None-Match": gz_etag})
+    assert r.status_code == 200 and "content-encoding" not in r.headers
+
+
+def test_miss_without_db_is_404(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path))
+    assert client.get("/img-cache/ab/" + "ab" * 32 + ".jpg").status_code == 404
+    assert client.get("/img-cache/../pyproject.toml").status_code == 404
+
+
+def test_whole_bodies_use_pathsend_when_the_server_supports_it(monkeypatch, tmp_path):
+    stored = _stored(monkeypatch, tmp_path)
+    sent: list[dict] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    def scope(headers=()):
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": stored.url,
+            "raw_path": stored.url.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": list(headers),
+            "server": ("test", 80),
+            "client": ("test", 1),
+            "extensions": {"http.response.pathsend": {}},
+        }
+
+    asyncio.run(app(scope(), receive, send))
+    assert sent[0]["status"] == 200
+    assert sent[-1] == {
+        "type": "http.response.pathsend",
+        "path": str(imagestore.path_for_url(stored.url)),
+    }
+
+    sent.clear()  # a range still goes through Python
+    asyncio.run(app(scope([(b"range", b"bytes=0-9")]), receive, send))
+    assert sent[0]["status"] == 206
+    assert sent[-1]["type"] == "http.response.body"
+
+
+def test_legacy_digest_memo_is_bounded(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(images, "LEGACY_DIGESTS_SIZE", 2)
+    monkeypatch.setattr(images, "_legacy_digests", {})
+    for i in range(3):
+        (tmp_path / f"legacy{i}.jpg").write_bytes(b"x" * (i + 1))
+        r = client.get(f"/img-cache/legacy{i}.jpg")
+        assert r.headers["etag"] == f'"{hashlib.sha256(b"x" * (i + 1)).hexdigest()}"'
+    assert [k[2] for k in images._legacy_digests] == [2, 3]
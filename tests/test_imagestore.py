@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.db import pool as dbpool
+from app.features.treasure import imagestore, store
+from app.main import create_app
+
+PG_URL = os.environ.get("TEST_DATABASE_URL", "")
+
+
+def _use_tmp_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path))
+
+
+def test_commit_stream_is_sharded_and_content_addressed(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    data = b"abc" * 1000
+    stored = imagestore.commit_stream([data[:10], data[10:]], ".jpg")
+
+    digest = hashlib.sha256(data).hexdigest()
+    assert stored.digest == digest
+    assert stored.size == len(data)
+    assert stored.url == f"/img-cache/{digest[:2]}/{digest}.jpg"
+    assert (tmp_path / digest[:2] / f"{digest}.jpg").read_bytes() == data
+    assert imagestore.digest_from_url(stored.url) == digest
+    assert list((tmp_path / ".tmp").iterdir()) == []
+
+
+def test_commit_stream_failure_leaves_no_partial_file(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+
+    def chunks():
+        yield b"partial"
+        raise ConnectionError("dropped")
+
+    try:
+        imagestore.commit_stream(chunks(), ".jpg")
+    except ConnectionError:
+        pass
+    assert list((tmp_path / ".tmp").iterdir()) == []
+    assert [p.name for p in tmp_path.iterdir()] == [".tmp"]
+
+
+def test_scan_removes_corrupt_files_and_stale_tmp(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    good = imagestore.commit_stream([b"good image"], ".jpg")
+    bad = imagestore.commit_stream([b"will be truncated"], ".jpg")
+    imagestore.path_for_url(bad.url).write_bytes(b"will be")
+
+    stale = tmp_path / ".tmp" / "old.part"
+    stale.write_bytes(b"x")
+    old = time.time() - imagestore.STALE_TMP_SECONDS - 1
+    os.utime(stale, (old, old))
+
+    report = imagestore.scan_cache()
+    assert report.present == {good.url}
+    assert report.removed == [bad.url]
+    assert report.stale_tmp == 1
+    assert not stale.exists()
+
+
+def test_listing_without_verify_does_not_rehash(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    bad = imagestore.commit_stream([b"will be truncated"], ".jpg")
+    imagestore.path_for_url(bad.url).write_bytes(b"will be")
+    monkeypatch.setattr(imagestore, "_file_digest", lambda p: pytest.fail("hashed"))
+
+    report = imagestore.scan_cache(verify=False)
+    assert report.present == {bad.url}
+    assert report.removed == []
+
+
+def test_path_for_url_rejects_traversal(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    assert imagestore.path_for_url("/img-cache/../secret") is None
+    assert imagestore.path_for_url("/static/x.jpg") is None
+
+
+@pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+def test_startup_reconcile_keeps_files_committed_after_the_listing(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+    oids = ["t-late", "t-gone", "t-variant"]
+
+    async def main():
+        await dbpool.init_pool()
+        try:
+            report = await asyncio.to_thread(imagestore.scan_cache)
+            # A download lands (file, then row) between the listing and the reconcile
+            late = imagestore.commit_stream([b"late"], ".jpg")
+            gone = imagestore.url_for(imagestore.rel_path_for("0" * 64, ".jpg"))
+            await store.upsert_asset("t-late", "late", "https://x/late", late.url, None, None)
+            await store.upsert_asset("t-gone", "gone", "https://x/gone", gone, None, None)
+            await store.upsert_asset("t-variant", "v", "https://x/v", late.url, None, None)
+            await store.set_asset_variants("t-variant", [{"url": gone, "w": 1, "fmt": "webp"}])
+
+            await store.forget_missing_local_paths(report.present, imagestore.exists)
+            rows = {oid: await store.get_asset(oid) for oid in oids}
+            assert rows["t-late"]["local_small_path"] == late.url
+            assert rows["t-gone"]["local_small_path"] is None
+            assert rows["t-variant"]["local_small_path"] == late.url
+            assert rows["t-variant"]["variants"] is None
+        finally:
+            async with dbpool.connection() as ac:
+                await ac.execute("DELETE FROM card_assets WHERE oracle_id = ANY(%s)", (oids,))
+            await dbpool.close_pool()
+
+    asyncio.run(main())
+
+
+class _Rollback(Exception):
+    pass
+
+
+@pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+def test_atlases_share_the_budget_and_the_lru_order(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+    now = time.time()
+
+    async def main():
+        await dbpool.init_pool()
+        try:
+            async with dbpool.unit_of_work():  # rolled back: other rows stay untouched
+                async with dbpool.connection() as ac:
+                    await ac.execute("DELETE FROM card_assets")
+                for oid, age in (("t-old", 3), ("t-new", 0)):
+                    f = imagestore.commit_stream([oid.encode() * 50], ".jpg")
+                    await store.upsert_asset(oid, oid, "", f.url, None, None, size_bytes=100)
+                    async with dbpool.connection() as ac:
+                        await ac.execute(
+                            "UPDATE card_assets SET last_access = now() - make_interval(days => %s)"
+                            " WHERE oracle_id = %s",
+                            (age, oid),
+                        )
+                (tmp_path / "atlas").mkdir()
+                for name in ("k.json", "k.webp"):
+                    (tmp_path / "atlas" / name).write_bytes(b"a" * 100)
+                    os.utime(tmp_path / "atlas" / name, (now - 86400, now - 86400))
+
+                # newest first: t-new (100), atlas (300 running), t-old (400)
+                assert await imagestore.enforce_budget(350) == 1
+                assert (await store.get_asset("t-old"))["local_small_path"] is None
+                assert len(imagestore.list_atlases()) == 1
+
+                assert await imagestore.enforce_budget(150) == 2  # the atlas' two files
+                assert imagestore.list_atlases() == []
+                assert (await store.get_asset("t-new"))["local_small_path"] is not None
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            await dbpool.close_pool()
+
+    asyncio.run(main())
+
+
+def test_variant_renders_read_a_private_copy_of_the_source(monkeypatch, tmp_path):
+    from app.features.treasure import imaging, thumbs  # noqa: PLC0415
+
+    _use_tmp_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(settings, "IMAGE_VARIANT_WIDTHS", [160])
+    monkeypatch.setattr(imaging, "supported_formats", lambda: ["webp"])
+    # Another render of the same card already committed these bytes
+    shared = imagestore.commit_stream([b"normal image"], ".jpg")
+    monkeypatch.setattr(thumbs, "download_to", lambda url, dest: dest.write_bytes(b"normal image"))
+
+    async def fake_render(fn, src, widths, formats):
+        assert Path(src).read_bytes() == b"normal image"
+        return [(160, "webp", b"variant")]
+
+    monkeypatch.setattr(imaging, "run_in_process", fake_render)
+    variants = asyncio.run(thumbs.render_variants("https://img/normal.jpg"))
+    assert [v["w"] for v in variants] == [160]
+    assert imagestore.exists(variants[0]["url"])
+    assert imagestore.exists(shared.url)  # the shared entry is left alone
+    assert list((tmp_path / ".tmp").iterdir()) == []
+
+
+@pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+def test_evicted_variants_redirect_to_their_remote_source(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+
+    async def main():
+        await dbpool.init_pool()
+        try:
+            await store.ensure_schema()
+            small = imagestore.commit_stream([b"small"], ".jpg")
+            variant = imagestore.commit_stream([b"variant"], ".webp")
+            await store.upsert_asset("t-evicted", "e", "https://x/small", small.url, None, None)
+            await store.set_asset_variants(
+                "t-evicted", [{"url": variant.url, "w": 1, "fmt": "webp"}], "https://x/normal"
+            )
+            # Evicted: the file and the asset's record of it are gone, sessions still point at it
+            imagestore.remove(variant.url)
+            await store.forget_missing_local_paths({small.url}, imagestore.exists)
+            transport = httpx.ASGITransport(app=create_app())
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                r = await client.get(variant.url)
+            assert r.status_code == 307
+            assert r.headers["location"] == "https://x/normal"
+        finally:
+            async with dbpool.connection() as ac:
+                await ac.execute("DELETE FROM card_assets WHERE oracle_id = 't-evicted'")
+                await ac.execute(
+                    "DELETE FROM variant_sources WHERE source_url = 'https://x/normal'"
+                )
+            await dbpool.close_pool()
+
+    asyncio.run(main())
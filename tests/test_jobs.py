@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+
+import pytest
+
+from app.core.config import settings
+from app.db import pool as dbpool
+from app.db.jobs import Job, backoff_seconds, prune_failed
+
+PG_URL = os.environ.get("TEST_DATABASE_URL", "")
+
+
+def test_backoff_grows_and_is_capped():
+    random.seed(0)
+    for attempts in range(1, 12):
+        ceiling = min(60.0, 2.0 * 2 ** (attempts - 1))
+        delays = [backoff_seconds(attempts, base=2.0, cap=60.0) for _ in range(50)]
+        assert all(0 <= d <= ceiling for d in delays)
+    # full jitter still spreads retries once the cap is reached
+    assert len({round(backoff_seconds(20, base=2.0, cap=60.0), 3) for _ in range(20)}) > 1
+
+
+def test_last_attempt():
+    job = Job(id=1, kind="k", key=None, payload={}, attempts=2, max_attempts=3)
+    assert not job.last_attempt
+    job.attempts = 3
+    assert job.last_attempt
+
+
+@pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+def test_prune_failed_keeps_recent_failures_and_live_jobs(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+    rows = [("old", "failed", 9000), ("recent", "failed", 1), ("waiting", "queued", 9000)]
+
+    async def main():
+        await dbpool.init_pool()
+        try:
+            async with dbpool.connection() as ac:
+                for key, state, age in rows:
+                    await ac.execute(
+                        "INSERT INTO jobs (kind, key, state, updated_at)"
+                        " VALUES ('t-prune', %s, %s, now() - make_interval(hours => %s))",
+                        (key, state, age),
+                    )
+            assert await prune_failed(8760) == 1
+            async with dbpool.connection() as ac:
+                cur = await ac.execute("SELECT key FROM jobs WHERE kind = 't-prune' ORDER BY key")
+                assert [k for (k,) in await cur.fetchall()] == ["recent", "waiting"]
+        finally:
+            async with dbpool.connection() as ac:
+                await ac.execute("DELETE FROM jobs WHERE kind = 't-prune'")
+            await dbpool.close_pool()
+
+    asyncio.run(main())
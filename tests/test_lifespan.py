@@ -1,6 +1,8 @@
 # tests/test_lifespan.py
 from __future__ import annotations
 
+import logging
+
 from fastapi.testclient import TestClient
 
 from app.main import create_app
@@ -14,3 +16,18 @@ def test_request_id_header_and_boot():
         assert r.status_code in (200, 404)
         assert "X-Request-ID" in r.headers
         assert r.headers["X-Request-ID"]
+
+
+def test_request_id_is_propagated_and_logged(caplog):
+    client = TestClient(create_app())
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        r = client.get("/healthz", headers={"X-Request-ID": "abc-123"})
+    assert r.headers["X-Request-ID"] == "abc-123"
+    (rec,) = [x for x in caplog.records if x.name == "app.access"]
+    assert (rec.request_id, rec.path, rec.method, rec.status_code) == (
+        "abc-123",
+        "/healthz",
+        "GET",
+        200,
+    )
+    assert rec.latency_ms >= 0
@@ -0,0 +1,48 @@
+import json
+import logging
+
+from app.core import logs
+from app.core.logs import AccessLogSampler, JsonFormatter
+
+
+def test_sampler_rules_most_specific_wins():
+    s = AccessLogSampler(
+        0.5,
+        {"/healthz": 0.0, "/treasure/*/state": 0.1, "/treasure/*/state 304": 0.01, "3xx": 0.2},
+        slow_ms=500,
+    )
+    assert s.rate("/treasure/abc/state", 304) == 0.01
+    assert s.rate("/treasure/abc/state", 200) == 0.1
+    assert s.rate("/img-cache/x.jpg", 304) == 0.2
+    assert s.rate("/", 200) == 0.5
+    assert s.keep("/healthz", 200, 1.0) is None
+    # errors and slow requests are always kept
+    assert s.keep("/healthz", 503, 1.0) == 1.0
+    assert s.keep("/healthz", 200, 900.0) == 1.0
+
+
+def test_queue_pipeline_writes_structured_json(capsys):
+    logs.setup_json_logging()
+    try:
+        log = logging.getLogger("test.logs")
+        log.info("hello %s", "world", extra={"request_id": "r1"})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("failed")
+    finally:
+        logs.stop_logging()
+    lines = [json.loads(x) for x in capsys.readouterr().err.splitlines()]
+    assert lines[0] == {
+        "level": "INFO",
+        "logger": "test.logs",
+        "message": "hello world",
+        "request_id": "r1",
+    }
+    assert lines[1]["message"] == "failed" and "ValueError: boom" in lines[1]["exc"]
+
+
+def test_formatter_falls_back_to_stdlib_json(monkeypatch):
+    monkeypatch.setattr(logs, "orjson", None)
+    rec = logging.LogRecord("x", logging.INFO, __file__, 1, "ünïcode", None, None)
+    assert json.loads(JsonFormatter().format(rec))["message"] == "ünïcode"
@@ -0,0 +1,76 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram, Registry
+from app.main import create_app
+
+
+def test_histogram_renders_cumulative_buckets():
+    reg = Registry()
+    h = Histogram("t_seconds", "test", ("op",), buckets=(0.1, 1.0), registry=reg)
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.labels("load").observe(v)
+    with h.labels("load").time():
+        pass
+    lines = asyncio.run(reg.render()).splitlines()
+    assert "# TYPE t_seconds histogram" in lines
+    assert 't_seconds_bucket{op="load",le="0.1"} 3' in lines
+    assert 't_seconds_bucket{op="load",le="1"} 4' in lines
+    assert 't_seconds_bucket{op="load",le="+Inf"} 5' in lines
+    assert 't_seconds_count{op="load"} 5' in lines
+
+
+def test_labels_are_escaped_and_collectors_are_read_at_scrape_time():
+    reg = Registry()
+    c = Counter("t_total", "test", ("path",), registry=reg)
+    c.labels('a"b\\').inc(2)
+    depth = [3]
+
+    async def collect():
+        return [("t_depth", "gauge", "queue depth", {"kind": "x"}, depth[0])]
+
+    reg.add_collector(collect)
+    depth[0] = 7
+    text = asyncio.run(reg.render())
+    assert 't_total{path="a\\"b\\\\"} 2' in text
+    assert 't_depth{kind="x"} 7' in text
+    assert text.count("# TYPE t_depth gauge") == 1
+
+
+def test_metrics_endpoint_labels_requests_by_route_template(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", "")
+    with TestClient(create_app()) as client:
+        client.get("/healthz")
+        client.get("/house/api/simulate", params={"seed": 1})
+        client.get("/no/such/page")
+        r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    assert 'r4t_http_requests_total{route="/healthz",method="GET",status="200"}' in text
+    assert 'r4t_http_requests_total{route="unmatched",method="GET",status="404"}' in text
+    assert (
+        'r4t_http_request_duration_seconds_count{route="/house/api/simulate",method="GET"}' in text
+    )
+    assert "/no/such/page" not in text
+    assert "r4t_house_sim_iterations_total" in text
+
+
+def test_metrics_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    client = TestClient(create_app())
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/statz").status_code == 404
+
+
+def test_features_register_their_flights_for_statz_and_metrics(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", "")
+    with TestClient(create_app()) as client:
+        statz = client.get("/statz").json()
+        text = client.get("/metrics").text
+    for name in ("session_loads", "replica_session_loads", "scryfall_meta", "asset_lookups"):
+        assert set(statz[name]) >= {"calls", "shared"}
+        assert f'r4t_singleflight_calls_total{{flight="{name}"}}' in text
+    assert "r4t_log_records_dropped_total" in text
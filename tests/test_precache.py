@@ -0,0 +1,97 @@
+import asyncio
+
+from app.core.config import settings
+from app.features.treasure import precache, store, thumbs
+from app.features.treasure.backends import MemorySessionStore
+from app.features.treasure.imagestore import commit_stream
+from app.features.treasure.models import Card, PileState, Player, Session
+from app.features.treasure.precache import PrecacheQueue, deck_fingerprint
+
+
+def test_deck_fingerprint_is_an_order_insensitive_multiset():
+    a = deck_fingerprint(["Sol Ring", "Island", "Island"])
+    assert a == deck_fingerprint(["Island", "Sol Ring", "Island"])
+    assert a != deck_fingerprint(["Island", "Sol Ring"])
+
+
+def test_precache_queue_orders_by_pile_position_and_bumps_first():
+    q = PrecacheQueue(["a", "b", "c", "d", "e"])
+    assert q.next_batch(2) == ["a", "b"]
+    q.bump(["e", "a"])  # "a" already taken: ignored
+    assert q.next_batch(2) == ["e", "c"]
+    assert q.next_batch(10) == ["d"]
+    assert q.next_batch(10) == []
+
+
+def test_cards_are_ready_before_their_thumbnail_variants(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "DATABASE_URL", "")
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(store, "_sessions", MemorySessionStore())
+    rendering: dict[str, asyncio.Future] = {}
+
+    class SlowPipeline:
+        async def submit(self, oid: str, source_url: str) -> asyncio.Future:
+            rendering[oid] = asyncio.get_running_loop().create_future()
+            return rendering[oid]
+
+    def meta(name: str) -> dict:
+        return {
+            "name": name,
+            "oracle_id": f"oid-{name}",
+            "small_url": f"https://img/{name}/small",
+            "normal_url": f"https://img/{name}/normal",
+            "scry_uri": "",
+        }
+
+    monkeypatch.setattr(thumbs, "enabled", lambda: True)
+    monkeypatch.setattr(thumbs, "get_pipeline", SlowPipeline)
+    monkeypatch.setattr(precache, "fetch_card_meta_by_name", meta)
+    monkeypatch.setattr(
+        precache,
+        "download_small",
+        lambda oid, url: (commit_stream([url.encode()], ".jpg"), None, None),
+    )
+    s = Session(
+        players=[Player(name="a")],
+        pile=PileState(cards=[Card(id="1", name="a"), Card(id="2", name="b")]),
+    )
+
+    async def main():
+        await store.create_session(s)
+        _, ready, stamping = await precache.precache_names(s.id, ["a", "b"], lambda _: True)
+        assert ready and stamping is not None and not stamping.done()
+        loaded = await store.load_session(s.id)
+        assert loaded is not None and all(c.img and not c.variants for c in loaded.pile.cards)
+
+        rendering["oid-a"].set_result([{"url": "/img-cache/a.webp", "w": 146, "fmt": "webp"}])
+        rendering["oid-b"].set_exception(RuntimeError("encoder crashed"))
+        assert set(await stamping) == {"oid-a"}
+        loaded = await store.load_session(s.id)
+        assert loaded is not None
+        assert [len(c.variants) for c in loaded.pile.cards] == [1, 0]
+
+    asyncio.run(main())
+
+
+def test_unresolvable_names_are_not_looked_up_again(monkeypatch):
+    monkeypatch.setattr(store, "_sessions", MemorySessionStore())
+    monkeypatch.setattr(precache, "_unresolved", {})
+    lookups: list[str] = []
+
+    def meta(name: str) -> None:
+        lookups.append(name)
+
+    monkeypatch.setattr(precache, "fetch_card_meta_by_name", meta)
+    s = Session(players=[Player(name="a")], pile=PileState(cards=[Card(id="1", name="Nope")]))
+
+    async def main():
+        await store.create_session(s)
+        assert await precache.precache_names(s.id, ["Nope"]) == ({}, False, None)
+        assert precache.uncached_names(s.pile.cards) == []  # rolls won't bump it
+        assert await precache.precache_names(s.id, ["Nope"]) == ({}, False, None)
+        assert await store.get_session_version(s.id) == 0  # the session was never rewritten
+
+    asyncio.run(main())
+    assert lookups == ["Nope"]
+    monkeypatch.setattr(settings, "PRECACHE_MISS_RETRY_SECONDS", 0.0)
+    assert precache.uncached_names(s.pile.cards) == ["Nope"]
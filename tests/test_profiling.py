@@ -0,0 +1,65 @@
+import logging
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import profiling
+from app.core.config import settings
+from app.core.profiling import collect_spans, span
+from app.main import create_app
+
+
+def test_spans_are_free_outside_a_collecting_request():
+    assert span("db_load") is span("model_dump")  # the shared no-op
+    with collect_spans() as spans:
+        with span("db_load"):
+            time.sleep(0.002)
+        with span("db_load"):
+            pass
+    assert set(spans) == {"db_load"} and spans["db_load"] >= 2.0
+    with span("db_load"):
+        pass
+    assert set(spans) == {"db_load"}
+
+
+def test_span_timings_are_attached_to_the_access_log(caplog, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_SPANS", True)
+    client = TestClient(create_app())
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        assert client.get("/").status_code == 200
+    (rec,) = [x for x in caplog.records if x.name == "app.access"]
+    assert rec.spans["render_template"] > 0
+
+
+def _wait_for(pred, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not pred():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_token_gated_profile_is_written_and_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_TOKEN", "s3cret")
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_MAX_FILES", 2)
+    client = TestClient(create_app())
+
+    r = client.get("/house/api/simulate", params={"__profile": "wrong"})
+    assert "X-Profile-Id" not in r.headers
+
+    names = []
+    for i in range(3):
+        r = client.get(
+            "/house/api/simulate", headers={"X-Profile": "s3cret", "X-Request-ID": f"r{i}"}
+        )
+        assert r.status_code == 200
+        names.append(r.headers["X-Profile-Id"])
+        _wait_for(lambda: not profiling.Sampler._busy.locked())
+    assert names[0].endswith("-r0.folded")
+
+    files = sorted(p.name for p in tmp_path.glob("*.folded"))
+    assert len(files) == 2 and names[2] in files
+    for line in (tmp_path / names[2]).read_text().splitlines():
+        stack, _, count = line.rpartition(" ")
+        assert ";" in stack or ":" in stack
+        assert int(count) > 0
@@ -0,0 +1,37 @@
+import asyncio
+
+from app.features.treasure import progress
+from app.features.treasure.progress import Progress
+
+
+def test_registry_ignores_stale_updates():
+    sid = "a" * 32
+    progress._apply(sid, Progress(total=10, done=5, is_ready=False))
+    progress._apply(sid, Progress(total=10, done=3, is_ready=False))  # late NOTIFY echo
+    assert progress._latest[sid].done == 5
+    progress._apply(sid, Progress(total=10, done=10, is_ready=True))
+    progress._apply(sid, Progress(total=10, done=10, is_ready=False))
+    assert progress._latest[sid].is_ready
+
+
+def test_watch_yields_changes_until_ready():
+    sid = "b" * 32
+
+    async def run() -> list[Progress | None]:
+        progress._apply(sid, Progress(total=4, done=0, is_ready=False))
+        seen: list[Progress | None] = []
+
+        async def consume():
+            async for p in progress.watch(sid, timeout=0.05):
+                seen.append(p)
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.08)  # one quiet interval -> keepalive
+        progress._apply(sid, Progress(total=4, done=2, is_ready=True))
+        await asyncio.wait_for(task, timeout=1)
+        return seen
+
+    seen = asyncio.run(run())
+    assert seen[0] == Progress(total=4, done=0, is_ready=False)
+    assert None in seen
+    assert seen[-1] == Progress(total=4, done=2, is_ready=True)
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.db import pool as dbpool
+from app.features.treasure import store
+from app.features.treasure.backends import MemorySessionStore
+from app.features.treasure.models import Card, PileState, Player, Session
+from app.features.treasure.snapshots import etag_version
+from app.main import create_app
+
+PG_URL = os.environ.get("TEST_DATABASE_URL", "")
+# A streaming standby of TEST_DATABASE_URL; without one the primary stands in for it
+REPLICA_URL = os.environ.get("TEST_REPLICA_DATABASE_URL", PG_URL)
+
+
+class LaggingStore(MemorySessionStore):
+    """Primary reads see the documents; replica reads see `stale` (what replication delivered)."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.stale: dict[str, Session] = {}
+        self.replica_reads = 0
+
+    async def load(self, sid: str, *, replica: bool = False) -> Session | None:
+        if replica:
+            self.replica_reads += 1
+            return self.stale.get(sid)
+        return await super().load(sid)
+
+    async def version(self, sid: str, *, replica: bool = False) -> int | None:
+        if replica:
+            self.replica_reads += 1
+            s = self.stale.get(sid)
+            return None if s is None else s.version
+        return await super().version(sid)
+
+
+@pytest.fixture
+def lagging(monkeypatch):
+    fake = LaggingStore()
+    monkeypatch.setattr(settings, "DB_REPLICA_URL", "postgresql://replica")
+    monkeypatch.setattr(settings, "DB_REPLICA_FENCE_SECONDS", 60.0)
+    monkeypatch.setattr(store, "_sessions", fake)
+    monkeypatch.setattr(store, "_fenced", {})
+    monkeypatch.setattr(store, "reads_from_replica", lambda: True)
+    return fake
+
+
+def _session() -> Session:
+    return Session(players=[Player(name="a")], pile=PileState(cards=[Card(id="1", name="c1")]))
+
+
+def test_replica_serves_sessions_this_process_has_not_written(lagging):
+    s = _session()
+    lagging._docs[s.id] = (s.model_dump(), time.time())
+    lagging.stale[s.id] = s
+
+    async def main():
+        assert await store.get_session_version(s.id, replica=True) == 0
+        assert (await store.load_session(s.id, replica=True)) is not None
+        assert await store.load_session(s.id) is not None  # not opted in: primary
+
+    asyncio.run(main())
+    assert lagging.replica_reads == 2
+
+
+def test_reads_after_a_local_write_go_to_the_primary_until_the_fence_expires(lagging, monkeypatch):
+    s = _session()
+
+    async def main():
+        await store.create_session(s)
+        lagging.stale[s.id] = s.model_copy()
+        await store.mutate_session(s.id, lambda x: x.log.append("hi"))
+        loaded = await store.load_session(s.id, replica=True)
+        assert loaded is not None and loaded.version == 1
+        assert lagging.replica_reads == 0
+
+        monkeypatch.setitem(store._fenced, s.id, 0.0)  # window over
+        stale = await store.load_session(s.id, replica=True)
+        assert stale is not None and stale.version == 0
+        assert lagging.replica_reads == 1
+
+    asyncio.run(main())
+
+
+def test_replica_copies_older_than_the_client_has_seen_are_reread(lagging):
+    s = _session()
+    lagging.stale[s.id] = s.model_copy()
+    s.version = 3
+    lagging._docs[s.id] = (s.model_dump(), time.time())
+
+    async def main():
+        assert await store.get_session_version(s.id, replica=True, min_version=3) == 3
+        loaded = await store.load_session(s.id, replica=True, min_version=3)
+        assert loaded is not None and loaded.version == 3
+        missing = _session()
+        lagging._docs[missing.id] = (missing.model_dump(), time.time())
+        assert await store.load_session(missing.id, replica=True) is not None  # not replicated yet
+
+    asyncio.run(main())
+    assert lagging.replica_reads == 3
+
+
+def test_fence_keeps_only_unexpired_entries(monkeypatch):
+    monkeypatch.setattr(settings, "DB_REPLICA_URL", "postgresql://replica")
+    monkeypatch.setattr(store, "_fenced", {"old": 0.0, "older": 1.0})
+    store._fence("new")
+    assert list(store._fenced) == ["new"]
+
+
+def test_etag_version_takes_the_newest_listed():
+    assert etag_version(None) is None
+    assert etag_version('"v3-table", W/"v12"') == 12
+    assert etag_version("*") is None
+
+
+@pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+def test_replica_pool_is_used_outside_a_writing_unit_of_work(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+    monkeypatch.setattr(settings, "DB_REPLICA_URL", REPLICA_URL)
+    monkeypatch.setattr(settings, "SESSION_STORE", "postgres")
+    monkeypatch.setattr(store, "_fenced", {})
+    s = _session()
+
+    def replica_checkouts() -> int:
+        assert dbpool._replica_pool is not None
+        return dbpool._replica_pool.get_stats().get("requests_num", 0)
+
+    async def main():
+        await dbpool.init_pool()
+        try:
+            await store.create_session(s)
+            store._fenced.clear()
+            before = replica_checkouts()  # warm-up checkouts included
+            async with dbpool.unit_of_work():
+                assert await store.get_session_version(s.id, replica=True) == 0
+                assert replica_checkouts() - before == 1
+                await store.mutate_session(s.id, lambda x: x.log.append("hi"))
+                store._fenced.clear()
+                # The unit of work holds an uncommitted write: read it, not the replica
+                loaded = await store.load_session(s.id, replica=True)
+                assert loaded is not None and loaded.log == ["hi"]
+                assert replica_checkouts() - before == 1
+        finally:
+            await store.close_session_store()
+            await dbpool.close_pool()
+
+    asyncio.run(main())
+
+
+def test_state_route_never_goes_back_behind_the_clients_version(lagging):
+    s = _session()
+    lagging.stale[s.id] = s.model_copy()  # replica stuck at v0
+    s.version = 2
+    lagging._docs[s.id] = (s.model_dump(), time.time())
+
+    with TestClient(create_app()) as client:
+        assert client.get(f"/treasure/{s.id}/state").headers["etag"] == '"v0"'
+        r = client.get(f"/treasure/{s.id}/state", params={"min_version": 2})
+        assert r.json()["version"] == 2
+        r = client.get(f"/treasure/{s.id}/state", headers={"If-None-Match": '"v2"'})
+        assert r.status_code == 304 and r.headers["etag"] == '"v2"'
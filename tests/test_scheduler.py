@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+import pytest
+
+from app.core.config import settings
+from app.core.metrics import PERIODIC_LAST_SUCCESS, PERIODIC_LEADER, PERIODIC_RUNS
+from app.db import pool as dbpool
+from app.db.scheduler import PeriodicTask, Scheduler
+
+PG_URL = os.environ.get("TEST_DATABASE_URL", "")
+
+
+async def _until(cond, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not cond():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_without_a_pool_every_task_runs_here(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_ELECTION_SECONDS", 0.05)
+    calls: list[str] = []
+
+    async def ok() -> None:
+        calls.append("ok")
+
+    async def boom() -> None:
+        calls.append("boom")
+        raise RuntimeError("nope")
+
+    async def main():
+        sched = Scheduler([PeriodicTask("t_ok", ok, 0.01), PeriodicTask("t_boom", boom, 0.01)])
+        runner = asyncio.create_task(sched.run())
+        await _until(lambda: calls.count("ok") >= 2 and calls.count("boom") >= 2)
+        assert sched.leads("t_ok") and sched.leads("t_boom")
+        sched.stop()
+        await runner
+        assert not sched.leads("t_ok")
+
+    asyncio.run(main())
+    assert PERIODIC_RUNS.labels("t_ok", "done").value >= 2
+    assert PERIODIC_RUNS.labels("t_boom", "failed").value >= 2  # failures don't stop the loop
+    assert PERIODIC_LAST_SUCCESS.labels("t_ok").value > 0
+    assert PERIODIC_LAST_SUCCESS.labels("t_boom").value == 0
+    assert PERIODIC_LEADER.labels("t_ok").value == 0
+
+
+@pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+def test_one_leader_per_task_and_failover(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+    monkeypatch.setattr(settings, "SCHEDULER_ELECTION_SECONDS", 0.05)
+    runs = {"a": 0, "b": 0}
+
+    def task(who: str) -> PeriodicTask:
+        async def fn() -> None:
+            runs[who] += 1
+
+        return PeriodicTask("t_failover", fn, 0.01)
+
+    async def main():
+        await dbpool.init_pool()
+        a, b = Scheduler([task("a")]), Scheduler([task("b")])
+        ta = asyncio.create_task(a.run())
+        await _until(lambda: a.leads("t_failover"))
+        tb = asyncio.create_task(b.run())
+        await asyncio.sleep(0.3)
+        assert not b.leads("t_failover") and runs["b"] == 0
+
+        # The leader's connection dies (crash, network): b takes over, a steps down
+        assert a._conn is not None
+        pid = a._conn.info.backend_pid
+        pool = dbpool.get_pool()
+        assert pool is not None
+        async with pool.connection() as conn:
+            await conn.execute("SELECT pg_terminate_backend(%s)", (pid,))
+        await _until(lambda: runs["b"] >= 1)
+        await asyncio.sleep(0.3)
+        assert not a.leads("t_failover")  # reconnected as a follower
+
+        # A clean shutdown hands it straight back
+        b.stop()
+        await tb
+        await _until(lambda: a.leads("t_failover"))
+        a.stop()
+        await ta
+        await dbpool.close_pool()
+
+    asyncio.run(main())
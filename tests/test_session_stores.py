@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.db import pool as dbpool
+from app.features.treasure import precache, store as treasure_store
+from app.features.treasure.backends import SessionStore, open_session_store
+from app.features.treasure.imagestore import commit_stream
+from app.features.treasure.models import Card, PileState, Player, Session
+from app.main import create_app
+
+# Postgres joins the matrix when a migrated test database is available
+PG_URL = os.environ.get("TEST_DATABASE_URL", "")
+KINDS = [
+    "memory",
+    "sqlite",
+    pytest.param(
+        "postgres", marks=pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+    ),
+]
+
+
+@pytest.fixture(params=KINDS)
+def run_with_store(request, tmp_path, monkeypatch):
+    kind = request.param
+    published: list[str] = []
+
+    def run(body):
+        async def main():
+            if kind == "postgres":
+                monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+                await dbpool.init_pool()
+            store = open_session_store(
+                kind, sqlite_path=str(tmp_path / "sessions.sqlite3"), publish=published.append
+            )
+            try:
+                await body(store)
+            finally:
+                await store.close()
+                if kind == "postgres":
+                    await dbpool.close_pool()
+
+        asyncio.run(main())
+        return kind, published
+
+    return run
+
+
+def _session() -> Session:
+    return Session(
+        players=[Player(name="a"), Player(name="b")],
+        pile=PileState(cards=[Card(id=str(i), name=f"c{i}") for i in range(5)]),
+    )
+
+
+def test_create_load_and_version(run_with_store):
+    s = _session()
+
+    async def body(store: SessionStore):
+        await store.create(s)
+        loaded = await store.load(s.id)
+        assert loaded is not None and loaded.model_dump() == s.model_dump()
+        assert await store.version(s.id) == 0
+        assert await store.load("missing") is None
+        assert await store.version("missing") is None
+
+    run_with_store(body)
+
+
+def test_mutate_bumps_version_and_publishes_delta(run_with_store):
+    s = _session()
+
+    async def body(store: SessionStore):
+        await store.create(s)
+
+        def take(x: Session) -> None:
+            x.players[0].gains.append(x.pile.cards.pop(0))
+
+        after, delta = await store.mutate(s.id, take)
+        assert after.version == 1 and after.pile.count == 4
+        assert delta["base"] == 0 and delta["v"] == 1
+        assert delta["pile"] == {"count": 4}
+        loaded = await store.load(s.id)
+        assert loaded is not None and [c.id for c in loaded.players[0].gains] == ["0"]
+        with pytest.raises(KeyError):
+            await store.mutate("missing", take)
+
+    kind, published = run_with_store(body)
+    if kind != "postgres":  # postgres NOTIFYs instead
+        assert [json.loads(p)["v"] for p in published] == [1]
+
+
+def test_concurrent_mutations_serialize(run_with_store):
+    s = _session()
+
+    async def body(store: SessionStore):
+        await store.create(s)
+
+        async def bump(x: Session) -> None:
+            n = x.turn_num
+            await asyncio.sleep(0)  # yield mid-mutation
+            x.turn_num = n + 1
+
+        await asyncio.gather(*(store.mutate(s.id, bump) for _ in range(20)))
+        loaded = await store.load(s.id)
+        assert loaded is not None and (loaded.turn_num, loaded.version) == (21, 20)
+
+    run_with_store(body)
+
+
+def test_failed_mutation_is_not_persisted(run_with_store):
+    s = _session()
+
+    async def body(store: SessionStore):
+        await store.create(s)
+
+        def bad(x: Session) -> None:
+            x.log.append("half done")
+            raise ValueError("nope")
+
+        with pytest.raises(ValueError):
+            await store.mutate(s.id, bad)
+        loaded = await store.load(s.id)
+        assert loaded is not None and loaded.log == [] and loaded.version == 0
+
+    run_with_store(body)
+
+
+def test_loaded_sessions_are_independent_copies(run_with_store):
+    s = _session()
+
+    async def body(store: SessionStore):
+        await store.create(s)
+        first = await store.load(s.id)
+        assert first is not None
+        first.log.append("local only")
+        first.pile.cards.clear()
+        again = await store.load(s.id)
+        assert again is not None and again.log == [] and again.pile.count == 5
+
+    run_with_store(body)
+
+
+def test_cleanup_only_removes_idle_sessions(run_with_store):
+    s = _session()
+
+    async def body(store: SessionStore):
+        await store.create(s)
+        assert await store.cleanup(ttl_hours=1) == 0
+        assert await store.cleanup(ttl_hours=-1) >= 1  # everything is "older" than the future
+        assert await store.load(s.id) is None
+
+    run_with_store(body)
+
+
+def test_create_and_roll_without_postgres(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "DATABASE_URL", "")
+    monkeypatch.setattr(settings, "SESSION_STORE", "memory")
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_VARIANT_WIDTHS", [])
+    monkeypatch.setattr(treasure_store, "_sessions", None)
+
+    def meta(name: str) -> dict:
+        oid = f"oid-{name}"
+        return {"name": name, "oracle_id": oid, "small_url": f"https://img/{oid}", "scry_uri": ""}
+
+    def download(oid: str, url: str):
+        return commit_stream([oid.encode()], ".jpg"), None, None
+
+    async def no_atlas(s: Session) -> None:
+        return None
+
+    monkeypatch.setattr(precache, "fetch_card_meta_by_name", meta)
+    monkeypatch.setattr(precache, "download_small", download)
+    monkeypatch.setattr(precache, "build_deck_atlas", no_atlas)
+
+    with TestClient(create_app()) as client:
+        r = client.post(
+            "/treasure/create",
+            data={"raw_list": "2 Island\n1 Sol Ring\n1 Forest", "players": "a, b"},
+        )
+        assert r.status_code == 200
+        (sid,) = treasure_store.session_store()._docs  # type: ignore[attr-defined]
+
+        # Precache ran in this process; progress is served from memory
+        for _ in range(100):
+            status = client.get("/treasure/precache_status", params={"sid": sid}).json()
+            if status["is_ready"]:
+                break
+            time.sleep(0.02)
+        assert status == {"total": 3, "done": 3, "is_ready": True}
+        state = client.get(f"/treasure/{sid}/state").json()
+        assert all(c["img"].startswith("/img-cache/") for c in state["pile"]["cards"])
+
+        r = client.post(f"/treasure/{sid}/roll")
+        assert r.status_code == 200 and r.json()["delta"]["v"] >= 1
@@ -0,0 +1,168 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
+from app.db import pool as dbpool
+from app.features.treasure import snapshots, store
+from app.features.treasure.backends import MemorySessionStore, PostgresSessionStore
+from app.features.treasure.models import Card, PileState, Player, Session
+from app.main import create_app
+
+
+def test_concurrent_calls_share_one_flight():
+    sf: SingleFlight[str, int] = SingleFlight()
+    calls = 0
+
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def main():
+        results = await asyncio.gather(*(sf.do("k", work) for _ in range(5)))
+        assert results == [42] * 5
+        # Nothing is cached once the flight lands
+        assert await sf.do("k", work) == 42
+
+    asyncio.run(main())
+    assert calls == 2
+    assert (sf.calls, sf.shared) == (6, 4)
+    assert len(sf) == 0
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    sf: SingleFlight[str, str] = SingleFlight()
+
+    async def work() -> str:
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(sf.do("k", work))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(sf.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+
+    asyncio.run(main())
+
+
+def test_errors_propagate_to_all_waiters():
+    sf: SingleFlight[str, None] = SingleFlight()
+
+    async def boom() -> None:
+        await asyncio.sleep(0)
+        raise ValueError("nope")
+
+    async def main():
+        res = await asyncio.gather(sf.do("k", boom), sf.do("k", boom), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in res)
+
+    asyncio.run(main())
+
+
+def test_forget_starts_a_fresh_flight_and_stats_track_the_ratio():
+    sf: SingleFlight[str, int] = SingleFlight()
+    started = 0
+
+    async def work() -> int:
+        nonlocal started
+        started += 1
+        n = started
+        await asyncio.sleep(0.01)
+        return n
+
+    async def main():
+        early = asyncio.create_task(sf.do("k", work))
+        joined = asyncio.create_task(sf.do("k", work))
+        await asyncio.sleep(0)
+        sf.forget("k")  # e.g. a write just committed
+        late = asyncio.create_task(sf.do("k", work))
+        return await asyncio.gather(early, joined, late)
+
+    assert asyncio.run(main()) == [1, 1, 2]
+    assert sf.stats() == {"calls": 3, "shared": 1, "inflight": 0, "ratio": 0.3333}
+
+
+class SlowStore(MemorySessionStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.loads = 0
+
+    async def load(self, sid: str, *, replica: bool = False) -> Session | None:
+        self.loads += 1
+        await asyncio.sleep(0.05)
+        return await super().load(sid)
+
+
+def test_concurrent_state_requests_share_one_load(monkeypatch):
+    # Every Treasure route runs in a unit of work; one that hasn't begun its
+    # transaction must still coalesce its reads
+    slow = SlowStore()
+    monkeypatch.setattr(store, "_sessions", slow)
+    monkeypatch.setattr(store, "load_flight", SingleFlight())
+    monkeypatch.setattr(snapshots, "cache", snapshots.SnapshotCache(1 << 20))
+    s = Session(players=[Player(name="a")], pile=PileState(cards=[Card(id="1", name="c1")]))
+
+    async def main():
+        await slow.create(s)
+        transport = httpx.ASGITransport(app=create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get(f"/treasure/{s.id}/state") for _ in range(6)))
+
+    responses = asyncio.run(main())
+    assert all(r.status_code == 200 for r in responses)
+    assert store.load_flight.calls == 6
+    assert slow.loads == 1
+
+
+class CountingPostgresStore(PostgresSessionStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.selects = 0
+
+    async def load(self, sid: str, *, replica: bool = False) -> Session | None:
+        self.selects += 1
+        await asyncio.sleep(0.05)  # widen the window for others to join
+        return await super().load(sid, replica=replica)
+
+
+PG_URL = os.environ.get("TEST_DATABASE_URL", "")
+
+
+@pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+def test_concurrent_state_requests_share_one_select_on_postgres(monkeypatch):
+    # /state looks the version up first; that read must not begin the request's
+    # transaction, or every snapshot miss does its own SELECT
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+    monkeypatch.setattr(settings, "DB_REPLICA_URL", "")
+    monkeypatch.setattr(settings, "DB_MIN_SIZE", 1)
+    monkeypatch.setattr(settings, "DB_MAX_SIZE", 8)
+    monkeypatch.setattr(store, "load_flight", SingleFlight())
+    monkeypatch.setattr(snapshots, "cache", snapshots.SnapshotCache(1 << 20))
+    pg = CountingPostgresStore()
+    monkeypatch.setattr(store, "_sessions", pg)
+    s = Session(players=[Player(name="a")], pile=PileState(cards=[Card(id="1", name="c1")]))
+
+    async def main():
+        await dbpool.init_pool()
+        try:
+            await pg.create(s)
+            transport = httpx.ASGITransport(app=create_app())
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(
+                    *(client.get(f"/treasure/{s.id}/state") for _ in range(6))
+                )
+        finally:
+            await dbpool.close_pool()
+
+    responses = asyncio.run(main())
+    assert all(r.status_code == 200 for r in responses)
+    assert pg.selects == 1
+    assert store.load_flight.calls == 6
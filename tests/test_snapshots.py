@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from app.core.http import etag_matches
+from app.features.treasure.models import Card, PileState, Player, Session
+from app.features.treasure.snapshots import (
+    SnapshotCache,
+    etag_for,
+    projection_key,
+    render,
+)
+
+
+def test_cache_serves_only_the_cached_version():
+    c = SnapshotCache(max_bytes=1024)
+    c.put("a", 3, b"{}")
+    assert c.get("a", 3) == b"{}"
+    assert c.get("a", 4) is None
+    c.put("a", 2, b"old")  # a slower render of an older version doesn't win
+    assert c.get("a", 3) == b"{}"
+
+
+def test_cache_is_byte_bounded_lru():
+    c = SnapshotCache(max_bytes=10)
+    c.put("a", 1, b"aaaa")
+    c.put("b", 1, b"bbbb")
+    c.get("a", 1)
+    c.put("c", 1, b"cccc")
+    assert c.get("b", 1) is None
+    assert c.get("a", 1) and c.get("c", 1)
+    assert c.size == 8
+    c.put("d", 1, b"x" * 11)  # larger than the whole budget: not cached
+    assert c.get("d", 1) is None and c.size == 8
+
+
+def test_etag_matching():
+    et = etag_for(7)
+    assert etag_matches(f'"v6", {et}', et)
+    assert etag_matches(f"W/{et}", et)
+    assert etag_matches("*", et)
+    assert not etag_matches('"v6"', et)
+    assert not etag_matches(None, et)
+
+
+def _session():
+    cards = [
+        Card(id=str(i), name=f"c{i}", oracle_text="long rules text " * 10, img=f"/i/{i}.jpg")
+        for i in range(40)
+    ]
+    return Session(
+        players=[Player(name="a", gains=cards[:2]), Player(name="b", gains=cards[2:3])],
+        pile=PileState(cards=cards[3:], revealed=cards[3:4]),
+    )
+
+
+def test_table_view_drops_pile_order_and_rules_text():
+    s = _session()
+    table = json.loads(render(s, "table"))
+    assert table["pile"] == {
+        "count": 37,
+        "revealed": [
+            {
+                "id": "3",
+                "name": "c3",
+                "img": "/i/3.jpg",
+                "scry": None,
+                "oracle_id": None,
+                "variants": [],
+            }
+        ],
+    }
+    assert [len(p["gains"]) for p in table["players"]] == [2, 1]
+    assert "oracle_text" not in table["players"][0]["gains"][0]
+    assert len(render(s, "full")) > 10 * len(render(s, "table"))
+
+
+def test_player_view_and_fields():
+    s = _session()
+    mine = json.loads(render(s, projection_key("player", player_id=s.players[1].id)))
+    assert "gains" not in mine["players"][0] and len(mine["players"][1]["gains"]) == 1
+    with pytest.raises(KeyError):
+        render(s, projection_key("player", player_id="nobody"))
+
+    key = projection_key(fields="turn_idx, pile.count,players.name")
+    assert key == "fields:pile.count,players.name,turn_idx"
+    assert json.loads(render(s, key)) == {
+        "players": [{"name": "a"}, {"name": "b"}],
+        "turn_idx": 0,
+        "pile": {"count": 37},
+    }
+    for bad in (
+        {"view": "nope"},
+        {"view": "player"},
+        {"fields": "pile.cards.name"},
+        {"fields": "x"},
+    ):
+        with pytest.raises(ValueError):
+            projection_key(**bad)
+
+
+def test_projections_are_cached_and_tagged_separately():
+    c = SnapshotCache(max_bytes=1024)
+    c.put("a", 3, b"full")
+    c.put("a", 3, b"table", "table")
+    assert c.get("a", 3) == b"full" and c.get("a", 3, "table") == b"table"
+    assert len({etag_for(3), etag_for(3, "table"), etag_for(3, "fields:log")}) == 3
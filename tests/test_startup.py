@@ -0,0 +1,20 @@
+import os
+
+from benchmarks.startup import measure
+
+# Generous: this guards against regressions like an eager heavy import, not jitter
+BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "10000"))
+
+
+def test_cold_start_stays_lazy_and_within_budget(capsys):
+    result, packages = measure()
+    total = result["import_ms"] + result["create_app_ms"] + result["startup_ms"]
+    with capsys.disabled():
+        print(
+            f"\ncold start: import {result['import_ms']:.0f}ms, "
+            f"create_app {result['create_app_ms']:.0f}ms, startup {result['startup_ms']:.0f}ms"
+        )
+    assert "requests" not in result["modules"]  # imported by the first outbound fetch
+    assert "requests" not in packages
+    assert "PIL" not in result["modules"]  # only worker processes touch pixels
+    assert total < BUDGET_MS
@@ -0,0 +1,132 @@
+import asyncio
+import os
+
+import psycopg
+import pytest
+
+from app.core.config import settings
+from app.db import pool as dbpool
+from app.features.treasure import store
+from app.features.treasure.models import Card, PileState, Player, Session
+
+PG_URL = os.environ.get("TEST_DATABASE_URL", "")
+pytestmark = pytest.mark.skipif(not PG_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture
+def run(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+    monkeypatch.setattr(settings, "SESSION_STORE", "postgres")
+    monkeypatch.setattr(settings, "DB_MIN_SIZE", 1)
+    monkeypatch.setattr(settings, "DB_MAX_SIZE", 1)  # a second checkout would starve
+    monkeypatch.setattr(settings, "DB_CONNECT_TIMEOUT", 2.0)
+
+    def go(body):
+        async def main():
+            await dbpool.init_pool()
+            try:
+                await body()
+            finally:
+                await store.close_session_store()
+                await dbpool.close_pool()
+
+        asyncio.run(main())
+
+    return go
+
+
+def _session() -> Session:
+    return Session(players=[Player(name="a")], pile=PileState(cards=[Card(id="1", name="c1")]))
+
+
+def _checkouts() -> int:
+    pool = dbpool.get_pool()
+    assert pool is not None
+    return pool.get_stats().get("requests_num", 0)
+
+
+def test_nested_store_calls_share_one_connection(run):
+    s = _session()
+
+    async def body():
+        before = _checkouts()
+        async with dbpool.unit_of_work():
+            await store.create_session(s)
+            await store.mutate_session(s.id, lambda x: x.log.append("hi"))
+            loaded = await store.load_session(s.id)  # sees the uncommitted write
+            assert loaded is not None and loaded.log == ["hi"]
+            assert await store.get_session_version(s.id) == 1
+        assert _checkouts() - before == 1
+
+    run(body)
+
+
+def test_async_mutator_can_use_the_store_while_holding_the_row_lock(run):
+    s = _session()
+
+    async def body():
+        await store.create_session(s)
+
+        async def mutator(x: Session) -> None:
+            # Used to check out a second connection while holding FOR UPDATE
+            x.log.append(f"v{await store.get_session_version(s.id)}")
+
+        after = await asyncio.wait_for(store.mutate_session(s.id, mutator), timeout=5)
+        assert after.log == ["v0"]
+
+    run(body)
+
+
+def test_unit_of_work_rolls_back_when_the_block_raises(run):
+    s = _session()
+
+    async def body():
+        with pytest.raises(RuntimeError):
+            async with dbpool.unit_of_work():
+                await store.create_session(s)
+                raise RuntimeError("boom")
+        assert await store.load_session(s.id) is None
+
+    run(body)
+
+
+@pytest.mark.parametrize("pipeline", [True, False])
+def test_failed_statement_rolls_back_and_returns_a_clean_connection(run, monkeypatch, pipeline):
+    monkeypatch.setattr(settings, "DB_PIPELINE", pipeline)
+    s, other = _session(), _session()
+
+    async def body():
+        await store.create_session(s)
+        with pytest.raises(psycopg.errors.UniqueViolation):
+            async with dbpool.unit_of_work():
+                await store.create_session(other)
+                await store.create_session(s)  # duplicate id
+        assert await store.load_session(other.id) is None
+        pool = dbpool.get_pool()
+        assert pool is not None
+        async with pool.connection() as conn:  # as the pool hands it out
+            assert not conn.autocommit
+            assert conn.info.transaction_status == psycopg.pq.TransactionStatus.IDLE
+        await store.mutate_session(s.id, lambda x: x.log.append("after"))
+        loaded = await store.load_session(s.id)
+        assert loaded is not None and loaded.log == ["after"]
+
+    run(body)
+
+
+def test_pool_is_warm_before_init_returns(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", PG_URL)
+    monkeypatch.setattr(settings, "DB_MIN_SIZE", 3)
+    monkeypatch.setattr(settings, "DB_MAX_SIZE", 3)
+
+    async def main():
+        await dbpool.init_pool()
+        try:
+            pool = dbpool.get_pool()
+            assert pool is not None
+            stats = pool.get_stats()
+            assert stats["pool_size"] == 3 and stats["pool_available"] == 3
+        finally:
+            await dbpool.close_pool()
+
+    asyncio.run(main())